@@ -1,107 +1,386 @@
 # Importación de librerias
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import sqlite3
+from typing import Optional
+import joblib
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
 
 from .utils import ensure_dir
+from .instrument import step
+from .warehouse import connect, read_frame
+from .ingest import read_staging_frame
 
-def _connect(db_path: str):
-    con = sqlite3.connect(db_path)
-    return con
-
-def _monthly_features(con) -> pd.DataFrame:
-    # Agregación Sales mensual
-    sales = pd.read_sql("""
-        SELECT date(substr(date_id,1,4)||'-'||substr(date_id,5,2)||'-'||substr(date_id,7,2)) as date,
-               quantity, unit_price, discount_percent, sales_amount, profit_margin
-        FROM fact_sales
-    """, con, parse_dates=["date"])
-    if len(sales) == 0:
-        return pd.DataFrame()
-    sales["month"] = sales["date"].dt.to_period("M").dt.to_timestamp()
-    s_agg = sales.groupby("month").agg(
-        sales_amount_total=("sales_amount","sum"),
-        sales_qty_total=("quantity","sum"),
-        avg_discount=("discount_percent","mean"),
-        avg_profit_margin=("profit_margin","mean")
+# Mes como entero YYYYMM a partir de date_id (YYYYMMDD); sin '/' entera, que no es portable entre SQLite y DuckDB
+YEAR_MONTH = "(date_id - date_id % 100) / 100"
+
+# Frecuencias de pca.frequency: nombre del fichero de features, índice y clave de agrupación en el almacén
+# (la semana se agrega en pandas a partir de los días)
+FREQUENCIES = {
+    "D": {"name": "daily", "index": "date", "sql": "date_id"},
+    "W": {"name": "weekly", "index": "week", "sql": "date_id"},
+    "M": {"name": "monthly", "index": "month", "sql": YEAR_MONTH},
+}
+MODES = ("batch", "incremental")
+
+# Columnas de stg_hr que usan las features por periodo
+HR_COLUMNS = ["review_date", "performance_score", "hours_worked", "overtime_hours", "salary", "bonus"]
+
+def _frequency(frequency: str) -> dict:
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unknown pca.frequency '{frequency}'. Expected one of: {', '.join(FREQUENCIES)}.")
+    return FREQUENCIES[frequency]
+
+def _period_start(dates: pd.Series, frequency: str) -> pd.Series:
+    # Inicio del periodo: el día, el lunes de la semana o el día 1 del mes
+    return pd.to_datetime(dates).dt.to_period(frequency).dt.start_time
+
+def _avg_sql(expr: str, alias: str) -> str:
+    # Suma y conteo por separado para poder re-agregar medias de días a semanas
+    return f"SUM({expr}) AS {alias}__sum, COUNT({expr}) AS {alias}__n"
+
+def _read_periods(con, sql: str, frequency: str, keys: tuple = ()) -> pd.DataFrame:
+    """
+    Run a query grouped by the frequency's period key (and segment keys), roll it up to period
+    starts and turn the __sum/__n pairs into averages.
+    """
+    spec = _frequency(frequency)
+    df = read_frame(con, sql.format(period=spec["sql"]))
+    key = df.pop("period").astype(int)
+    if frequency == "M":
+        parts = {"year": key // 100, "month": key % 100, "day": 1}
+    else:
+        parts = {"year": key // 10000, "month": key // 100 % 100, "day": key % 100}
+    start = _period_start(pd.to_datetime(pd.DataFrame(parts)), frequency).rename(spec["index"])
+    df = df.groupby([start] + [df.pop(k) for k in keys]).sum(min_count=1)
+
+    out = {}
+    for c in df.columns:
+        if c.endswith("__sum"):
+            base = c[:-len("__sum")]
+            n = df[f"{base}__n"]
+            out[base] = df[c] / n.where(n > 0)
+        elif not c.endswith("__n"):
+            out[c] = df[c]
+    return pd.DataFrame(out, index=df.index)
+
+# Métricas por fact (las medias como pares __sum/__n)
+SALES_METRICS = f"""
+    COALESCE(SUM(sales_amount), 0) AS sales_amount_total,
+    COALESCE(SUM(quantity), 0) AS sales_qty_total,
+    {_avg_sql("discount_percent", "avg_discount")},
+    {_avg_sql("profit_margin", "avg_profit_margin")}"""
+INVENTORY_METRICS = f"""
+    {_avg_sql("stock_qty", "inv_stock_avg")},
+    SUM(CASE WHEN stock_qty <= 0 THEN 1 ELSE 0 END) AS inv_stockouts,
+    {_avg_sql("stock_qty - reorder_level", "inv_reorder_gap_avg")},
+    {_avg_sql("unit_cost", "unit_cost_avg")},
+    COALESCE(SUM(total_value), 0) AS inv_value_total"""
+
+# Dimensiones del cubo de features: expresión y join necesario en cada fact que las tiene
+CUBE_DIMENSIONS = {
+    "store": {"fact_sales": ("f.store_key", None)},
+    "category": {"fact_sales": ("COALESCE(p.category_id, 0)", "p"),
+                 "fact_inventory_snapshot": ("COALESCE(p.category_id, 0)", "p")},
+    "segment": {"fact_sales": ("COALESCE(c.segment_label, 'UNKNOWN')", "c")},
+    "warehouse": {"fact_inventory_snapshot": ("f.warehouse_key", None)},
+}
+_CUBE_JOINS = {
+    "p": "LEFT JOIN dim_product p ON p.product_key = f.product_key",
+    "c": "LEFT JOIN dim_customer c ON c.customer_key = f.customer_key",
+}
+
+def _fact_sql(fact: str, metrics: str, dims: list[str] = ()) -> str:
+    """
+    One grouped scan of a fact by period and the given cube dimensions (star joins only as needed).
+    """
+    exprs = [CUBE_DIMENSIONS[d][fact] for d in dims]
+    joins = " ".join(_CUBE_JOINS[a] for a in dict.fromkeys(a for _, a in exprs if a))
+    select = "".join(f"{e} AS {d}, " for d, (e, _) in zip(dims, exprs))
+    group = "".join(f", {e}" for e, _ in exprs)
+    return f"SELECT {{period}} AS period, {select}{metrics} FROM {fact} f {joins} GROUP BY {{period}}{group}"
+
+def _hr_features(processed_dir: str, frequency: str) -> Optional[pd.DataFrame]:
+    if not (Path(processed_dir) / "stg_hr.parquet").exists():
+        return None
+    stg_hr = read_staging_frame(processed_dir, "hr", HR_COLUMNS)
+    if "review_date" not in stg_hr.columns:
+        return None
+    # Las medidas se leen en float32 cuando es exacto; se agregan en float64 como el staging original
+    stg_hr = stg_hr.astype({c: "float64" for c in HR_COLUMNS[1:] if c in stg_hr.columns})
+    index = _frequency(frequency)["index"]
+    stg_hr[index] = _period_start(stg_hr["review_date"], frequency)
+    return stg_hr.groupby(index).agg(
+        perf_score_avg=("performance_score","mean"),
+        hours_worked_avg=("hours_worked","mean"),
+        overtime_ratio=("overtime_hours", lambda s: (s.mean() / (s.mean()+1e-9)) ),
+        salary_avg=("salary","mean"),
+        bonus_avg=("bonus","mean"),
     )
-    # Agregación HR mensual
-    hr = pd.read_sql("""
-        SELECT * FROM dim_employee
-    """, con)
-
-    hr_month = None
-    stg_hr_path = Path("data/processed/stg_hr.parquet")
-    if stg_hr_path.exists():
-        stg_hr = pd.read_parquet(stg_hr_path)
-        if "review_date" in stg_hr.columns:
-            stg_hr["month"] = pd.to_datetime(stg_hr["review_date"]).dt.to_period("M").dt.to_timestamp()
-            hr_month = stg_hr.groupby("month").agg(
-                perf_score_avg=("performance_score","mean"),
-                hours_worked_avg=("hours_worked","mean"),
-                overtime_ratio=("overtime_hours", lambda s: (s.mean() / (s.mean()+1e-9)) ),
-                salary_avg=("salary","mean"),
-                bonus_avg=("bonus","mean"),
-            )
-    if hr_month is None:
-        hr_month = pd.DataFrame(index=s_agg.index, data={
+
+def _period_features(con, processed_dir: str = "data/processed", frequency: str = "M") -> pd.DataFrame:
+    # Agregación Sales por periodo (en el almacén: una fila por día o mes)
+    s_agg = _read_periods(con, _fact_sql("fact_sales", SALES_METRICS), frequency)
+    if len(s_agg) == 0:
+        return pd.DataFrame()
+
+    # Agregación HR por periodo
+    hr_agg = _hr_features(processed_dir, frequency)
+    if hr_agg is None:
+        hr_agg = pd.DataFrame(index=s_agg.index, data={
             "perf_score_avg": 0.0,
             "hours_worked_avg": 0.0,
             "overtime_ratio": 0.0,
             "salary_avg": 0.0,
             "bonus_avg": 0.0,
         })
-    # Agregación Inventory mensual
+    # Agregación Inventory por periodo
     inv_df = None
     try:
-        inv = pd.read_sql("""
-            SELECT date(substr(date_id,1,4)||'-'||substr(date_id,5,2)||'-'||substr(date_id,7,2)) as date,
-                   stock_qty, reorder_level, unit_cost, total_value
-            FROM fact_inventory_snapshot
-        """, con, parse_dates=["date"])
-        inv["month"] = inv["date"].dt.to_period("M").dt.to_timestamp()
-        inv_df = inv.groupby("month").agg(
-            inv_stock_avg=("stock_qty","mean"),
-            inv_stockouts=("stock_qty", lambda s: (s<=0).sum()),
-            inv_reorder_gap_avg=(("stock_qty"), "mean")
-        )
-        inv_df["inv_reorder_gap_avg"] = inv.groupby("month").apply(lambda g: (g["stock_qty"] - g["reorder_level"]).mean())
-        inv_df["unit_cost_avg"] = inv.groupby("month")["unit_cost"].mean()
-        inv_df["inv_value_total"] = inv.groupby("month")["total_value"].sum()
+        inv_df = _read_periods(con, _fact_sql("fact_inventory_snapshot", INVENTORY_METRICS), frequency)
     except Exception:
         inv_df = pd.DataFrame(index=s_agg.index, data={
             "inv_stock_avg": 0.0, "inv_stockouts": 0.0, "inv_reorder_gap_avg": 0.0, "unit_cost_avg": 0.0, "inv_value_total": 0.0
         })
 
-    features = s_agg.join(hr_month, how="outer").join(inv_df, how="outer").sort_index()
+    features = s_agg.join(hr_agg, how="outer").join(inv_df, how="outer").sort_index()
+    features.index.name = s_agg.index.name
     return features
 
-def run_pca(warehouse_path: str = "data/warehouse/warehouse.db", out_dir: str = "report", n_components: int = 5):
+def _feature_cube(con, dims: list[str], processed_dir: str = "data/processed", frequency: str = "M") -> pd.DataFrame:
+    """
+    Features per segment (combination of cube dimensions) and period. Each fact is aggregated in one
+    grouped scan by the cube dimensions it has; facts with all of them define the segments and the
+    others are joined on the shared dimensions. HR features are per period.
+    """
+    unknown = [d for d in dims if d not in CUBE_DIMENSIONS]
+    if unknown or not dims:
+        raise ValueError(f"Unknown cube dimensions {unknown}. Expected some of: {', '.join(CUBE_DIMENSIONS)}.")
+    index = _frequency(frequency)["index"]
+    facts = {"fact_sales": SALES_METRICS, "fact_inventory_snapshot": INVENTORY_METRICS}
+    parts = {}
+    for fact, metrics in facts.items():
+        keys = [d for d in dims if fact in CUBE_DIMENSIONS[d]]
+        parts[fact] = (keys, _read_periods(con, _fact_sql(fact, metrics, keys), frequency, tuple(keys)).reset_index())
+    full = [fact for fact, (keys, _) in parts.items() if len(keys) == len(dims)]
+    if not full:
+        raise ValueError(f"No fact table has all of {dims}; segments cannot be defined.")
+
+    on = [index] + list(dims)
+    cube = parts[full[0]][1]
+    for fact in full[1:]:
+        cube = cube.merge(parts[fact][1], on=on, how="outer")
+    for fact, (keys, df) in parts.items():
+        if fact not in full:
+            cube = cube.merge(df, on=[index] + keys, how="left")
+    hr = _hr_features(processed_dir, frequency)
+    if hr is not None:
+        cube = cube.merge(hr.reset_index(), on=index, how="left")
+    return cube.sort_values(list(dims) + [index], ignore_index=True)[list(dims) + [index] + [c for c in cube.columns if c not in on]]
+
+def _write_cube(cube: pd.DataFrame, path: Path, dims: list[str]) -> None:
+    # Parquet particionado por segmento (hive: store=3/category=5/...)
+    if path.exists():
+        shutil.rmtree(path)
+    pq.write_to_dataset(pa.Table.from_pandas(cube, preserve_index=False), path, partition_cols=list(dims))
+
+def _fit(X: np.ndarray, n_components: int) -> tuple[StandardScaler, PCA]:
+    scaler = StandardScaler()
+    Xs = scaler.fit_transform(X)
+    pca = PCA(n_components=min(n_components, Xs.shape[1], Xs.shape[0]))
+    pca.fit(Xs)
+    return scaler, pca
+
+def _window_fits(feats: pd.DataFrame, n_components: int, window) -> pd.DataFrame:
+    """
+    Refit the PCA on each window ending at every period: the last `window` periods (rolling) or
+    all periods so far ("expanding"). One row per window end with its explained variance ratios.
+    """
+    expanding = window == "expanding"
+    size = 2 if expanding else int(window)
+    if size < 2:
+        raise ValueError("pca.window must be 'expanding' or a number of periods >= 2.")
+    if len(feats) < size:
+        raise ValueError(f"pca.window={window} needs at least {size} periods, got {len(feats)}.")
+    X = feats.to_numpy(dtype=float)
+    rows = []
+    for end in range(size, len(X) + 1):
+        start = 0 if expanding else end - size
+        _, pca = _fit(X[start:end], n_components)
+        rows.append({
+            "period": feats.index[end - 1], "window_start": feats.index[start], "n_periods": end - start,
+            **{f"PC{i+1}": r for i, r in enumerate(pca.explained_variance_ratio_)},
+        })
+    return pd.DataFrame(rows)
+
+def _partial_fit(feats: pd.DataFrame, n_components: int, frequency: str, state_path: Path,
+                 drift: float = 3.0) -> tuple[dict, int, bool]:
+    """
+    Update the saved IncrementalPCA with the closed periods not seen yet (the last period is still open
+    and is left for a later run). The StandardScaler is fitted once and then frozen, so every batch the
+    PCA saw lives in the same standardized space. When the new periods drift away from it (mean |z| of
+    some feature above `drift`) the state is rebuilt over all closed periods, as it is when the
+    frequency, the feature columns or n_components change. Returns (state, periods added, rebuilt).
+    """
+    cols = list(feats.columns)
+    k = min(n_components, len(cols))
+    state = joblib.load(state_path) if state_path.exists() else None
+    if state is not None and (state["frequency"], state["columns"], state["n_components"]) != (frequency, cols, k):
+        state = None
+
+    closed = feats.iloc[:-1]
+    new = closed if state is None else closed[closed.index > state["last_period"]]
+    rebuilt = False
+    if state is not None and len(new):
+        z = state["scaler"].transform(new.to_numpy(dtype=float))
+        rebuilt = bool(np.abs(z).mean(axis=0).max() > drift)
+        if rebuilt:
+            state, new = None, closed
+    if state is None:
+        # El primer ajuste necesita al menos n_components filas
+        if len(new) < k:
+            raise ValueError(f"Incremental PCA needs at least {k} closed periods, got {len(closed)}.")
+        state = {"frequency": frequency, "columns": cols, "n_components": k, "last_period": None, "n_periods": 0,
+                 "scaler": StandardScaler().fit(new.to_numpy(dtype=float)), "pca": IncrementalPCA(n_components=k)}
+    if len(new) == 0:
+        return state, 0, False
+
+    state["pca"].partial_fit(state["scaler"].transform(new.to_numpy(dtype=float)))
+    state["last_period"] = new.index[-1]
+    state["n_periods"] += len(new)
+    tmp = state_path.with_name(state_path.name + ".tmp")
+    joblib.dump(state, tmp)
+    os.replace(tmp, state_path)
+    return state, len(new), rebuilt
+
+def _fit_segment(item: tuple) -> dict:
+    """
+    Worker: median-impute and fit scaler + PCA on one segment's periods.
+    """
+    key, X, n_components = item
+    X = np.where(np.isnan(X).all(axis=0), 0.0, X)
+    X = np.where(np.isnan(X), np.nanmedian(X, axis=0), X)
+    if len(X) < 2:
+        return {"key": key, "n_periods": len(X)}
+    _, pca = _fit(X, n_components)
+    return {"key": key, "n_periods": len(X), "ratios": pca.explained_variance_ratio_, "components": pca.components_}
+
+def _segment_pca(cube: pd.DataFrame, dims: list[str], n_components: int, workers: int = 4) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    One PCA per segment, fitted in parallel across processes. Returns the explained variance per
+    segment and the long-format loadings (segment, feature, PCs).
+    """
+    features = [c for c in cube.select_dtypes(include=[np.number]).columns if c not in dims]
+    items = [(key if isinstance(key, tuple) else (key,), g[features].to_numpy(dtype=float), n_components)
+             for key, g in cube.groupby(list(dims), sort=True)]
+    if workers > 1 and len(items) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            fits = list(pool.map(_fit_segment, items, chunksize=max(1, len(items) // (workers * 4))))
+    else:
+        fits = [_fit_segment(item) for item in items]
+
+    explained, loadings = [], []
+    for fit in fits:
+        seg = dict(zip(dims, fit["key"]))
+        ratios = fit.get("ratios", [])
+        explained.append({**seg, "n_periods": fit["n_periods"], **{f"PC{i+1}": r for i, r in enumerate(ratios)}})
+        if "components" in fit:
+            comp = pd.DataFrame(fit["components"].T, columns=[f"PC{i+1}" for i in range(len(ratios))])
+            loadings.append(comp.assign(feature=features, **seg))
+    loadings = pd.concat(loadings, ignore_index=True) if loadings else pd.DataFrame(columns=list(dims) + ["feature"])
+    front = list(dims) + ["feature"]
+    return pd.DataFrame(explained), loadings[front + [c for c in loadings.columns if c not in front]]
+
+def output_files(out_dir: str, frequency: str = "M", window=None, mode: str = "batch",
+                 segments: Optional[list[str]] = None) -> dict:
+    """
+    Files written by run_pca for the given options.
+    """
+    out = Path(out_dir)
+    files = {
+        "features_path": out / f"features_{_frequency(frequency)['name']}.csv",
+        "explained_path": out / "pca_explained_variance.csv",
+        "loadings_path": out / "pca_loadings.csv",
+        "summary_md": out / "pca_summary.md",
+    }
+    if window:
+        files["windows_path"] = out / "pca_windows.csv"
+    if mode == "incremental":
+        files["state_path"] = out / "pca_state.joblib"
+    if segments:
+        files["segments_path"] = out / "pca_segments.csv"
+        files["segment_loadings_path"] = out / "pca_segment_loadings.csv"
+    return {k: str(v) for k, v in files.items()}
+
+def run_pca(warehouse_path: str = "data/warehouse/warehouse.db", out_dir: str = "report", n_components: int = 5,
+            backend: str = "sqlite", processed_dir: str = "data/processed", frequency: str = "M",
+            window=None, mode: str = "batch", segments: Optional[list[str]] = None, workers: int = 4,
+            drift: float = 3.0):
+    """
+    PCA over per-period features (frequency D, W or M). With window (a number of periods or
+    "expanding") the PCA is also refit on each window and the reported model is the last window's.
+    mode="incremental" updates a saved IncrementalPCA with the new closed periods instead of refitting;
+    it is rebuilt when they drift more than `drift` standard deviations from the first fit.
+    With segments (e.g. ["store", "category"]) a segment × period feature cube is also built, saved as
+    partitioned parquet under <processed_dir>/feature_cube, and one PCA per segment is fitted in parallel.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown pca.mode '{mode}'. Expected one of: {', '.join(MODES)}.")
+    if mode == "incremental" and window:
+        raise ValueError("pca.window applies to batch mode; incremental PCA already accumulates all periods.")
+    files = output_files(out_dir, frequency, window, mode, segments)
     ensure_dir(out_dir)
-    con = _connect(warehouse_path)
+    con = connect(warehouse_path, backend)
     try:
-        feats = _monthly_features(con)
+        with step("period_features") as st:
+            feats = _period_features(con, processed_dir, frequency)
+            st["rows_out"] = len(feats)
+        if segments:
+            with step("feature_cube") as st:
+                cube = _feature_cube(con, segments, processed_dir, frequency)
+                st["rows_out"] = len(cube)
     finally:
         con.close()
     if feats.empty:
         raise ValueError("Check that the model step populated the warehouse.")
 
+    res = {}
+    if segments:
+        cube_path = Path(processed_dir) / "feature_cube"
+        _write_cube(cube, cube_path, segments)
+        with step("segment_pca", rows_in=len(cube)):
+            seg_explained, seg_loadings = _segment_pca(cube, segments, n_components, workers)
+        seg_explained.to_csv(files["segments_path"], index=False)
+        seg_loadings.to_csv(files["segment_loadings_path"], index=False)
+        res.update({"cube_path": str(cube_path), "n_segments": len(seg_explained)})
+
     # Faltantes
     feats = feats.copy()
     feats = feats.fillna(feats.median(numeric_only=True))
 
     num_cols = feats.select_dtypes(include=[np.number]).columns.tolist()
-    X = feats[num_cols].values
-
-    scaler = StandardScaler()
-    Xs = scaler.fit_transform(X)
 
-    pca = PCA(n_components=min(n_components, Xs.shape[1]))
-    Z = pca.fit_transform(Xs)
+    with step("pca", rows_in=len(feats)):
+        if mode == "incremental":
+            state, added, rebuilt = _partial_fit(feats[num_cols], n_components, frequency,
+                                                 Path(files["state_path"]), drift)
+            pca = state["pca"]
+            res.update({"periods_added": added, "periods_fitted": state["n_periods"], "rebuilt": rebuilt})
+        else:
+            fit_rows = feats[num_cols]
+            if window:
+                windows = _window_fits(fit_rows, n_components, window)
+                windows.to_csv(files["windows_path"], index=False)
+                fit_rows = fit_rows.loc[windows["window_start"].iloc[-1]:]
+                res["n_windows"] = len(windows)
+            _, pca = _fit(fit_rows.to_numpy(dtype=float), n_components)
 
     # Varianza y componentes
     explained = pd.DataFrame({
@@ -113,9 +392,9 @@ def run_pca(warehouse_path: str = "data/warehouse/warehouse.db", out_dir: str =
     loadings = pd.DataFrame(pca.components_.T, index=num_cols, columns=[f"PC{i+1}" for i in range(pca.n_components_)])
 
     # Save
-    feats.to_csv(Path(out_dir) / "features_monthly.csv", index=True)
-    explained.to_csv(Path(out_dir) / "pca_explained_variance.csv", index=False)
-    loadings.to_csv(Path(out_dir) / "pca_loadings.csv")
+    feats.to_csv(files["features_path"], index=True)
+    explained.to_csv(files["explained_path"], index=False)
+    loadings.to_csv(files["loadings_path"])
 
     # Reporte
     md = ["# PCA Resumen",
@@ -132,13 +411,13 @@ def run_pca(warehouse_path: str = "data/warehouse/warehouse.db", out_dir: str =
         md.append(top.to_markdown())
         md.append("")
 
-    (Path(out_dir) / "pca_summary.md").write_text("\n".join(md))
+    Path(files["summary_md"]).write_text("\n".join(md))
 
     return {
-        "features_path": str(Path(out_dir) / "features_monthly.csv"),
-        "explained_path": str(Path(out_dir) / "pca_explained_variance.csv"),
-        "loadings_path": str(Path(out_dir) / "pca_loadings.csv"),
-        "summary_md": str(Path(out_dir) / "pca_summary.md"),
+        **files,
         "n_rows": len(feats),
-        "n_features": len(num_cols)
-    }
\ No newline at end of file
+        "n_features": len(num_cols),
+        "frequency": frequency,
+        "mode": mode,
+        **res,
+    }
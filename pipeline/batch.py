@@ -0,0 +1,126 @@
+import os
+import glob
+import json
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional
+
+from .utils import ensure_dir, read_config
+
+REPORT_NAME = "batch_report.json"
+
+def resolve_configs(patterns: list[str]) -> list[Path]:
+    """
+    Config files of the tenants: each pattern is a path or a glob (recursive **), in order and without
+    duplicates.
+    """
+    out = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        if not matches or not all(Path(m).is_file() for m in matches):
+            raise FileNotFoundError(f"No config files match '{pattern}'.")
+        out += [Path(m).resolve() for m in matches]
+    return list(dict.fromkeys(out))
+
+def tenant_spec(config_path: str | Path) -> dict:
+    """
+    Name and root directory of a tenant from the optional `tenant` section of its config. The relative
+    paths of the config (raw files, staging, warehouse, report) are relative to the root, which defaults
+    to the directory of the config file; the name defaults to the root directory name.
+    """
+    config_path = Path(config_path).resolve()
+    opts = read_config(config_path).get("tenant") or {}
+    root = (config_path.parent / opts.get("root", ".")).resolve()
+    return {"name": str(opts.get("name") or root.name), "config_path": str(config_path), "root": str(root)}
+
+def _warm_up() -> None:
+    # Una vez por proceso: las importaciones pesadas (pandas, pyarrow, sklearn) se amortizan entre tenants
+    from . import dag  # noqa: F401
+
+def _run_tenant(tenant: dict, opts: dict) -> dict:
+    """
+    Run the DAG of one tenant inside its root directory. Errors are returned, not raised, so one tenant
+    cannot stop the others; the per-step run log goes to the tenant's run_log path.
+    """
+    from .dag import run_dag
+    from .instrument import run_log, write_run_log
+
+    start = time.perf_counter()
+    res = {"tenant": tenant["name"], "config_path": tenant["config_path"], "root": tenant["root"], "pid": os.getpid()}
+    cwd = os.getcwd()
+    try:
+        os.chdir(tenant["root"])
+        with run_log() as log:
+            dag = run_dag(targets=opts["stages"], config_path=tenant["config_path"], prefer_gdrive=opts["prefer_gdrive"],
+                          force=opts["force"], n_components=opts["n_components"], max_workers=opts["inner_workers"])
+        write_run_log(log, opts["run_log"], tenant=tenant["name"], ran=dag["ran"], fresh=dag["fresh"])
+        res.update(status="ok", ran=dag["ran"], fresh=dag["fresh"], results=dag["results"])
+    except Exception as e:
+        res.update(status="failed", error=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+    finally:
+        os.chdir(cwd)
+    res["seconds"] = round(time.perf_counter() - start, 3)
+    return res
+
+def run_batch(config_paths: list[str | Path], workers: int = 2, stages: Optional[list[str]] = None,
+              prefer_gdrive: bool = False, force: bool = False, n_components: int = 5,
+              run_log: str = "report/run_log.json", report_path: Optional[str] = None) -> dict:
+    """
+    Run the pipeline for many tenants (one config file each) across a process pool: each worker process
+    imports the pipeline once and runs tenants one after another. A failing tenant is reported without
+    stopping the rest; the per-tenant results are aggregated into one report (written to report_path).
+    Stages open process pools of their own (ingest.workers, pca.workers): with more than one tenant
+    process each of those pools is capped at cpu_count // workers (at least 1), so tenants × inner
+    processes stays around the CPU count instead of multiplying. Run serially, tenants keep their config.
+    """
+    tenants = [tenant_spec(p) for p in config_paths]
+    names = [t["name"] for t in tenants]
+    dup = sorted({n for n in names if names.count(n) > 1})
+    if dup:
+        raise ValueError(f"Duplicate tenant names {dup}. Set tenant.name in their config files.")
+    parallel = workers > 1 and len(tenants) > 1
+    inner = max(1, (os.cpu_count() or 1) // min(workers, len(tenants))) if parallel else None
+    opts = {"stages": stages, "prefer_gdrive": prefer_gdrive, "force": force, "n_components": n_components,
+            "run_log": run_log, "inner_workers": inner}
+
+    start = time.perf_counter()
+    results = {}
+    if parallel:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tenants)), initializer=_warm_up) as pool:
+            futures = {t["name"]: (t, pool.submit(_run_tenant, t, opts)) for t in tenants}
+            for name, (t, fut) in futures.items():
+                try:
+                    results[name] = fut.result()
+                except BrokenProcessPool as e:
+                    # El proceso murió (p.ej. sin memoria): se informa como fallo del tenant
+                    results[name] = {"tenant": name, "config_path": t["config_path"], "root": t["root"],
+                                     "status": "failed", "error": f"{type(e).__name__}: {e}"}
+    else:
+        for t in tenants:
+            results[t["name"]] = _run_tenant(t, opts)
+
+    report = {
+        "tenants": len(tenants),
+        "ok": sum(r["status"] == "ok" for r in results.values()),
+        "failed": sorted(n for n, r in results.items() if r["status"] != "ok"),
+        "seconds": round(time.perf_counter() - start, 3),
+        "workers": workers,
+        "inner_workers": inner,
+        "results": [results[n] for n in names],
+    }
+    if report_path:
+        path = Path(report_path)
+        ensure_dir(path.parent)
+        path.write_text(json.dumps(report, indent=2, default=str), encoding="utf-8")
+    return report
+
+def summary_rows(report: dict) -> list[dict]:
+    """
+    One row per tenant for the console summary: status, stages run / fresh, time and error.
+    """
+    return [{"tenant": r["tenant"], "status": r["status"], "ran": ",".join(r.get("ran", [])),
+             "fresh": ",".join(r.get("fresh", [])), "seconds": r.get("seconds"), "error": r.get("error", "")}
+            for r in report["results"]]
@@ -1,34 +1,136 @@
+import pstats
+from pathlib import Path
 import typer
 from typing import Optional
 
-from .ingest import run as ingest_run
-from .model import build_star
-from .analytics import run_pca
+from .query import MEASURES, DIMENSIONS
+from .utils import read_config, warehouse_backend, model_options, pca_options, query_options
 
+# Los módulos de las etapas (sklearn, pyarrow, gdown...) se importan dentro de cada comando: un comando
+# solo paga las importaciones que usa
 app = typer.Typer(help="HiloTools Data Pipeline")
 
 @app.command()
-def ingest(prefer_gdrive: bool = True, processed_dir: str = "data/processed", config_path: str = "config/config.yml"):
-    res = ingest_run(output_dir=processed_dir, config_path=config_path, prefer_gdrive=prefer_gdrive)
+def ingest(prefer_gdrive: bool = True, processed_dir: str = "data/processed", config_path: str = "config/config.yml",
+           force: bool = False):
+    from .ingest import run as ingest_run
+    res = ingest_run(output_dir=processed_dir, config_path=config_path, prefer_gdrive=prefer_gdrive, force=force)
     typer.echo(res)
 
+@app.command()
+def validate(processed_dir: str = "data/processed", out_dir: str = "report", config_path: str = "config/config.yml"):
+    import pandas as pd
+    from .validate import run as validate_run
+    res = validate_run(processed_dir=processed_dir, out_dir=out_dir, cfg=read_config(config_path))
+    typer.echo({k: v for k, v in res.items() if k != "failures"})
+    if res["failures"]:
+        typer.echo(pd.DataFrame(res["failures"]).to_markdown(index=False))
+
 @app.command("model")
-def model_cmd(processed_dir: str = "data/processed", warehouse_path: str = "data/warehouse/warehouse.db"):
-    res = build_star(processed_dir=processed_dir, warehouse_path=warehouse_path)
+def model_cmd(processed_dir: str = "data/processed", warehouse_path: str = "data/warehouse/warehouse.db",
+              incremental: bool = False, config_path: str = "config/config.yml", streaming: Optional[bool] = None):
+    from .model import build_star
+    cfg = read_config(config_path)
+    opts = model_options(cfg)
+    if streaming is not None:
+        opts["streaming"] = streaming
+    res = build_star(processed_dir=processed_dir, warehouse_path=warehouse_path, incremental=incremental,
+                     rfm=cfg.get("rfm"), backend=warehouse_backend(cfg), **opts)
     typer.echo(res)
 
 @app.command()
-def analytics(warehouse_path: str = "data/warehouse/warehouse.db", out_dir: str = "report", n_components: int = 5):
-    res = run_pca(warehouse_path=warehouse_path, out_dir=out_dir, n_components=n_components)
+def analytics(warehouse_path: str = "data/warehouse/warehouse.db", out_dir: str = "report", n_components: int = 5,
+              config_path: str = "config/config.yml"):
+    from .analytics import run_pca
+    cfg = read_config(config_path)
+    res = run_pca(warehouse_path=warehouse_path, out_dir=out_dir, n_components=n_components,
+                  backend=warehouse_backend(cfg), **pca_options(cfg))
     typer.echo(res)
 
+def _parse_where(items: list[str]) -> dict:
+    # dim=v, dim=v1,v2 (IN), dim>=v, dim<=v; los valores numéricos se convierten
+    def value(v):
+        for cast in (int, float):
+            try:
+                return cast(v)
+            except ValueError:
+                pass
+        return v
+    filters = {}
+    for item in items:
+        for op, bound in ((">=", "min"), ("<=", "max"), ("=", None)):
+            if op in item:
+                dim, raw = (s.strip() for s in item.split(op, 1))
+                break
+        else:
+            raise typer.BadParameter(f"Expected dim=value, dim>=value or dim<=value, got '{item}'.")
+        if bound:
+            filters.setdefault(dim, {})[bound] = value(raw)
+        else:
+            vals = [value(v) for v in raw.split(",")]
+            filters[dim] = vals if len(vals) > 1 else vals[0]
+    return filters
+
+@app.command("query")
+def query_cmd(measure: list[str] = typer.Option(..., "--measure", "-m", help=f"One of: {', '.join(MEASURES)}"),
+              by: list[str] = typer.Option([], "--by", "-b", help=f"One of: {', '.join(DIMENSIONS)}"),
+              where: list[str] = typer.Option([], "--where", "-w", help="dim=value, dim=v1,v2, dim>=value, dim<=value"),
+              warehouse_path: str = "data/warehouse/warehouse.db", config_path: str = "config/config.yml",
+              limit: Optional[int] = None, output: Optional[str] = None):
+    from .query import query as run_query, configure_cache
+    cfg = read_config(config_path)
+    opts = query_options(cfg)
+    # Cada invocación es un proceso nuevo: la caché se comparte en disco, junto al almacén por defecto
+    configure_cache(**{**opts, "cache_dir": opts["cache_dir"] or str(Path(warehouse_path).parent / "query_cache")})
+    df = run_query(warehouse_path, measure, by, _parse_where(where), backend=warehouse_backend(cfg), limit=limit)
+    if output:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(output, index=False)
+        typer.echo(f"[query] {len(df)} rows -> {output}")
+    else:
+        typer.echo(df.to_markdown(index=False))
+
 @app.command("run-all")
 def run_all(prefer_gdrive: bool = True, processed_dir: str = "data/processed", config_path: str = "config/config.yml",
-            warehouse_path: str = "data/warehouse/warehouse.db", out_dir: str = "report", n_components: int = 5):
-    ingest_run(output_dir=processed_dir, config_path=config_path, prefer_gdrive=prefer_gdrive)
-    build_star(processed_dir=processed_dir, warehouse_path=warehouse_path)
-    res = run_pca(warehouse_path=warehouse_path, out_dir=out_dir, n_components=n_components)
-    typer.echo(res)
+            warehouse_path: str = "data/warehouse/warehouse.db", out_dir: str = "report", n_components: int = 5,
+            force: bool = False, run_log: str = "report/run_log.json", profile: bool = False,
+            state_path: Optional[str] = None):
+    from .dag import run_dag
+    from .instrument import run_log as instrumented, summary, write_run_log
+    profile_dir = Path(out_dir) / "profiles" if profile else None
+    with instrumented(profile_dir=profile_dir) as log:
+        dag = run_dag(processed_dir=processed_dir, config_path=config_path, warehouse_path=warehouse_path,
+                      out_dir=out_dir, n_components=n_components, prefer_gdrive=prefer_gdrive, force=force,
+                      state_path=state_path)
+    ing = dag["results"]["ingest"]
+    if "ingest" in dag["ran"] and ing["skipped"]:
+        typer.echo(f"[ingest] Unchanged sources, skipped: {', '.join(ing['skipped'])}")
+    if dag["fresh"]:
+        typer.echo(f"[run-all] Up-to-date stages, skipped: {', '.join(dag['fresh'])}")
+    typer.echo(dag["results"]["analytics"])
+
+    # Registro por etapa: JSON + tabla resumen (y perfiles cProfile con --profile)
+    write_run_log(log, run_log, ran=dag["ran"], fresh=dag["fresh"], ingest=ing, model=dag["results"]["model"])
+    typer.echo(summary(log).to_markdown(index=False))
+    for name, path in log["profiles"].items():
+        typer.echo(f"\n[profile] {name}: {path}")
+        pstats.Stats(path).sort_stats("cumulative").print_stats(15)
+
+@app.command()
+def batch(configs: list[str] = typer.Argument(..., help="Config files or globs, one per tenant (e.g. 'tenants/*/config.yml')"),
+          workers: int = typer.Option(2, help="Tenants run at the same time (processes)"),
+          stage: list[str] = typer.Option([], "--stage", "-s", help="Target stages (default: all)"),
+          prefer_gdrive: bool = False, force: bool = False, n_components: int = 5,
+          run_log: str = typer.Option("report/run_log.json", help="Per-tenant run log, relative to the tenant root"),
+          report: str = "report/batch_report.json"):
+    import pandas as pd
+    from .batch import resolve_configs, run_batch, summary_rows
+    res = run_batch(resolve_configs(configs), workers=workers, stages=stage or None, prefer_gdrive=prefer_gdrive,
+                    force=force, n_components=n_components, run_log=run_log, report_path=report)
+    typer.echo(pd.DataFrame(summary_rows(res)).to_markdown(index=False))
+    typer.echo(f"[batch] {res['ok']}/{res['tenants']} tenants ok in {res['seconds']} s -> {report}")
+    if res["failed"]:
+        raise typer.Exit(code=1)
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
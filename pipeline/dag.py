@@ -0,0 +1,199 @@
+import os
+import json
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from .ingest import run as ingest_run, DOMAINS
+from .model import build_star
+from .validate import run as validate_run, REPORT_NAME
+from .analytics import run_pca, output_files
+from .instrument import step
+from .warehouse import warehouse_digest
+from .utils import read_config, file_sha256, config_digest, warehouse_backend, model_options, pca_options
+
+STATE_NAME = "stages.json"
+
+def _ingest_io(ctx: dict) -> dict:
+    return {
+        "inputs": [ctx["cfg"]["sources"]["local_files"][k] for k in DOMAINS],
+        "outputs": [str(Path(ctx["processed_dir"]) / f"stg_{k}.parquet") for k in DOMAINS],
+        "params": {},
+    }
+
+def _validate_io(ctx: dict) -> dict:
+    return {
+        "inputs": [str(Path(ctx["processed_dir"]) / f"stg_{k}.parquet") for k in DOMAINS],
+        "outputs": [str(Path(ctx["out_dir"]) / REPORT_NAME)],
+        "params": {},
+    }
+
+def _model_io(ctx: dict) -> dict:
+    return {
+        "inputs": [str(Path(ctx["processed_dir"]) / f"stg_{k}.parquet") for k in DOMAINS],
+        "outputs": [ctx["warehouse_path"]],
+        "params": {},
+    }
+
+def _analytics_io(ctx: dict) -> dict:
+    opts = pca_options(ctx["cfg"])
+    return {
+        "inputs": [ctx["warehouse_path"], str(Path(ctx["processed_dir"]) / "stg_hr.parquet")],
+        "outputs": list(output_files(ctx["out_dir"], opts["frequency"], opts["window"], opts["mode"],
+                                     opts["segments"]).values()),
+        "params": {"n_components": ctx["n_components"]},
+    }
+
+def _run_ingest(ctx: dict) -> dict:
+    # Las tablas Arrow pasan a model en memoria (no van al estado); en streaming model lee el parquet por bloques
+    handoff = not model_options(ctx["cfg"])["streaming"]
+    res = ingest_run(output_dir=ctx["processed_dir"], config_path=ctx["config_path"],
+                     prefer_gdrive=ctx["prefer_gdrive"], force=ctx["force"], return_tables=handoff,
+                     max_workers=ctx["max_workers"])
+    ctx["staging"] = res.pop("tables", None)
+    return res
+
+def _run_validate(ctx: dict) -> dict:
+    # Usa las tablas de ingest en memoria sin consumirlas (model las recoge después)
+    return validate_run(processed_dir=ctx["processed_dir"], out_dir=ctx["out_dir"], cfg=ctx["cfg"],
+                        staging=ctx.get("staging"))
+
+def _run_model(ctx: dict) -> dict:
+    return build_star(processed_dir=ctx["processed_dir"], warehouse_path=ctx["warehouse_path"],
+                      rfm=ctx["cfg"].get("rfm"), backend=warehouse_backend(ctx["cfg"]),
+                      staging=ctx.pop("staging", None), **model_options(ctx["cfg"]))
+
+def _run_analytics(ctx: dict) -> dict:
+    opts = pca_options(ctx["cfg"])
+    if ctx["max_workers"] is not None:
+        opts["workers"] = min(opts["workers"], ctx["max_workers"])
+    return run_pca(warehouse_path=ctx["warehouse_path"], out_dir=ctx["out_dir"], n_components=ctx["n_components"],
+                   backend=warehouse_backend(ctx["cfg"]), processed_dir=ctx["processed_dir"], **opts)
+
+# Etapas: dependencias, secciones de config que las afectan, ficheros de entrada/salida y ejecución
+STAGES = {
+    "ingest": {"deps": [], "config": ["sources", "columns", "ingest"], "io": _ingest_io, "run": _run_ingest},
+    "validate": {"deps": ["ingest"], "config": ["validation"], "io": _validate_io, "run": _run_validate},
+    "model": {"deps": ["validate"], "config": ["rfm", "warehouse", "model", "star_schema"], "io": _model_io, "run": _run_model},
+    "analytics": {"deps": ["model"], "config": ["pca", "warehouse"], "io": _analytics_io, "run": _run_analytics},
+}
+
+def _order(targets: list[str]) -> list[str]:
+    """
+    Targets plus their dependencies, in topological order.
+    """
+    out = []
+    def visit(name, path=()):
+        if name not in STAGES:
+            raise ValueError(f"Unknown stage '{name}'. Expected one of: {', '.join(STAGES)}.")
+        if name in path:
+            raise ValueError(f"Cycle in stage dependencies: {' -> '.join(path + (name,))}")
+        for dep in STAGES[name]["deps"]:
+            visit(dep, path + (name,))
+        if name not in out:
+            out.append(name)
+    for t in targets:
+        visit(t)
+    return out
+
+def _file_hash(path: str, files: dict, digest=file_sha256) -> Optional[str]:
+    """
+    Content hash of a file, recomputed only when its size or mtime changed since the last run.
+    """
+    p = Path(path)
+    if not p.exists():
+        files.pop(str(p), None)
+        return None
+    st = p.stat()
+    prev = files.get(str(p))
+    if prev and prev["size"] == st.st_size and prev["mtime_ns"] == st.st_mtime_ns:
+        return prev["sha256"]
+    files[str(p)] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest(p)}
+    return files[str(p)]["sha256"]
+
+def _fingerprint(path: str, files: dict, ctx: dict) -> Optional[str]:
+    # El almacén se identifica por el contenido de sus tablas: cada carga reescribe sus metadatos ETL
+    # (hora de carga, versión) y los bytes del fichero cambian aunque los datos sean los mismos
+    if path == ctx["warehouse_path"]:
+        backend = warehouse_backend(ctx["cfg"])
+        return _file_hash(path, files, lambda p: warehouse_digest(str(p), backend))
+    return _file_hash(path, files)
+
+def _inputs_digest(spec: dict, io: dict, ctx: dict, files: dict) -> str:
+    cfg = ctx["cfg"]
+    return config_digest({
+        "files": {p: _fingerprint(p, files, ctx) for p in io["inputs"]},
+        "config": {s: cfg.get(s) for s in spec["config"]},
+        "params": io["params"],
+    })
+
+def _read_state(path: Path) -> dict:
+    if not path.exists():
+        return {"stages": {}, "files": {}}
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"stages": {}, "files": {}}
+    state.setdefault("stages", {})
+    state.setdefault("files", {})
+    return state
+
+def _write_state(path: Path, state: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(state, indent=2, sort_keys=True, default=str), encoding="utf-8")
+    os.replace(tmp, path)
+
+def run_dag(targets: Optional[list[str]] = None, processed_dir: str = "data/processed", config_path: str = "config/config.yml",
+            warehouse_path: str = "data/warehouse/warehouse.db", out_dir: str = "report", n_components: int = 5,
+            prefer_gdrive: bool = True, force: bool = False, state_path: Optional[str] = None,
+            max_workers: Optional[int] = None) -> dict:
+    """
+    Run the stages needed for targets, skipping the fresh ones. A stage is fresh when the fingerprint of
+    its inputs (file contents, its config sections and parameters) matches the last successful run and
+    its outputs are still the files that run produced. With prefer_gdrive, ingest always runs: the remote
+    folder cannot be fingerprinted before downloading (unchanged sources are still skipped by its manifest).
+    max_workers caps the process pools of the stages (ingest.workers, pca.workers); it does not change
+    their outputs, so it is not part of the fingerprints.
+    """
+    cfg = read_config(config_path)
+    ctx = {"cfg": cfg, "config_path": config_path, "processed_dir": processed_dir, "warehouse_path": warehouse_path,
+           "out_dir": out_dir, "n_components": n_components, "prefer_gdrive": prefer_gdrive, "force": force,
+           "max_workers": max_workers}
+    state_path = Path(state_path) if state_path else Path(processed_dir) / STATE_NAME
+    state = _read_state(state_path)
+    files = state["files"]
+
+    res = {"ran": [], "fresh": [], "results": {}}
+    for name in _order(targets or list(STAGES)):
+        spec = STAGES[name]
+        io = spec["io"](ctx)
+        inputs = _inputs_digest(spec, io, ctx, files)
+        prev = state["stages"].get(name)
+        fresh = (
+            not force
+            and not (name == "ingest" and prefer_gdrive)
+            and prev is not None
+            and prev["inputs"] == inputs
+            and all(prev["outputs"].get(p) is not None and _fingerprint(p, files, ctx) == prev["outputs"][p] for p in io["outputs"])
+        )
+        if fresh:
+            res["fresh"].append(name)
+            res["results"][name] = prev["result"]
+            continue
+
+        with step(name) as st:
+            out = spec["run"](ctx)
+            st["rows_out"] = sum(v for k, v in out.items() if k.endswith("_rows") and isinstance(v, int)) or None
+        state["stages"][name] = {
+            # Tras ejecutar: ingest puede haber descargado nuevas versiones de sus entradas
+            "inputs": _inputs_digest(spec, io, ctx, files),
+            "outputs": {p: _fingerprint(p, files, ctx) for p in io["outputs"]},
+            "result": out,
+            "finished_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+        }
+        _write_state(state_path, state)
+        res["ran"].append(name)
+        res["results"][name] = out
+    return res
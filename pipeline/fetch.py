@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from pathlib import Path
+from typing import Optional
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from .instrument import step, collect, merge
+from .utils import ensure_dir, file_sha256
+
+# Descarga directa de Drive (confirm=t evita la página de aviso de ficheros grandes)
+DOWNLOAD_URL = "https://drive.usercontent.google.com/download?id={id}&export=download&confirm=t"
+INDEX_NAME = "index.json"
+CHUNK_BYTES = 1 << 20
+
+def list_gdrive_folder(url: str) -> list[dict]:
+    """
+    Files of a public Drive folder as [{"id", "name"}] (name relative to the folder), without downloading.
+    """
+    import gdown
+    files = gdown.download_folder(url=url, skip_download=True, quiet=True, use_cookies=False)
+    if files is None:
+        raise RuntimeError(f"Could not list Google Drive folder {url}.")
+    return [{"id": f.id, "name": f.path} for f in files]
+
+def remote_version(url: str, timeout: float = 30.0) -> Optional[str]:
+    """
+    Version token of a remote file from its headers: the MD5 from x-goog-hash when present, else the
+    ETag, else size + Last-Modified. None when the server exposes none of them.
+    """
+    with urlopen(Request(url, method="HEAD"), timeout=timeout) as r:
+        h = r.headers
+    md5 = [p.split("=", 1)[1] for p in h.get("x-goog-hash", "").split(",") if p.strip().startswith("md5=")]
+    if md5:
+        return f"md5:{md5[0]}"
+    etag = (h.get("ETag") or "").strip('"')
+    if etag:
+        return f"etag:{etag}"
+    if h.get("Content-Length") and h.get("Last-Modified"):
+        return f"len:{h['Content-Length']}:{h['Last-Modified']}"
+    return None
+
+def _safe(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
+
+def _read_index(cache: Path) -> dict:
+    try:
+        return json.loads((cache / INDEX_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def _write_index(cache: Path, index: dict) -> None:
+    tmp = cache / f"{INDEX_NAME}.tmp"
+    tmp.write_text(json.dumps(index, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, cache / INDEX_NAME)
+
+def _download(url: str, part: Path, timeout: float) -> None:
+    """
+    Download into part, resuming from its current size with a Range request. A server that ignores
+    the range (200 instead of 206) restarts the file.
+    """
+    have = part.stat().st_size if part.exists() else 0
+    req = Request(url, headers={"Range": f"bytes={have}-"} if have else {})
+    try:
+        r = urlopen(req, timeout=timeout)
+    except HTTPError as e:
+        if e.code != 416:  # Rango fuera del fichero: la descarga parcial ya está completa
+            raise
+        return
+    with r:
+        resumed = have and r.status == 206
+        # Tamaño total esperado: Content-Range en respuestas parciales, Content-Length en completas
+        total = r.headers.get("Content-Range", "").rpartition("/")[2] if resumed else r.headers.get("Content-Length")
+        with open(part, "ab" if resumed else "wb") as f:
+            shutil.copyfileobj(r, f, CHUNK_BYTES)
+    # Una conexión cortada puede terminar sin error: se reintenta (y reanuda) si faltan bytes
+    size = part.stat().st_size
+    if total and total.isdigit() and size != int(total):
+        raise OSError(f"Incomplete download of {url}: {size} of {total} bytes")
+
+def _retry(fn, retries: int, *args):
+    # Reintentos con espera exponencial para errores de red
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args)
+        except (URLError, OSError, HTTPException) as e:
+            # Los 4xx no se arreglan reintentando
+            if attempt == retries or (isinstance(e, HTTPError) and e.code < 500):
+                raise
+            time.sleep(min(2 ** attempt, 30))
+
+def _fetch_file(entry: dict, cache: Path, url_template: str, retries: int, timeout: float) -> dict:
+    """
+    Bring one file into the cache: <cache>/<file_id>/<sha256> (content-addressed). The version token
+    of the last download is kept in the index so unchanged files are not downloaded again.
+    """
+    url = url_template.format(id=entry["id"])
+    with step("head"):
+        version = _retry(remote_version, retries, url, timeout)
+    prev = entry.get("cached") or {}
+    blob = cache / entry["id"] / prev.get("sha256", "")
+    if version is not None and prev.get("version") == version and blob.is_file():
+        return dict(prev, name=entry["name"], status="cached")
+
+    folder = ensure_dir(cache / entry["id"])
+    part = folder / f"{_safe(version or 'unversioned')}.part"
+    # Descargas parciales de otras versiones no se pueden reanudar; sin versión tampoco
+    for old in folder.glob("*.part"):
+        if old != part or version is None:
+            old.unlink()
+    with step("download"):
+        # Cada reintento reanuda desde lo ya descargado
+        _retry(_download, retries, url, part, timeout)
+    sha = file_sha256(part)
+    os.replace(part, folder / sha)
+    return {"name": entry["name"], "version": version, "sha256": sha, "size": (folder / sha).stat().st_size,
+            "status": "downloaded"}
+
+def _stat(path: Path) -> Optional[dict]:
+    if not path.is_file():
+        return None
+    st = path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def _promote(blob: Path, target: Path) -> dict:
+    """
+    Atomically place a copy of a cached blob at target (a copy, not a link: edits to the raw file must
+    not alter the cache). Returns the stat of the promoted file.
+    """
+    ensure_dir(target.parent)
+    tmp = target.with_name(f".{target.name}.tmp")
+    shutil.copyfile(blob, tmp)
+    os.replace(tmp, target)
+    return _stat(target)
+
+def fetch_folder(files: list[dict], dest: str | Path, cache_dir: str | Path, url_template: str = DOWNLOAD_URL,
+                 workers: int = 4, retries: int = 2, timeout: float = 60.0) -> dict:
+    """
+    Fetch the listed files ([{"id", "name"}]) with a bounded thread pool: only files whose remote version
+    changed are downloaded (resuming partial downloads) into the content-addressed cache, then promoted
+    atomically into dest. Files that cannot be fetched are reported in "failed" and keep their
+    previous copy in dest.
+    """
+    cache = ensure_dir(Path(cache_dir))
+    index = _read_index(cache)
+    lock = threading.Lock()
+    res = {"downloaded": [], "cached": [], "promoted": [], "failed": {}}
+
+    def one(entry):
+        meta = _fetch_file(dict(entry, cached=index.get(entry["id"])), cache, url_template, retries, timeout)
+        with lock:
+            index[entry["id"]] = dict(index.get(entry["id"]) or {}, **{k: meta[k] for k in ("name", "version", "sha256", "size")})
+            _write_index(cache, index)
+        return meta
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {f["name"]: (f, pool.submit(collect, one, f)) for f in files}
+        for name, (entry, fut) in futures.items():
+            try:
+                meta, steps = fut.result()
+            except Exception as e:
+                res["failed"][name] = f"{type(e).__name__}: {e}"
+                continue
+            merge(steps, prefix="fetch")
+            res[meta["status"]].append(name)
+            # El fichero en dest solo se reemplaza si cambió el contenido en caché o alguien lo modificó
+            target = Path(dest) / name
+            promoted = index[entry["id"]].get("promoted")
+            if meta["status"] == "cached" and promoted and promoted == dict(_stat(target) or {}, sha256=meta["sha256"]):
+                continue
+            with lock:
+                index[entry["id"]]["promoted"] = dict(_promote(cache / entry["id"] / meta["sha256"], target),
+                                                      sha256=meta["sha256"])
+                _write_index(cache, index)
+            res["promoted"].append(name)
+    return res
@@ -1,22 +1,523 @@
 import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pandas.io.parsers import TextParser
 
-from .utils import normalize_columns, coerce_numeric, ensure_dir, read_config, to_parquet
+from .utils import normalize_columns, coerce_numeric, coerce_int, ensure_dir, read_config, file_sha256, config_digest
+from .instrument import step, iterate, merge, records, run_log
+from .fetch import list_gdrive_folder, fetch_folder, DOWNLOAD_URL
 
-def _download_gdrive_folder(url: str, dest: Path) -> None:
+MANIFEST_NAME = "manifest.json"
+
+# Tipos por dominio: numéricas (parsing decimal), fechas, IDs enteros y texto
+DOMAINS = {
+    "sales": {
+        "numeric": ["quantity","unit_price","discount_percent","sales_amount","profit_margin"],
+        "dates": ["sale_date"],
+        "ids": ["sale_id","product_id","customer_id","store_id"],
+        "strings": [],
+    },
+    "inventory": {
+        "numeric": ["stock_qty","reorder_level","unit_cost","total_value"],
+        "dates": ["snapshot_date"],
+        "ids": ["inventory_id","warehouse_id","category_id"],
+        "strings": ["product_code"],
+    },
+    "hr": {
+        "numeric": ["performance_score","hours_worked","overtime_hours","salary","bonus"],
+        "dates": ["review_date"],
+        "ids": ["record_id","employee_id","department_id"],
+        "strings": [],
+    },
+}
+
+def _download_gdrive_folder(url: str, dest: Path, opts: Optional[dict] = None) -> dict:
+    """
+    Fetch a public Google Drive folder (no auth required) through the local cache: only changed files
+    are downloaded, concurrently and resuming partial downloads, and promoted atomically into dest.
+    """
+    opts = opts or {}
+    with step("list_gdrive"):
+        files = list_gdrive_folder(url)
+    return fetch_folder(files, dest, opts.get("cache_dir", "data/cache/gdrive"),
+                        url_template=opts.get("download_url", DOWNLOAD_URL), workers=int(opts.get("workers", 4)),
+                        retries=int(opts.get("retries", 2)))
+
+def _convert_cell(value):
+    # Mismas conversiones que pd.read_excel: enteros en float -> int, fechas -> datetime
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)
+    if value == "":
+        return None
+    return value
+
+def _iter_sheet_rows(path: Path):
+    """
+    Row iterator over the first sheet. Uses python-calamine when installed, otherwise openpyxl in read-only mode.
+    """
+    try:
+        from python_calamine import CalamineWorkbook
+    except ImportError:
+        CalamineWorkbook = None
+
+    if CalamineWorkbook is not None:
+        wb = CalamineWorkbook.from_path(str(path))
+        yield from wb.get_sheet_by_index(0).iter_rows()
+        return
+
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+def _iter_xlsx_chunks(path: Path, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    rows = _iter_sheet_rows(path)
+    header = next(rows, None)
+    if header is None:
+        return
+    header = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+
+    def _frame(block):
+        # TextParser aplica los mismos na_values e inferencia de tipos que read_excel
+        return TextParser(block, names=header, header=None).read()
+
+    block = []
+    for row in rows:
+        values = [_convert_cell(v) for v in row]
+        if all(v is None for v in values):
+            continue
+        block.append(values)
+        if len(block) >= chunk_rows:
+            yield _frame(block)
+            block = []
+    if block:
+        yield _frame(block)
+
+def _read_manifest(out: Path) -> dict:
+    p = out / MANIFEST_NAME
+    if not p.exists():
+        return {}
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def _write_manifest(out: Path, manifest: dict) -> None:
+    tmp = out / f"{MANIFEST_NAME}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, out / MANIFEST_NAME)
+
+def _source_entry(path: Path, mapping: dict, previous: Optional[dict] = None) -> dict:
+    """
+    Fingerprint of a raw source. The sha256 is only recomputed when size or mtime changed.
+    """
+    st = path.stat()
+    entry = {
+        "path": str(path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "columns": config_digest(mapping),
+    }
+    if previous and previous.get("size") == st.st_size and previous.get("mtime_ns") == st.st_mtime_ns:
+        entry["sha256"] = previous.get("sha256")
+    else:
+        entry["sha256"] = file_sha256(path)
+    return entry
+
+def _is_unchanged(entry: dict, previous: Optional[dict], staging: Path) -> bool:
+    if not previous or not staging.exists():
+        return False
+    return all(entry[k] == previous.get(k) for k in ["sha256", "size", "columns"])
+
+def staging_schema(name: str, mapping: dict, extra: Iterable[str] = ()) -> pa.Schema:
     """
-    Download a public Google Drive folder using gdown (no auth required).
+    Arrow schema of a staging table, derived from the canonical columns in config.yml: float64 measures,
+    timestamp dates, int64 IDs and dictionary-encoded text. Extra source columns without a mapping are
+    kept after them, under their original names, as text unless they are canonical columns.
     """
-    import gdown
-    dest.mkdir(parents=True, exist_ok=True)
-    gdown.download_folder(url=url, output=str(dest), quiet=False, use_cookies=False)
+    spec = DOMAINS[name]
+    fields = []
+    for c in dict.fromkeys([*mapping.values(), *extra]):
+        if c in spec["numeric"]:
+            fields.append(pa.field(c, pa.float64()))
+        elif c in spec["dates"]:
+            fields.append(pa.field(c, pa.timestamp("ns")))
+        elif c in spec["ids"]:
+            fields.append(pa.field(c, pa.int64()))
+        else:
+            fields.append(pa.field(c, pa.dictionary(pa.int32(), pa.string())))
+    return pa.schema(fields)
 
-def _load_xlsx(path: Path) -> pd.DataFrame:
-    return pd.read_excel(path)
+def _dictionary_columns(name: str, schema: pa.Schema) -> list[str]:
+    # IDs y texto con páginas de diccionario en el parquet; las medidas float van planas
+    return [f.name for f in schema if f.name in DOMAINS[name]["ids"] or pa.types.is_dictionary(f.type)]
 
-def run(output_dir: str = "data/processed", config_path: str = "config/config.yml", prefer_gdrive: bool = True) -> dict:
+def read_staging(processed_dir: str | Path, name: str, columns: Optional[list[str]] = None) -> pa.Table:
+    """
+    Memory-mapped read of a staging table, projected to the requested columns that exist in the file.
+    """
+    path = Path(processed_dir) / f"stg_{name}.parquet"
+    if not path.exists():
+        raise FileNotFoundError(f"Missing staging file {path}. Run the ingest step first.")
+    if columns is not None:
+        names = set(pq.read_schema(path, memory_map=True).names)
+        columns = [c for c in columns if c in names]
+    return pq.read_table(path, columns=columns, memory_map=True)
+
+def iter_staging(processed_dir: str | Path, name: str, columns: Optional[list[str]] = None,
+                 batch_rows: int = 250000) -> Iterator[pa.RecordBatch]:
+    """
+    Stream a staging table in record batches of at most batch_rows rows, row group by row group,
+    so only one batch of the projected columns is decoded at a time.
+    """
+    path = Path(processed_dir) / f"stg_{name}.parquet"
+    if not path.exists():
+        raise FileNotFoundError(f"Missing staging file {path}. Run the ingest step first.")
+    pf = pq.ParquetFile(path, memory_map=True)
+    if columns is not None:
+        columns = [c for c in columns if c in pf.schema_arrow.names]
+    yield from pf.iter_batches(batch_size=batch_rows, columns=columns)
+
+# Enteros compactos: el menor ancho que cabe en el rango de la columna
+_INT_TYPES = [pa.int8(), pa.int16(), pa.int32(), pa.int64()]
+
+_DICT_TEXT = pa.dictionary(pa.int32(), pa.string())
+
+def _int_type(lo: Optional[int], hi: Optional[int]) -> pa.DataType:
+    if lo is None or hi is None:
+        return pa.int64()
+    for t in _INT_TYPES:
+        info = np.iinfo(t.to_pandas_dtype())
+        if info.min <= lo and hi <= info.max:
+            return t
+    return pa.int64()
+
+def _file_stats(pf: pq.ParquetFile, columns: list[str]) -> dict:
+    """
+    (min, max, null_count) of integer columns from the parquet row group statistics (no data is read).
+    min/max are None when some row group has no statistics.
+    """
+    meta = pf.metadata
+    index = {meta.schema.column(i).name: i for i in range(meta.num_columns)}
+    stats = {}
+    for c in columns:
+        lo = hi = None
+        nulls, known = 0, True
+        for g in range(meta.num_row_groups):
+            st = meta.row_group(g).column(index[c]).statistics
+            if st is None:
+                known = False
+                nulls = None
+                break
+            nulls += st.null_count
+            if st.has_min_max:
+                lo = st.min if lo is None else min(lo, st.min)
+                hi = st.max if hi is None else max(hi, st.max)
+            elif st.null_count < meta.row_group(g).num_rows:
+                known = False
+        stats[c] = (lo, hi, nulls) if known else (None, None, nulls)
+    return stats
+
+def _table_stats(table: pa.Table, columns: list[str]) -> dict:
+    return {c: (*(v.as_py() for v in pc.min_max(table.column(c)).values()), table.column(c).null_count) for c in columns}
+
+def _frame_from_batches(name: str, schema: pa.Schema, batches: Iterable[pa.RecordBatch], num_rows: int,
+                        stats: dict) -> pd.DataFrame:
+    """
+    Fill preallocated compact columns batch by batch, so neither a full-width Arrow table nor an
+    intermediate frame is ever held: IDs in the narrowest integer type of their range (nullable only when
+    they have nulls), measures in float32 while every value converts exactly (the column is widened to
+    float64 at the first inexact batch) and text as categorical.
+    """
+    spec = DOMAINS[name]
+    types, masks, chunks = {}, {}, {}
+    for f in schema:
+        c = f.name
+        if pa.types.is_dictionary(f.type) or pa.types.is_string(f.type) or pa.types.is_large_string(f.type):
+            chunks[c] = []
+        elif c in spec["ids"] and pa.types.is_integer(f.type):
+            lo, hi, nulls = stats.get(c, (None, None, None))
+            types[c] = _int_type(lo, hi).to_pandas_dtype()
+            if nulls != 0:
+                masks[c] = np.zeros(num_rows, dtype=bool)
+        elif c in spec["numeric"] and pa.types.is_float64(f.type):
+            types[c] = np.float32
+        else:
+            types[c] = f.type.to_pandas_dtype()
+
+    def exact32(x):
+        return np.array_equal(x.astype(np.float32).astype(np.float64), x, equal_nan=True)
+
+    cols = {}
+    pos = 0
+    for batch in batches:
+        end = pos + batch.num_rows
+        for c, arr in zip(batch.schema.names, batch.columns):
+            if c in chunks:
+                # Los bloques pueden traer índices de diccionario de distinto ancho: se unifican a int32
+                chunks[c].append((arr if pa.types.is_dictionary(arr.type) else arr.dictionary_encode()).cast(_DICT_TEXT))
+                continue
+            if c in masks:
+                masks[c][pos:end] = arr.is_null().to_numpy(zero_copy_only=False)
+                arr = arr.fill_null(0)
+            x = arr.to_numpy(zero_copy_only=False)
+            if types[c] is np.float32 and not exact32(x):
+                # Se reserva con el tipo visto en el primer bloque; después solo se ensancha si hace falta
+                types[c] = np.float64
+                if c in cols:
+                    cols[c] = cols[c].astype(np.float64)
+            if c not in cols:
+                cols[c] = np.empty(num_rows, dtype=types[c])
+            cols[c][pos:end] = x
+        pos = end
+    for c, t in types.items():
+        cols.setdefault(c, np.empty(0, dtype=t))
+
+    data = {}
+    for f in schema:
+        c = f.name
+        if c in chunks:
+            data[c] = pa.chunked_array(chunks.pop(c), type=_DICT_TEXT).to_pandas() \
+                if chunks[c] else pd.Categorical([])
+        elif c in masks and masks[c].any():
+            data[c] = pd.arrays.IntegerArray(cols.pop(c), masks.pop(c))
+        else:
+            data[c] = cols.pop(c)
+    # copy=False: cada columna queda en su propio bloque, sin consolidar (no duplica la memoria)
+    return pd.DataFrame(data, copy=False)
+
+def staging_frame(table: pa.Table | pa.RecordBatch, name: Optional[str] = None) -> pd.DataFrame:
+    """
+    pandas view of a staging table. Without a domain name: nullable Int64 IDs and dictionary text decoded
+    to plain strings. With it: compact dtypes (narrow integers, exact float32 measures, categorical text).
+    """
+    if isinstance(table, pa.RecordBatch):
+        table = pa.Table.from_batches([table])
+    if name is not None:
+        ids = [c for c in DOMAINS[name]["ids"] if c in table.column_names]
+        return _frame_from_batches(name, table.schema, table.to_batches(), table.num_rows, _table_stats(table, ids))
+    for i, f in enumerate(table.schema):
+        if pa.types.is_dictionary(f.type):
+            table = table.set_column(i, f.name, table.column(i).cast(f.type.value_type))
+    return table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+
+def read_staging_frame(processed_dir: str | Path, name: str, columns: Optional[list[str]] = None,
+                       batch_rows: int = 20000) -> pd.DataFrame:
+    """
+    Compact DataFrame of a staging table (see staging_frame) filled from the parquet batch by batch;
+    integer widths come from the row group statistics. Row groups are read sequentially without
+    pre-buffering and in small batches: the Arrow pool keeps the decode buffers of the largest batch.
+    """
+    path = Path(processed_dir) / f"stg_{name}.parquet"
+    if not path.exists():
+        raise FileNotFoundError(f"Missing staging file {path}. Run the ingest step first.")
+    pf = pq.ParquetFile(path, pre_buffer=False)
+    names = pf.schema_arrow.names
+    columns = names if columns is None else [c for c in columns if c in names]
+    stats = _file_stats(pf, [c for c in DOMAINS[name]["ids"] if c in columns])
+    batches = pf.iter_batches(batch_size=batch_rows, columns=columns, use_threads=False)
+    schema = pa.schema([pf.schema_arrow.field(c) for c in columns])
+    return _frame_from_batches(name, schema, batches, pf.metadata.num_rows, stats)
+
+def _normalize_chunk(name: str, df: pd.DataFrame, mapping: dict) -> pd.DataFrame:
+    spec = DOMAINS[name]
+
+    # Normalizar columnas
+    df = normalize_columns(df, mapping)
+    df = coerce_numeric(df, spec["numeric"])
+    df = coerce_int(df, spec["ids"])
+
+    # Fechas
+    for c in spec["dates"]:
+        if c in df.columns:
+            df[c] = pd.to_datetime(df[c], errors="coerce")
+
+    # Texto: esquema estable entre bloques
+    for c in df.columns:
+        if c not in spec["numeric"] and c not in spec["dates"] and c not in spec["ids"]:
+            df[c] = df[c].astype("string").astype(object).where(df[c].notna(), None)
+    return df
+
+def _find_hashes(runs: list[tuple[np.ndarray, np.ndarray]], h: np.ndarray) -> np.ndarray:
+    """
+    Staging row of the first stored row with each hash (-1 when unseen), searched in every sorted run.
+    """
+    found = np.full(len(h), -1, dtype=np.int64)
+    for keys, rows in runs:
+        pos = np.searchsorted(keys, h).clip(max=len(keys) - 1)
+        hit = keys[pos] == h
+        found[hit] = rows[pos[hit]]
+    return found
+
+def _add_hashes(runs: list[tuple[np.ndarray, np.ndarray]], h: np.ndarray, rows: np.ndarray) -> None:
+    """
+    Append (hash, staging row) pairs as a new sorted run; runs of similar size are merged (like a binary
+    counter), so there are O(log n) runs and each pair is re-sorted O(log n) times.
+    """
+    if len(h) == 0:
+        return
+    order = np.argsort(h, kind="stable")
+    keys, rows = h[order], rows[order]
+    while runs and len(runs[-1][0]) <= len(keys):
+        prev_keys, prev_rows = runs.pop()
+        keys, rows = np.concatenate([prev_keys, keys]), np.concatenate([prev_rows, rows])
+        order = np.argsort(keys, kind="stable")
+        keys, rows = keys[order], rows[order]
+    runs.append((keys, rows))
+
+def _read_rows(pf: pq.ParquetFile, rows: np.ndarray) -> pd.DataFrame:
+    """
+    The given staging rows (sorted, unique), reading only the row groups that hold them.
+    """
+    meta = pf.metadata
+    starts = np.cumsum([0] + [meta.row_group(i).num_rows for i in range(meta.num_row_groups)])
+    groups = np.searchsorted(starts, rows, side="right") - 1
+    parts = [pf.read_row_group(g).take(pa.array(rows[groups == g] - starts[g])) for g in np.unique(groups)]
+    df = pa.concat_tables(parts).to_pandas() if parts else pf.schema_arrow.empty_table().to_pandas()
+    return df.set_index(pd.Index(rows))
+
+def _confirmed_duplicates(path: Path, candidates: np.ndarray, matches: np.ndarray) -> np.ndarray:
+    """
+    Staging rows among the hash candidates that are equal, column by column, to their earlier match.
+    """
+    pf = pq.ParquetFile(path)
+    stored = _read_rows(pf, np.unique(np.concatenate([candidates, matches])))
+    a = stored.loc[candidates].reset_index(drop=True)
+    b = stored.loc[matches].reset_index(drop=True)
+    same = ((a == b) | (a.isna() & b.isna())).all(axis=1).to_numpy()
+    return candidates[same]
+
+def _drop_rows(src: Path, dest: Path, rows: np.ndarray, dictionary: list[str]) -> None:
+    """
+    Rewrite src into dest row group by row group without the given staging rows.
+    """
+    pf = pq.ParquetFile(src)
+    with pq.ParquetWriter(dest, pf.schema_arrow, use_dictionary=dictionary) as writer:
+        offset = 0
+        for g in range(pf.metadata.num_row_groups):
+            table = pf.read_row_group(g)
+            local = rows[(rows >= offset) & (rows < offset + table.num_rows)] - offset
+            keep = np.ones(table.num_rows, dtype=bool)
+            keep[local] = False
+            writer.write_table(table.filter(pa.array(keep)))
+            offset += table.num_rows
+
+def _ingest_domain(name: str, path: Path, mapping: dict, staging: Path, chunk_rows: int = 50000,
+                   keep_table: bool = False) -> tuple[int, Optional[pa.Table]]:
+    """
+    Stream a workbook in row chunks: normalize and coerce each chunk to the staging schema and append
+    it as a row group to the staging parquet. Duplicates within a chunk are dropped exactly; across
+    chunks a 64-bit row hash is only a pre-filter: rows whose hash was already stored are candidates,
+    compared column by column against the stored row once the file is written, and only the confirmed
+    ones are removed (a hash collision can keep a duplicate, never drop a distinct row). Besides one
+    chunk, memory holds 16 bytes per distinct row (hash and row) plus the candidates.
+    With keep_table, the written chunks are also returned as one Arrow table for in-process handoff.
+    """
+    tmp = staging.with_name(staging.name + ".tmp")
+    deduped = staging.with_name(staging.name + ".dedupe.tmp")
+    ensure_dir(staging.parent)
+    schema = writer = None
+    runs = []
+    candidates, matches = [], []
+    rows = 0
+    kept = []
+    try:
+        for chunk in iterate("read_xlsx", _iter_xlsx_chunks(path, chunk_rows)):
+            with step("normalize", rows_in=len(chunk)) as st:
+                df = _normalize_chunk(name, chunk, mapping)
+                if schema is None:
+                    # Columnas sin mapeo: se conservan como texto, igual que antes del esquema tipado
+                    schema = staging_schema(name, mapping, [c for c in df.columns if c not in mapping.values()])
+                    dictionary = _dictionary_columns(name, schema)
+                    writer = pq.ParquetWriter(tmp, schema, use_dictionary=dictionary)
+                df = df[schema.names]
+                st["rows_out"] = len(df)
+
+            # Duplicates
+            with step("dedupe", rows_in=len(df)) as st:
+                df = df[~df.duplicated()]
+                h = pd.util.hash_pandas_object(df, index=False).to_numpy()
+                at = rows + np.arange(len(df), dtype=np.int64)
+                found = _find_hashes(runs, h)
+                cand = found >= 0
+                candidates.append(at[cand])
+                matches.append(found[cand])
+                # Solo la primera fila de cada hash entra en las runs
+                new = ~cand & ~pd.Series(h).duplicated().to_numpy()
+                _add_hashes(runs, h[new], at[new])
+                st["rows_out"] = len(df) - int(cand.sum())
+
+            with step("write_parquet", rows_in=len(df)):
+                table = pa.Table.from_pandas(df, schema=schema, preserve_index=False).replace_schema_metadata()
+                writer.write_table(table)
+            if keep_table:
+                kept.append(table)
+            rows += len(df)
+        if schema is None:
+            schema = staging_schema(name, mapping)
+            dictionary = _dictionary_columns(name, schema)
+            writer = pq.ParquetWriter(tmp, schema, use_dictionary=dictionary)
+        writer.close()
+        writer = None
+
+        candidates = np.concatenate(candidates) if candidates else np.empty(0, dtype=np.int64)
+        dups = np.empty(0, dtype=np.int64)
+        if len(candidates):
+            with step("confirm_duplicates", rows_in=len(candidates)) as st:
+                dups = _confirmed_duplicates(tmp, candidates, np.concatenate(matches))
+                st["rows_out"] = len(dups)
+        if len(dups):
+            _drop_rows(tmp, deduped, np.sort(dups), dictionary)
+            os.replace(deduped, staging)
+        else:
+            os.replace(tmp, staging)
+    finally:
+        if writer is not None:
+            writer.close()
+        for p in (tmp, deduped):
+            if p.exists():
+                p.unlink()
+    rows -= len(dups)
+    if not keep_table:
+        return rows, None
+    table = pa.concat_tables(kept) if kept else schema.empty_table()
+    if len(dups):
+        keep = np.ones(table.num_rows, dtype=bool)
+        keep[dups] = False
+        table = table.filter(pa.array(keep))
+    return rows, table
+
+def _ingest_domain_logged(name: str, *args) -> tuple[tuple[int, Optional[pa.Table]], list[dict]]:
+    """
+    Worker entry point: ingest one domain and return its step records so the parent can merge them.
+    """
+    with run_log() as log:
+        with step(name) as st:
+            out = _ingest_domain(name, *args)
+            st["rows_out"] = out[0]
+    return out, records(log)
+
+def run(output_dir: str = "data/processed", config_path: str = "config/config.yml", prefer_gdrive: bool = True,
+        force: bool = False, return_tables: bool = False, max_workers: Optional[int] = None) -> dict:
+    """
+    Ingest the three domains into staging parquet. max_workers caps ingest.workers (e.g. when the
+    caller already runs in a process pool). With return_tables, res["tables"] also holds the
+    staging Arrow tables so build_star does not read them again: kept from the write when ingesting in
+    process, read back memory-mapped for skipped domains and for domains ingested by worker processes
+    (whose tables are never pickled back).
+    """
     cfg = read_config(config_path)
     out = Path(output_dir)
     ensure_dir(out)
@@ -24,55 +525,70 @@ def run(output_dir: str = "data/processed", config_path: str = "config/config.ym
     # Google Drive
     raw_dir = Path("data/raw")
     ensure_dir(raw_dir)
+    fetched = None
     if prefer_gdrive and cfg["sources"].get("gdrive_folder_url"):
         try:
-            _download_gdrive_folder(cfg["sources"]["gdrive_folder_url"], raw_dir)
+            fetched = _download_gdrive_folder(cfg["sources"]["gdrive_folder_url"], raw_dir, cfg["sources"].get("fetch"))
         except Exception as e:
-            print(f"[WARN] Could not download from Google Drive: {e}. Falling back to local files...")
+            print(f"[WARN] Could not list the Google Drive folder: {e}. Falling back to local files...")
+        else:
+            for name, err in fetched["failed"].items():
+                print(f"[WARN] Could not fetch {name} from Google Drive ({err}); using the local copy if present.")
 
     # Local
-    paths = {k: Path(cfg["sources"]["local_files"][k]) for k in ["sales","inventory","hr"]}
+    paths = {k: Path(cfg["sources"]["local_files"][k]) for k in DOMAINS}
     for k,v in paths.items():
         if not v.exists():
             raise FileNotFoundError(f"Missing required file {k}: {v}. Ensure Google Drive download or place locally.")
 
-    sales = _load_xlsx(paths["sales"])
-    inv = _load_xlsx(paths["inventory"])
-    hr = _load_xlsx(paths["hr"])
+    # Manifest: fuentes sin cambios no se vuelven a parsear ni escribir
+    manifest = _read_manifest(out)
+    entries = {}
+    skipped = []
+    stale = []
+    for name, path in paths.items():
+        entries[name] = _source_entry(path, cfg["columns"][name], manifest.get(name))
+        if not force and _is_unchanged(entries[name], manifest.get(name), out / f"stg_{name}.parquet"):
+            entries[name]["rows"] = manifest[name].get("rows")
+            skipped.append(name)
+        else:
+            stale.append(name)
 
-    # Normalizar columnas
-    sales = normalize_columns(sales, cfg["columns"]["sales"])
-    inv = normalize_columns(inv, cfg["columns"]["inventory"])
-    hr = normalize_columns(hr, cfg["columns"]["hr"])
+    # Dominios en paralelo, uno por proceso
+    opts = cfg.get("ingest", {})
+    chunk_rows = int(opts.get("chunk_rows", 50000))
+    workers = int(opts.get("workers", len(DOMAINS)))
+    if max_workers is not None:
+        workers = min(workers, max_workers)
+    workers = min(workers, len(stale))
+    # Solo en proceso se conservan las tablas escritas; desde un worker habría que serializarlas enteras de vuelta,
+    # así que con varios workers el proceso principal lee el parquet ya escrito (memory-mapped)
+    keep = return_tables and workers <= 1
+    jobs = {name: (name, paths[name], cfg["columns"][name], out / f"stg_{name}.parquet", chunk_rows, keep)
+            for name in stale}
+    tables = {}
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {name: pool.submit(_ingest_domain_logged, *args) for name, args in jobs.items()}
+            for name, fut in futures.items():
+                (entries[name]["rows"], tables[name]), steps = fut.result()
+                merge(steps)
+    else:
+        for name, args in jobs.items():
+            with step(name) as st:
+                entries[name]["rows"], tables[name] = _ingest_domain(*args)
+                st["rows_out"] = entries[name]["rows"]
 
-    sales = coerce_numeric(sales, ["quantity","unit_price","discount_percent","sales_amount","profit_margin"])
-    inv = coerce_numeric(inv, ["stock_qty","reorder_level","unit_cost","total_value"])
-    hr = coerce_numeric(hr, ["performance_score","hours_worked","overtime_hours","salary","bonus"])
+    res = {}
+    for name in paths:
+        manifest[name] = entries[name]
+        res[f"{name}_rows"] = entries[name]["rows"]
+    _write_manifest(out, manifest)
 
-    # Fechas
-    for c in ["sale_date"]:
-        if c in sales.columns:
-            sales[c] = pd.to_datetime(sales[c], errors="coerce")
-    for c in ["snapshot_date"]:
-        if c in inv.columns:
-            inv[c] = pd.to_datetime(inv[c], errors="coerce")
-    for c in ["review_date"]:
-        if c in hr.columns:
-            hr[c] = pd.to_datetime(hr[c], errors="coerce")
-
-    # Duplicates
-    sales = sales.drop_duplicates()
-    inv = inv.drop_duplicates()
-    hr = hr.drop_duplicates()
-
-    # Save parquet
-    to_parquet(sales, out / "stg_sales.parquet")
-    to_parquet(inv, out / "stg_inventory.parquet")
-    to_parquet(hr, out / "stg_hr.parquet")
-
-    return {
-        "sales_rows": len(sales),
-        "inventory_rows": len(inv),
-        "hr_rows": len(hr),
-        "processed_dir": str(out)
-    }
\ No newline at end of file
+    res["skipped"] = skipped
+    res["processed_dir"] = str(out)
+    if fetched is not None:
+        res["fetch"] = fetched
+    if return_tables:
+        res["tables"] = {name: tables[name] if tables.get(name) is not None else read_staging(out, name) for name in paths}
+    return res
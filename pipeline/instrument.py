@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Registro activo por hilo; sin registro, step/timed/iterate no miden nada
+_state = threading.local()
+_DONE = object()
+# Tamaño de página para leer /proc/self/statm (sysconf no existe en Windows)
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def current() -> Optional[dict]:
+    return getattr(_state, "log", None)
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    High-water mark of the process RSS since it started (not resettable: it never goes down).
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux en KiB, macOS en bytes
+    return round(rss / (1 << 20) if sys.platform == "darwin" else rss / 1024, 1)
+
+def rss_mb() -> Optional[float]:
+    """
+    Current RSS of the process (Linux /proc; None elsewhere).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * _PAGE_SIZE / (1 << 20), 1)
+
+def _rows(obj) -> Optional[int]:
+    return len(obj) if isinstance(obj, (pd.DataFrame, pd.Series)) else None
+
+def _add(log: dict, rec: dict) -> None:
+    """
+    Steps with the same path are accumulated: times, rows and RSS deltas are summed, the process RSS
+    high-water mark is the max.
+    """
+    cur = log["steps"].get(rec["step"])
+    if cur is None:
+        # Se conserva la posición reservada al entrar al paso (orden de inicio, no de fin)
+        log["steps"][rec["step"]] = dict(rec)
+        return
+    cur["calls"] += rec["calls"]
+    cur["wall_s"] = round(cur["wall_s"] + rec["wall_s"], 4)
+    cur["cpu_s"] = round(cur["cpu_s"] + rec["cpu_s"], 4)
+    for k in ["rows_in", "rows_out", "rss_delta_mb"]:
+        if rec[k] is not None:
+            cur[k] = rec[k] if cur[k] is None else round(cur[k] + rec[k], 1)
+    if rec["max_rss_mb"] is not None:
+        cur["max_rss_mb"] = max(cur["max_rss_mb"] or 0, rec["max_rss_mb"])
+
+@contextmanager
+def run_log(profile_dir: Optional[str | Path] = None) -> Iterator[dict]:
+    """
+    Collect the steps run inside the block. With profile_dir, top-level steps run under cProfile
+    and their stats are dumped to <profile_dir>/<step>.prof.
+    """
+    prev = current()
+    log = {
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "steps": {},
+        "stack": [],
+        "profile_dir": str(profile_dir) if profile_dir else None,
+        "profiles": {},
+    }
+    _state.log = log
+    try:
+        yield log
+    finally:
+        _state.log = prev
+
+@contextmanager
+def step(name: str, rows_in: Optional[int] = None) -> Iterator[dict]:
+    """
+    Measure wall time, CPU time and memory of a block. The yielded dict accepts rows_in / rows_out
+    (and calls=0 for a block that should not count as a call). Memory is reported as rss_delta_mb,
+    the change of the current RSS across the block (memory the step kept or released; transient
+    peaks inside the step are not seen), and max_rss_mb, the process high-water mark when the block
+    ended: it only grows over a run and is not attributable to the step.
+    """
+    rec = {"rows_in": rows_in, "rows_out": None}
+    log = current()
+    if log is None:
+        yield rec
+        return
+
+    log["stack"].append(name)
+    path = "/".join(log["stack"])
+    log["steps"].setdefault(path, None)
+    prof = cProfile.Profile() if log["profile_dir"] and len(log["stack"]) == 1 else None
+    w0, c0, m0 = time.perf_counter(), time.process_time(), rss_mb()
+    if prof is not None:
+        prof.enable()
+    try:
+        yield rec
+    finally:
+        if prof is not None:
+            prof.disable()
+            out = Path(log["profile_dir"]) / f"{name}.prof"
+            out.parent.mkdir(parents=True, exist_ok=True)
+            prof.dump_stats(out)
+            log["profiles"][name] = str(out)
+        log["stack"].pop()
+        m1 = rss_mb()
+        _add(log, {
+            "step": path,
+            "calls": rec.get("calls", 1),
+            "wall_s": round(time.perf_counter() - w0, 4),
+            "cpu_s": round(time.process_time() - c0, 4),
+            "rss_delta_mb": round(m1 - m0, 1) if m0 is not None and m1 is not None else None,
+            "max_rss_mb": peak_rss_mb(),
+            "rows_in": rec["rows_in"],
+            "rows_out": rec["rows_out"],
+        })
+
+def timed(name: Optional[str] = None):
+    """
+    Decorator version of step. Rows in/out are taken from the first argument and the result when
+    they are DataFrames or Series.
+    """
+    def deco(fn):
+        label = name or fn.__name__.lstrip("_")
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if current() is None:
+                return fn(*args, **kwargs)
+            with step(label, rows_in=_rows(args[0]) if args else None) as rec:
+                out = fn(*args, **kwargs)
+                rec["rows_out"] = _rows(out)
+            return out
+        return wrapper
+    return deco
+
+def iterate(name: str, iterable: Iterable) -> Iterator:
+    """
+    Time each next() of an iterator (e.g. reading row chunks) as one accumulated step. The final
+    next() that exhausts the iterator adds its time but does not count as a call.
+    """
+    it = iter(iterable)
+    while True:
+        with step(name) as rec:
+            item = next(it, _DONE)
+            rec["rows_out"] = _rows(item)
+            if item is _DONE:
+                rec["calls"] = 0
+        if item is _DONE:
+            return
+        yield item
+
+def merge(records: list[dict], prefix: Optional[str] = None) -> None:
+    """
+    Add step records collected elsewhere (e.g. in a worker process) under the current step.
+    """
+    log = current()
+    if log is None:
+        return
+    base = "/".join(log["stack"] + ([prefix] if prefix else []))
+    for rec in records:
+        _add(log, dict(rec, step=f"{base}/{rec['step']}" if base else rec["step"]))
+
+def collect(fn, *args, **kwargs) -> tuple:
+    """
+    Run fn under its own run log (e.g. in a worker thread or process) and return (result, step records),
+    to be passed to merge() by the caller.
+    """
+    with run_log() as log:
+        out = fn(*args, **kwargs)
+    return out, records(log)
+
+def records(log: dict) -> list[dict]:
+    return list(log["steps"].values())
+
+def summary(log: dict) -> pd.DataFrame:
+    cols = ["step", "calls", "wall_s", "cpu_s", "rss_delta_mb", "max_rss_mb", "rows_in", "rows_out"]
+    return pd.DataFrame(records(log), columns=cols)
+
+def write_run_log(log: dict, path: str | Path, **extra) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"started": log["started"], **extra, "steps": records(log), "profiles": log["profiles"]}
+    path.write_text(json.dumps(payload, indent=2, default=str), encoding="utf-8")
+    return path
@@ -0,0 +1,81 @@
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+from .warehouse import connect, read_key_registry
+
+# Entidades del registro: IDs enteros (la clave subrogada es el propio ID mientras esté libre) y
+# códigos de producto (se resuelven a la clave del product_id de sus dígitos finales)
+ID_ENTITIES = ("product_id", "store_id", "employee_id")
+CODE_ENTITIES = {"product_code": "product_id"}
+
+def new_registry(rows: Optional[pd.DataFrame] = None) -> dict:
+    """
+    In-memory key registry: per entity, a Series natural key -> surrogate key, plus the entries
+    assigned in this run (to be appended to the warehouse).
+    """
+    reg = {"keys": {}, "added": {}}
+    rows = rows if rows is not None else pd.DataFrame(columns=["entity", "natural_key", "surrogate_key"])
+    for entity in ID_ENTITIES + tuple(CODE_ENTITIES):
+        df = rows[rows["entity"] == entity]
+        natural = df["natural_key"].astype("int64") if entity in ID_ENTITIES else df["natural_key"].astype(object)
+        reg["keys"][entity] = pd.Series(df["surrogate_key"].to_numpy(dtype="int64"), index=pd.Index(natural.to_numpy()))
+        reg["added"][entity] = []
+    return reg
+
+def load_registry(warehouse_path: str, backend: str = "sqlite") -> dict:
+    con = connect(warehouse_path, backend)
+    try:
+        return new_registry(read_key_registry(con))
+    finally:
+        con.close()
+
+def _assign_ids(known: pd.Series, new: np.ndarray) -> np.ndarray:
+    # El propio ID si es positivo y no está ocupado; si no, claves nuevas por encima de la máxima
+    # (el ID 0 es el miembro desconocido)
+    taken = known.to_numpy()
+    ok = (new > 0) & ~np.isin(new, taken)
+    keys = np.where(ok, new, 0)
+    moved = (new != 0) & ~ok
+    start = max(taken.max(initial=0), keys.max(initial=0)) + 1
+    keys[moved] = np.arange(start, start + int(moved.sum()))
+    return keys
+
+def _assign_codes(reg: dict, entity: str, new: np.ndarray) -> np.ndarray:
+    # Dígitos finales del código -> product_id; códigos sin dígitos quedan en el miembro desconocido (0)
+    ids = pd.Series(new, dtype=object).str.extract(r"(\d+)$")[0].astype(float).astype("Int64")
+    return resolve(reg, CODE_ENTITIES[entity], ids)
+
+def resolve(reg: dict, entity: str, values: pd.Series) -> np.ndarray:
+    """
+    Vectorized surrogate key lookup: values are factorized, only the distinct natural keys are looked
+    up and only the unseen ones get new keys (recorded in the registry). Nulls map to 0.
+    """
+    codes, uniques = pd.factorize(values)
+    if entity in ID_ENTITIES:
+        uniques = np.asarray(uniques, dtype="int64")
+    else:
+        uniques = np.asarray(uniques, dtype=object)
+    known = reg["keys"][entity]
+    idx = known.index.get_indexer(uniques)
+    if (idx < 0).any():
+        new = uniques[idx < 0]
+        keys = _assign_ids(known, new) if entity in ID_ENTITIES else _assign_codes(reg, entity, new)
+        added = pd.Series(keys, index=pd.Index(new))
+        reg["added"][entity].append(added)
+        reg["keys"][entity] = known = pd.concat([known, added])
+        idx = known.index.get_indexer(uniques)
+    resolved = known.to_numpy()[idx]
+    return np.where(codes >= 0, resolved[np.maximum(codes, 0)], 0) if len(resolved) else np.zeros(len(codes), dtype="int64")
+
+def registry_delta(reg: dict) -> pd.DataFrame:
+    """
+    Entries assigned since the registry was loaded, in the key_registry table layout. Values resolved
+    to the unknown member are not persisted.
+    """
+    parts = [pd.DataFrame({"entity": entity, "natural_key": s.index.astype(str), "surrogate_key": s.to_numpy()})
+             for entity, added in reg["added"].items() for s in added]
+    parts = [p[p["surrogate_key"] != 0] for p in parts]
+    if not parts:
+        return pd.DataFrame(columns=["entity", "natural_key", "surrogate_key"])
+    return pd.concat(parts, ignore_index=True)
@@ -1,138 +1,485 @@
+from typing import Iterator, Optional
 from pathlib import Path
-import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 
-from .utils import ensure_dir, build_dim_date, add_unknown_row
-
-def _connect(db_path: str):
-    ensure_dir(Path(db_path).parent)
-    con = sqlite3.connect(db_path)
-    return con
-
-def build_star(processed_dir: str = "data/processed", warehouse_path: str = "data/warehouse/warehouse.db"):
-    # Cargar staging
-    
-    def _read_staging(name: str):
-        p_parquet = Path(processed_dir) / f"{name}.parquet"
-        p_csv = Path(processed_dir) / f"{name}.csv"
-        if p_parquet.exists():
-            try:
-                return pd.read_parquet(p_parquet)
-            except Exception:
-                pass
-        if p_csv.exists():
-            return pd.read_csv(p_csv, parse_dates=[c for c in ["sale_date","snapshot_date","review_date"] if c in pd.read_csv(p_csv, nrows=0).columns])
-        raise FileNotFoundError(f"Could not load staging file for {name}.")
-    sales = _read_staging("stg_sales")
-    inv = _read_staging("stg_inventory")
-    hr = _read_staging("stg_hr")
+from .utils import build_dim_date, add_unknown_row, rfm_segmentation, rfm_score, date_ids, compact_frame
+from .ingest import read_staging_frame, iter_staging, staging_frame
+from .instrument import step, timed, collect, merge, iterate
+from .warehouse import (load_star, transaction, upsert_frame, read_watermarks, write_watermarks, table_exists,
+                        read_frame, temp_keys, optimize, write_key_registry, drop_bad_keys)
+from .keys import load_registry, resolve, registry_delta
+from .query import invalidate
 
-    # -----------------
-    # Dim Date
-    # -----------------
-    dim_date = build_dim_date(sales["sale_date"])
+# Columnas que usa el modelo por dominio (proyección al leer el staging); None = todas
+MODEL_COLUMNS = {
+    "sales": None,
+    "inventory": None,
+    "hr": ["employee_id", "department_id", "salary", "bonus"],
+}
+# Fecha de cada fact: las filas sin fecha no tienen date_id y no se cargan (validate tolera una proporción)
+DATE_COLUMNS = {"sales": "sale_date", "inventory": "snapshot_date"}
 
-    # -----------------
-    # Dim Product
-    # -----------------
-    inv = inv.copy()
-    inv["product_id_from_code"] = inv["product_code"].str.extract(r'(\d+)$').astype(float).astype("Int64")
-    prod_from_sales = sales[["product_id"]].dropna().drop_duplicates().astype(int)
-    prod_from_inv = inv[["product_id_from_code","product_code","category_id"]].dropna().drop_duplicates()
-    prod_from_inv = prod_from_inv.rename(columns={"product_id_from_code":"product_id"})
+@timed("read_staging")
+def _load_staging(processed_dir: str, name: str, staging: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Staging domain as a compact DataFrame (narrow ints, float32 where exact, categorical text): the
+    in-memory Arrow table handed over by ingest when present, otherwise a projected, batched read of
+    stg_<name>.parquet. Fact rows without a date are dropped.
+    """
+    columns = MODEL_COLUMNS[name]
+    if staging and name in staging:
+        return _dated(staging_frame(_project(staging[name], columns), name), name)
+    return _dated(read_staging_frame(processed_dir, name, columns), name)
+
+def _dated(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    """
+    Drop the fact rows without a date (they cannot get a date_id); other domains pass through.
+    """
+    col = DATE_COLUMNS.get(name)
+    if col is None or col not in df.columns:
+        return df
+    dates = pd.to_datetime(df[col])
+    return df if dates.notna().all() else df[dates.notna()].reset_index(drop=True)
+
+def _project(table: pa.Table, columns: Optional[list[str]]) -> pa.Table:
+    return table if columns is None else table.select([c for c in columns if c in table.column_names])
+
+def _iter_frames(processed_dir: str, name: str, columns: Optional[list[str]], chunk_rows: int,
+                 staging: Optional[dict] = None) -> Iterator[pd.DataFrame]:
+    """
+    Staging domain in DataFrames of at most chunk_rows rows (in-memory Arrow table or parquet row groups).
+    """
+    if staging and name in staging:
+        batches = _project(staging[name], columns).to_batches(max_chunksize=chunk_rows)
+    else:
+        batches = iter_staging(processed_dir, name, columns, chunk_rows)
+    for batch in batches:
+        yield _dated(staging_frame(batch, name), name)
 
-    dim_product = pd.merge(prod_from_sales, prod_from_inv, on="product_id", how="left")
+def _add_keys(reg: dict, sales: Optional[pd.DataFrame] = None, inv: Optional[pd.DataFrame] = None,
+              hr: Optional[pd.DataFrame] = None) -> None:
+    """
+    Add surrogate key columns from the key registry (only unseen natural keys get new keys), in the
+    narrowest integer type of their range. Must run in one thread: new keys are recorded in the registry.
+    """
+    if sales is not None:
+        sales["product_key"] = resolve(reg, "product_id", sales["product_id"])
+        sales["store_key"] = resolve(reg, "store_id", sales["store_id"])
+        compact_frame(sales, {"product_key": "int", "store_key": "int"})
+    if inv is not None:
+        inv["product_key"] = resolve(reg, "product_code", inv["product_code"])
+        compact_frame(inv, {"product_key": "int"})
+    if hr is not None:
+        hr["employee_key"] = resolve(reg, "employee_id", hr["employee_id"])
+        compact_frame(hr, {"employee_key": "int"})
+
+def _with_keys(reg: dict, **frames) -> pd.DataFrame:
+    _add_keys(reg, **frames)
+    return next(iter(frames.values()))
+
+@timed()
+def _dim_product(sales: pd.DataFrame, inv: pd.DataFrame) -> pd.DataFrame:
+    prod_from_sales = sales.loc[sales["product_key"] != 0, ["product_key","product_id"]].drop_duplicates("product_key")
+    prod_from_inv = inv.loc[inv["product_key"] != 0, ["product_key","product_code","category_id"]].dropna().drop_duplicates()
+
+    dim_product = pd.merge(prod_from_sales, prod_from_inv, on="product_key", how="left")
+    dim_product["product_id"] = dim_product["product_id"].astype("int64")
+    # El staging trae el código como categórico: la dimensión (pequeña) vuelve a texto para añadir códigos
+    dim_product["product_code"] = dim_product["product_code"].astype(object)
 
     missing_mask = dim_product["product_code"].isna()
-    dim_product.loc[missing_mask, "product_code"] = dim_product.loc[missing_mask, "product_id"].apply(lambda x: f"PRD_{int(x):04d}")
+    dim_product.loc[missing_mask, "product_code"] = "PRD_" + dim_product.loc[missing_mask, "product_id"].astype(str).str.zfill(4)
     dim_product["category_id"] = dim_product["category_id"].astype("Int64")
-    dim_product = dim_product.drop_duplicates().reset_index(drop=True)
-    dim_product["product_key"] = dim_product["product_id"]
+    # Un producto puede aparecer con varias categorías en inventario: se conserva la primera (PK product_key)
+    dim_product = dim_product.drop_duplicates("product_key").reset_index(drop=True)
     dim_product = add_unknown_row(dim_product, "product_key", unknown_id=0, product_id=0, product_code="UNKNOWN", category_id=pd.NA)
-    dim_product = dim_product[["product_key","product_id","product_code","category_id"]]
+    return dim_product[["product_key","product_id","product_code","category_id"]]
 
-    # -----------------
-    # Dim Customer
-    # -----------------
-    from .utils import rfm_segmentation
-    rfm = rfm_segmentation(sales)
+@timed()
+def _dim_customer(rfm: pd.DataFrame) -> pd.DataFrame:
     dim_customer = rfm.rename(columns={"customer_id":"customer_key", "segment":"segment_score"})
     dim_customer = add_unknown_row(dim_customer, "customer_key", unknown_id=0, segment="UNKNOWN")
+    return dim_customer[["customer_key","recency_days","frequency","monetary","r_score","f_score","m_score","segment_score","segment_label"]]
 
-    dim_customer = dim_customer[["customer_key","recency_days","frequency","monetary","r_score","f_score","m_score","segment_score","segment_label"]]
+def _dim_customer_from_sales(sales: pd.DataFrame, today: pd.Timestamp, rfm: Optional[dict] = None) -> pd.DataFrame:
+    return _dim_customer(rfm_segmentation(sales, today=today, **_rfm_params(rfm)))
 
-    # -----------------
-    # Dim Store
-    # -----------------
-    dim_store = sales[["store_id"]].dropna().drop_duplicates().astype(int)
-    dim_store["store_key"] = dim_store["store_id"]
-    dim_store["store_name"] = dim_store["store_id"].apply(lambda s: f"Store {int(s)}")
+@timed()
+def _dim_store(sales: pd.DataFrame) -> pd.DataFrame:
+    dim_store = sales.loc[sales["store_key"] != 0, ["store_key","store_id"]].drop_duplicates("store_key")
+    dim_store["store_id"] = dim_store["store_id"].astype("int64")
+    dim_store["store_name"] = "Store " + dim_store["store_id"].astype(str)
     dim_store["store_type"] = "retail"
     dim_store = add_unknown_row(dim_store, "store_key", unknown_id=0, store_name="UNKNOWN", store_type="UNKNOWN", store_id=0)
-    dim_store = dim_store[["store_key","store_id","store_name","store_type"]]
+    return dim_store[["store_key","store_id","store_name","store_type"]]
 
-    # -----------------
-    # Dim Employee
-    # -----------------
-    dim_employee = hr.groupby("employee_id", as_index=False).agg({
+@timed()
+def _dim_employee(hr: pd.DataFrame) -> pd.DataFrame:
+    dim_employee = hr[hr["employee_key"] != 0].groupby("employee_key", as_index=False).agg({
+        "employee_id":"first",
         "department_id":"first",
         "salary":"median",
         "bonus":"median"
     })
-    dim_employee["employee_key"] = dim_employee["employee_id"]
     dim_employee = add_unknown_row(dim_employee, "employee_key", unknown_id=0, department_id=pd.NA, salary=pd.NA, bonus=pd.NA, employee_id=0)
-    dim_employee = dim_employee[["employee_key","employee_id","department_id","salary","bonus"]]
+    return dim_employee[["employee_key","employee_id","department_id","salary","bonus"]]
+
+def _lookup(dim: pd.DataFrame, id_col: str, key_col: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Dimension lookup arrays: natural IDs sorted, with their surrogate keys aligned.
+    """
+    d = dim[list(dict.fromkeys([id_col, key_col]))].dropna().sort_values(id_col)
+    return d[id_col].to_numpy(dtype="int64"), d[key_col].to_numpy(dtype="int64")
+
+def _key(values: pd.Series, lookup: Optional[tuple] = None) -> np.ndarray:
+    """
+    Surrogate keys for natural IDs (binary search in the lookup arrays when given). Nulls and IDs
+    missing from the dimension map to the unknown member 0.
+    """
+    x = values.fillna(0).to_numpy(dtype="int64")
+    if lookup is None:
+        return x
+    ids, keys = lookup
+    if len(ids) == 0:
+        return np.zeros(len(x), dtype="int64")
+    pos = np.searchsorted(ids, x).clip(max=len(ids) - 1)
+    return np.where(ids[pos] == x, keys[pos], 0)
+
+@timed()
+def _fact_sales(sales: pd.DataFrame, customers: Optional[tuple] = None) -> pd.DataFrame:
+    # product_key / store_key vienen del registro de claves (_add_keys)
+    fact = pd.DataFrame({
+        "sale_id": sales["sale_id"],
+        "date_id": date_ids(sales["sale_date"]),
+        "product_key": sales["product_key"],
+        "customer_key": _key(sales["customer_id"], customers),
+        "store_key": sales["store_key"],
+        "employee_key": np.int8(0),
+        "quantity": sales["quantity"],
+        "unit_price": sales["unit_price"],
+        "discount_percent": sales["discount_percent"],
+        "sales_amount": sales["sales_amount"],
+        "profit_margin": sales["profit_margin"],
+    }, copy=False)  # sin consolidar en bloques: las columnas de sales no se duplican
+    return compact_frame(fact, {"customer_key": "int"})
+
+@timed()
+def _fact_inventory(inv: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "inventory_id": inv["inventory_id"],
+        "date_id": date_ids(inv["snapshot_date"]),
+        "product_key": inv["product_key"],
+        "warehouse_key": _key(inv["warehouse_id"]),
+        "stock_qty": inv["stock_qty"],
+        "reorder_level": inv["reorder_level"],
+        "unit_cost": inv["unit_cost"],
+        "total_value": inv["total_value"],
+    }, copy=False)
+
+def _date_bounds(*dates: pd.Series) -> pd.Series:
+    # Mínimo y máximo de cada columna de fechas: dim_date cubre el rango de todos los facts
+    bounds = [b for d in dates for b in (d.min(), d.max()) if pd.notna(b)]
+    return pd.Series(bounds, dtype="datetime64[ns]")
+
+def _date_id(ts: pd.Timestamp) -> int:
+    return ts.year * 10000 + ts.month * 100 + ts.day
+
+def _date_from_id(date_id: int) -> pd.Timestamp:
+    return pd.Timestamp(year=int(date_id) // 10000, month=int(date_id) // 100 % 100, day=int(date_id) % 100)
+
+def _watermarks(fact_sales: pd.DataFrame, fact_inventory: pd.DataFrame, rfm_today: pd.Timestamp) -> dict:
+    marks = {"dim_customer": _date_id(rfm_today)}
+    if len(fact_sales):
+        marks["fact_sales"] = int(fact_sales["date_id"].max())
+    if len(fact_inventory):
+        marks["fact_inventory_snapshot"] = int(fact_inventory["date_id"].max())
+    return marks
+
+def _rfm_params(rfm: Optional[dict]) -> dict:
+    rfm = rfm or {}
+    return {k: rfm.get(k) for k in ("quantiles", "segments", "default_segment")}
+
+def build_star(processed_dir: str = "data/processed", warehouse_path: str = "data/warehouse/warehouse.db",
+               incremental: bool = False, rfm: Optional[dict] = None, backend: str = "sqlite", workers: int = 4,
+               staging: Optional[dict] = None, streaming: bool = False, chunk_rows: int = 250000):
+    watermarks = {}
+    if incremental:
+        with transaction(warehouse_path, backend) as con:
+            watermarks = read_watermarks(con) if table_exists(con, "etl_watermark") else {}
+    if streaming and "fact_sales" not in watermarks:
+        return _stream_star(processed_dir, warehouse_path, rfm=rfm, backend=backend, chunk_rows=chunk_rows, staging=staging)
+
+    # Cargar staging (tablas Arrow de ingest si vienen en memoria; si no, parquet proyectado)
+    sales = _load_staging(processed_dir, "sales", staging)
+    inv = _load_staging(processed_dir, "inventory", staging)
+    hr = _load_staging(processed_dir, "hr", staging)
+
+    # Claves subrogadas estables entre ejecuciones: registro persistente en el almacén
+    with step("resolve_keys"):
+        reg = load_registry(warehouse_path, backend)
+        _add_keys(reg, sales, inv, hr)
+
+    if "fact_sales" in watermarks:
+        return _merge_star(sales, inv, hr, warehouse_path, watermarks, reg, rfm=rfm, backend=backend)
+
+    # -----------------
+    # Dimensiones y facts: independientes entre sí, se construyen en paralelo
+    # -----------------
+    rfm_today = pd.to_datetime(sales["sale_date"]).max() + pd.Timedelta(days=1)
+    jobs = {
+        "dim_date": (build_dim_date, _date_bounds(sales["sale_date"], inv["snapshot_date"])),
+        "dim_product": (_dim_product, sales, inv),
+        "dim_customer": (_dim_customer_from_sales, sales, rfm_today, rfm),
+        "dim_store": (_dim_store, sales),
+        "dim_employee": (_dim_employee, hr),
+        "fact_sales": (_fact_sales, sales),
+        "fact_inventory_snapshot": (_fact_inventory, inv),
+    }
+    tables = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {name: pool.submit(collect, fn, *args) for name, (fn, *args) in jobs.items()}
+        for name, fut in futures.items():
+            tables[name], steps = fut.result()
+            merge(steps)
+    fact_sales, fact_inventory = tables["fact_sales"], tables["fact_inventory_snapshot"]
 
     # -----------------
-    # Fact Sales
+    # Warehouse
     # -----------------
-    fact_sales = sales.copy()
-    fact_sales["date_id"] = pd.to_datetime(fact_sales["sale_date"]).dt.strftime("%Y%m%d").astype(int)
-    fact_sales["product_key"] = fact_sales["product_id"].fillna(0).astype(int).where(fact_sales["product_id"].notna(), 0)
-    fact_sales["customer_key"] = fact_sales["customer_id"].fillna(0).astype(int).where(fact_sales["customer_id"].notna(), 0)
-    fact_sales["store_key"] = fact_sales["store_id"].fillna(0).astype(int).where(fact_sales["store_id"].notna(), 0)
+    with step("load_star", rows_in=sum(len(t) for t in tables.values())):
+        rows = load_star(warehouse_path, tables, watermarks=_watermarks(fact_sales, fact_inventory, rfm_today), backend=backend,
+                  keys=registry_delta(reg))
+    # Resultados de consultas en caché: ya no corresponden a la versión cargada
+    invalidate(warehouse_path)
+
+    return {
+        "dim_date_rows": rows["dim_date"],
+        "dim_product_rows": rows["dim_product"],
+        "dim_customer_rows": rows["dim_customer"],
+        "dim_store_rows": rows["dim_store"],
+        "dim_employee_rows": rows["dim_employee"],
+        "fact_sales_rows": rows["fact_sales"],
+        "fact_inventory_rows": rows["fact_inventory_snapshot"],
+        "rejected": rows["rejected"],
+        "warehouse_path": warehouse_path,
+        "backend": backend,
+    }
+
+# Columnas de la primera pasada (dimensiones) del build por bloques
+SCAN_COLUMNS = {
+    "sales": ["sale_id", "sale_date", "product_id", "customer_id", "store_id", "sales_amount"],
+    "inventory": ["snapshot_date", "product_code", "category_id"],
+}
+
+@timed()
+def _scan_sales(processed_dir: str, chunk_rows: int, staging: Optional[dict] = None) -> dict:
+    """
+    First pass over sales chunks: date range, product and store IDs and per-customer RFM aggregates
+    (last purchase, count, amount), combined chunk by chunk.
+    """
+    lo = hi = None
+    products = stores = np.array([], dtype="int64")
+    customers = None
+    rows = 0
+    for chunk in iterate("read_chunk", _iter_frames(processed_dir, "sales", SCAN_COLUMNS["sales"], chunk_rows, staging)):
+        dates = pd.to_datetime(chunk["sale_date"])
+        if dates.notna().any():
+            lo = dates.min() if lo is None else min(lo, dates.min())
+            hi = dates.max() if hi is None else max(hi, dates.max())
+        products = np.union1d(products, chunk["product_id"].dropna().to_numpy(dtype="int64"))
+        stores = np.union1d(stores, chunk["store_id"].dropna().to_numpy(dtype="int64"))
+        g = chunk.assign(sale_date=dates).groupby("customer_id")
+        part = pd.DataFrame({"last": g["sale_date"].max(), "frequency": g["sale_id"].count(),
+                             "monetary": g["sales_amount"].sum()})
+        if customers is not None:
+            part = pd.concat([customers, part]).groupby(level=0).agg({"last": "max", "frequency": "sum", "monetary": "sum"})
+        customers = part
+        rows += len(chunk)
+    return {"lo": lo, "hi": hi, "products": products, "stores": stores, "customers": customers, "rows": rows}
 
-    fact_sales["employee_key"] = 0
+@timed()
+def _scan_inventory(processed_dir: str, chunk_rows: int, staging: Optional[dict] = None) -> dict:
+    """
+    First pass over inventory chunks: distinct (code, category) pairs in order of appearance and the
+    snapshot date range.
+    """
+    lo = hi = None
+    products = pd.DataFrame(columns=["product_code", "category_id"])
+    for chunk in iterate("read_chunk", _iter_frames(processed_dir, "inventory", SCAN_COLUMNS["inventory"], chunk_rows, staging)):
+        dates = pd.to_datetime(chunk["snapshot_date"])
+        if dates.notna().any():
+            lo = dates.min() if lo is None else min(lo, dates.min())
+            hi = dates.max() if hi is None else max(hi, dates.max())
+        part = chunk[["product_code", "category_id"]].dropna().drop_duplicates()
+        products = pd.concat([products, part], ignore_index=True).drop_duplicates() if len(products) else part
+    return {"lo": lo, "hi": hi, "products": products}
 
-    fact_sales = fact_sales[[
-        "sale_id","date_id","product_key","customer_key","store_key","employee_key",
-        "quantity","unit_price","discount_percent","sales_amount","profit_margin"
-    ]]
+def _stream_star(processed_dir: str, warehouse_path: str, rfm: Optional[dict] = None, backend: str = "sqlite",
+                 chunk_rows: int = 250000, staging: Optional[dict] = None) -> dict:
+    """
+    Out-of-core build. A first pass over the staging row groups collects what the dimensions need;
+    a second pass builds the facts chunk by chunk, resolving surrogate keys through the key registry
+    (all natural keys were registered in the first pass) and the customer lookup arrays, and each
+    chunk is written to the warehouse as it is produced.
+    """
+    reg = load_registry(warehouse_path, backend)
+    sales = _scan_sales(processed_dir, chunk_rows, staging)
+    inv = _scan_inventory(processed_dir, chunk_rows, staging)
+    products = pd.DataFrame({"product_id": sales["products"]})
+    stores = pd.DataFrame({"store_id": sales["stores"]})
+    hr = _load_staging(processed_dir, "hr", staging)
+    with step("resolve_keys"):
+        products["product_key"] = resolve(reg, "product_id", products["product_id"])
+        stores["store_key"] = resolve(reg, "store_id", stores["store_id"])
+        _add_keys(reg, inv=inv["products"], hr=hr)
 
     # -----------------
-    # Fact Inventory
+    # Dimensiones (pequeñas: caben en memoria)
     # -----------------
-    fact_inventory = inv.copy()
-    fact_inventory["date_id"] = pd.to_datetime(fact_inventory["snapshot_date"]).dt.strftime("%Y%m%d").astype(int)
-    fact_inventory["product_key"] = fact_inventory["product_id_from_code"].fillna(0).astype(int)
-    fact_inventory["warehouse_key"] = fact_inventory["warehouse_id"].fillna(0).astype(int)
-    fact_inventory = fact_inventory[[
-        "inventory_id","date_id","product_key","warehouse_key","stock_qty","reorder_level","unit_cost","total_value"
-    ]]
+    rfm_today = sales["hi"] + pd.Timedelta(days=1)
+    dim_date = build_dim_date(pd.Series([d for d in (sales["lo"], sales["hi"], inv["lo"], inv["hi"]) if d is not None],
+                                        dtype="datetime64[ns]"))
+    dim_product = _dim_product(products, inv["products"])
+    grp = sales["customers"].rename_axis("customer_id").reset_index()
+    grp = pd.DataFrame({"customer_id": grp["customer_id"], "recency_days": (rfm_today - grp["last"]).dt.days,
+                        "frequency": grp["frequency"], "monetary": grp["monetary"]})
+    dim_customer = _dim_customer(rfm_score(grp, **_rfm_params(rfm)))
+    dim_store = _dim_store(stores)
+    dim_employee = _dim_employee(hr)
+    tables = {"dim_date": dim_date, "dim_product": dim_product, "dim_customer": dim_customer,
+              "dim_store": dim_store, "dim_employee": dim_employee}
+    customers = _lookup(dim_customer, "customer_key", "customer_key")
 
     # -----------------
-    # Warehouse
+    # Facts por bloques, escritos a medida que se construyen
     # -----------------
-    con = _connect(warehouse_path)
-    try:
-        dim_date.to_sql("dim_date", con, if_exists="replace", index=False)
-        dim_product.to_sql("dim_product", con, if_exists="replace", index=False)
-        dim_customer.to_sql("dim_customer", con, if_exists="replace", index=False)
-        dim_store.to_sql("dim_store", con, if_exists="replace", index=False)
-        dim_employee.to_sql("dim_employee", con, if_exists="replace", index=False)
-        fact_sales.to_sql("fact_sales", con, if_exists="replace", index=False)
-        fact_inventory.to_sql("fact_inventory_snapshot", con, if_exists="replace", index=False)
-    finally:
-        con.close()
+    streams = {
+        "fact_sales": (_fact_sales(_with_keys(reg, sales=c), customers) for c in
+                       iterate("read_chunk", _iter_frames(processed_dir, "sales", None, chunk_rows, staging))),
+        "fact_inventory_snapshot": (_fact_inventory(_with_keys(reg, inv=c)) for c in
+                                    iterate("read_chunk", _iter_frames(processed_dir, "inventory", None, chunk_rows, staging))),
+    }
+    marks = {"dim_customer": _date_id(rfm_today)}
+    if sales["rows"]:
+        marks["fact_sales"] = _date_id(sales["hi"])
+    if inv["hi"] is not None:
+        marks["fact_inventory_snapshot"] = _date_id(inv["hi"])
+    with step("load_star", rows_in=sum(len(t) for t in tables.values())):
+        rows = load_star(warehouse_path, tables, watermarks=marks, backend=backend, streams=streams,
+                         keys=registry_delta(reg))
+    invalidate(warehouse_path)
 
     return {
-        "dim_date_rows": len(dim_date),
-        "dim_product_rows": len(dim_product),
-        "dim_customer_rows": len(dim_customer),
-        "dim_store_rows": len(dim_store),
-        "dim_employee_rows": len(dim_employee),
-        "fact_sales_rows": len(fact_sales),
-        "fact_inventory_rows": len(fact_inventory),
-        "warehouse_path": warehouse_path
-    }
\ No newline at end of file
+        "dim_date_rows": rows["dim_date"],
+        "dim_product_rows": rows["dim_product"],
+        "dim_customer_rows": rows["dim_customer"],
+        "dim_store_rows": rows["dim_store"],
+        "dim_employee_rows": rows["dim_employee"],
+        "fact_sales_rows": rows["fact_sales"],
+        "fact_inventory_rows": rows["fact_inventory_snapshot"],
+        "rejected": rows["rejected"],
+        "warehouse_path": warehouse_path,
+        "backend": backend,
+        "chunk_rows": chunk_rows,
+    }
+
+@timed()
+def _refresh_customers(con, affected: pd.Series, today_old: pd.Timestamp, today_new: pd.Timestamp,
+                       rfm: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Recompute RFM aggregates only for the customers touched by the delta. Recency of the others is
+    shifted by the change of as-of date (their last purchase did not move), then all customers are rescored.
+    """
+    current = read_frame(con, "SELECT customer_key, recency_days, frequency, monetary FROM dim_customer WHERE customer_key <> 0")
+    current = current.rename(columns={"customer_key":"customer_id"})
+    current["recency_days"] = current["recency_days"] + (today_new - today_old).days
+
+    temp_keys(con, "_affected_customers", "customer_key", affected)
+    fresh = read_frame(con, """
+        SELECT f.customer_key AS customer_id, MAX(f.date_id) AS last_date_id,
+               COUNT(f.sale_id) AS frequency, SUM(f.sales_amount) AS monetary
+        FROM fact_sales f JOIN _affected_customers a ON a.customer_key = f.customer_key
+        GROUP BY f.customer_key
+    """)
+    fresh["recency_days"] = (today_new - pd.to_datetime(fresh["last_date_id"].astype(str), format="%Y%m%d")).dt.days
+
+    grp = pd.concat([current[~current["customer_id"].isin(fresh["customer_id"])],
+                     fresh[["customer_id","recency_days","frequency","monetary"]]], ignore_index=True)
+    return _dim_customer(rfm_score(grp.sort_values("customer_id").reset_index(drop=True), **_rfm_params(rfm)))
+
+def _extend_products(con, delta: pd.DataFrame) -> pd.DataFrame:
+    """
+    Products of the delta merged with the stored ones under the full-build rule: a product keeps the
+    code and category it already has (the first seen), the delta only fills the missing ones.
+    """
+    stored = read_frame(con, "SELECT product_key, product_id, product_code, category_id FROM dim_product")
+    stored = stored[stored["product_key"].isin(delta["product_key"])]
+    out = stored.set_index("product_key").combine_first(delta.set_index("product_key")).reset_index()
+    out["category_id"] = out["category_id"].astype("Int64")
+    return out[delta.columns]
+
+def _merge_star(sales: pd.DataFrame, inv: pd.DataFrame, hr: pd.DataFrame, warehouse_path: str, watermarks: dict,
+                reg: dict, rfm: Optional[dict] = None, backend: str = "sqlite") -> dict:
+    """
+    Append/merge mode: staging rows on or after the stored watermark are upserted by sale_id /
+    inventory_id (the watermark day itself is reloaded to pick up late rows), dimensions are
+    extended and only the affected customers get their RFM aggregates recomputed.
+    """
+    fact_sales = _fact_sales(sales)
+    fact_sales = fact_sales[fact_sales["date_id"] >= watermarks["fact_sales"]]
+    fact_inventory = _fact_inventory(inv)
+    fact_inventory = fact_inventory[fact_inventory["date_id"] >= watermarks.get("fact_inventory_snapshot", 0)]
+    # Claves nulas o repetidas no se cargan (como en la carga completa)
+    fact_sales, bad_sales = drop_bad_keys("fact_sales", fact_sales)
+    fact_inventory, bad_inv = drop_bad_keys("fact_inventory_snapshot", fact_inventory)
+    rejected = {name: bad for name, bad in [("fact_sales", bad_sales), ("fact_inventory_snapshot", bad_inv)] if bad}
+    if rejected:
+        print(f"[WARN] Rows not loaded (NULL or repeated primary key): {rejected}")
+    sales_delta = sales.loc[fact_sales.index]
+    inv_delta = inv.loc[fact_inventory.index]
+
+    res = {"fact_sales_upserted": len(fact_sales), "fact_inventory_upserted": len(fact_inventory), "rejected": rejected}
+    with transaction(warehouse_path, backend) as con:
+        # Dim Date: se extiende el rango continuo hasta las nuevas fechas
+        lo, hi = con.execute("SELECT MIN(date_id), MAX(date_id) FROM dim_date").fetchone()
+        bounds = [_date_from_id(d) for d in (lo, hi) if d is not None]
+        dim_date = build_dim_date(pd.concat([pd.Series(bounds, dtype="datetime64[ns]"),
+                                             _date_bounds(pd.to_datetime(sales_delta["sale_date"]),
+                                                          pd.to_datetime(inv_delta["snapshot_date"]))]))
+        res["dim_date_added"] = upsert_frame(con, "dim_date", dim_date, update=False)
+
+        # Dimensiones: nuevos productos, tiendas y empleados (y sus claves nuevas en el registro)
+        write_key_registry(con, registry_delta(reg))
+        upsert_frame(con, "dim_product", _extend_products(con, _dim_product(sales_delta, inv_delta)))
+        upsert_frame(con, "dim_store", _dim_store(sales_delta))
+        upsert_frame(con, "dim_employee", _dim_employee(hr))
+
+        # Facts por clave natural
+        upsert_frame(con, "fact_sales", fact_sales, keep_existing=False)
+        upsert_frame(con, "fact_inventory_snapshot", fact_inventory, keep_existing=False)
+
+        # RFM solo para los clientes afectados
+        today_old = _date_from_id(watermarks.get("dim_customer", watermarks["fact_sales"]))
+        max_date_id = con.execute("SELECT MAX(date_id) FROM fact_sales").fetchone()[0]
+        today_new = _date_from_id(max_date_id) + pd.Timedelta(days=1)
+        affected = fact_sales.loc[fact_sales["customer_key"] != 0, "customer_key"].drop_duplicates()
+        if len(affected) or today_new != today_old:
+            dim_customer = _refresh_customers(con, affected, today_old, today_new, rfm=rfm)
+            upsert_frame(con, "dim_customer", dim_customer, keep_existing=False)
+        res["customers_recomputed"] = len(affected)
+
+        marks = {"dim_customer": _date_id(today_new), "fact_sales": int(max_date_id)}
+        inv_max = con.execute("SELECT MAX(date_id) FROM fact_inventory_snapshot").fetchone()[0]
+        if inv_max is not None:
+            marks["fact_inventory_snapshot"] = int(inv_max)
+        write_watermarks(con, marks)
+        optimize(con)
+    invalidate(warehouse_path)
+
+    res["watermark_date_id"] = marks["fact_sales"]
+    res["warehouse_path"] = warehouse_path
+    res["backend"] = backend
+    return res
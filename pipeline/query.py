@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from .warehouse import connect, read_frame, read_load_version
+
+# Medidas: fact de origen y agregación SQL
+MEASURES = {
+    "sales_amount": {"fact": "fact_sales", "sql": "SUM(f.sales_amount)"},
+    "quantity": {"fact": "fact_sales", "sql": "SUM(f.quantity)"},
+    "sales_count": {"fact": "fact_sales", "sql": "COUNT(*)"},
+    "avg_ticket": {"fact": "fact_sales", "sql": "AVG(f.sales_amount)"},
+    "avg_discount": {"fact": "fact_sales", "sql": "AVG(f.discount_percent)"},
+    "avg_profit_margin": {"fact": "fact_sales", "sql": "AVG(f.profit_margin)"},
+    "customers": {"fact": "fact_sales", "sql": "COUNT(DISTINCT f.customer_key)"},
+    "stock_qty": {"fact": "fact_inventory_snapshot", "sql": "SUM(f.stock_qty)"},
+    "inventory_value": {"fact": "fact_inventory_snapshot", "sql": "SUM(f.total_value)"},
+    "avg_unit_cost": {"fact": "fact_inventory_snapshot", "sql": "AVG(f.unit_cost)"},
+}
+
+# Dimensiones: expresión, dimensión del esquema que hay que unir (alias) y facts que la tienen (None: todos).
+# Año, trimestre y mes salen de date_id (AAAAMMDD) y todas las uniones son LEFT: agrupar nunca pierde filas
+DIMENSIONS = {
+    "date": {"sql": "d.date", "join": "d", "facts": None},
+    "year": {"sql": "(f.date_id - f.date_id % 10000) / 10000", "join": None, "facts": None},
+    "quarter": {"sql": "(f.date_id % 10000 + 200 - (f.date_id % 10000 + 200) % 300) / 300", "join": None, "facts": None},
+    "month": {"sql": "(f.date_id - f.date_id % 100) / 100", "join": None, "facts": None},
+    "day_of_week": {"sql": "d.day_of_week", "join": "d", "facts": None},
+    "is_weekend": {"sql": "d.is_weekend", "join": "d", "facts": None},
+    "product": {"sql": "p.product_id", "join": "p", "facts": None},
+    "category": {"sql": "p.category_id", "join": "p", "facts": None},
+    "store": {"sql": "s.store_id", "join": "s", "facts": ("fact_sales",)},
+    "store_type": {"sql": "s.store_type", "join": "s", "facts": ("fact_sales",)},
+    "segment": {"sql": "c.segment_score", "join": "c", "facts": ("fact_sales",)},
+    "segment_label": {"sql": "c.segment_label", "join": "c", "facts": ("fact_sales",)},
+    "warehouse": {"sql": "f.warehouse_key", "join": None, "facts": ("fact_inventory_snapshot",)},
+}
+_JOINS = {
+    "d": "LEFT JOIN dim_date d ON d.date_id = f.date_id",
+    "p": "LEFT JOIN dim_product p ON p.product_key = f.product_key",
+    "s": "LEFT JOIN dim_store s ON s.store_key = f.store_key",
+    "c": "LEFT JOIN dim_customer c ON c.customer_key = f.customer_key",
+}
+
+# Caché de resultados: LRU con TTL, por almacén y versión de carga. En memoria solo sirve a un mismo
+# proceso; con dir los resultados también se guardan como parquet y los comparten procesos distintos (CLI)
+_cache = {"entries": OrderedDict(), "maxsize": 128, "ttl_s": 300.0, "dir": None, "hits": 0, "misses": 0}
+_lock = threading.Lock()
+
+def configure_cache(maxsize: Optional[int] = None, ttl_s: Optional[float] = None, cache_dir: Optional[str] = None) -> None:
+    with _lock:
+        if maxsize is not None:
+            _cache["maxsize"] = int(maxsize)
+        if ttl_s is not None:
+            _cache["ttl_s"] = float(ttl_s)
+        if cache_dir is not None:
+            _cache["dir"] = str(cache_dir)
+        _evict()
+
+def cache_info() -> dict:
+    with _lock:
+        return {k: len(v) if k == "entries" else v for k, v in _cache.items()}
+
+def invalidate(warehouse_path: Optional[str] = None) -> int:
+    """
+    Drop the cached results of a warehouse (all of them without a path), in memory and in the cache
+    directory when one is configured. Returns the in-memory entries dropped.
+    """
+    with _lock:
+        path = os.path.abspath(warehouse_path) if warehouse_path else None
+        stale = [k for k in _cache["entries"] if path is None or k[0] == path]
+        for k in stale:
+            del _cache["entries"][k]
+        for f in _disk_files(_digest(path)[:16] if path else None):
+            f.unlink(missing_ok=True)
+        return len(stale)
+
+def _evict() -> None:
+    entries = _cache["entries"]
+    while len(entries) > _cache["maxsize"]:
+        entries.popitem(last=False)
+    files = _disk_files()
+    for f in sorted(files, key=lambda f: f.stat().st_mtime)[:max(0, len(files) - _cache["maxsize"])]:
+        f.unlink(missing_ok=True)
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _disk_files(prefix: Optional[str] = None) -> list[Path]:
+    if not _cache["dir"] or not Path(_cache["dir"]).is_dir():
+        return []
+    return list(Path(_cache["dir"]).glob(f"{prefix or ''}*.parquet"))
+
+def _disk_path(key: tuple) -> Path:
+    # <almacén>-<versión de carga>-<consulta>.parquet
+    return Path(_cache["dir"]) / f"{_digest(key[0])[:16]}-{key[1]}-{_digest(key[2])[:24]}.parquet"
+
+def _disk_get(key: tuple) -> Optional[pd.DataFrame]:
+    path = _disk_path(key)
+    try:
+        if time.time() - path.stat().st_mtime > _cache["ttl_s"]:
+            path.unlink(missing_ok=True)
+            return None
+        df = pd.read_parquet(path)
+        os.utime(path)  # LRU también en disco
+        return df
+    except (OSError, ValueError):
+        return None
+
+def _disk_put(key: tuple, df: pd.DataFrame) -> None:
+    path = _disk_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Resultados de otras versiones de carga del mismo almacén
+    for f in _disk_files(path.name.split("-")[0] + "-"):
+        if f.name.split("-")[1] != str(key[1]):
+            f.unlink(missing_ok=True)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+def _cache_get(key: tuple) -> Optional[pd.DataFrame]:
+    with _lock:
+        hit = _cache["entries"].get(key)
+        if hit is not None and time.monotonic() - hit[0] > _cache["ttl_s"]:
+            del _cache["entries"][key]
+            hit = None
+        if hit is None and _cache["dir"]:
+            df = _disk_get(key)
+            if df is not None:
+                hit = (time.monotonic(), df)
+                _cache["entries"][key] = hit
+                _evict()
+        if hit is None:
+            _cache["misses"] += 1
+            return None
+        _cache["entries"].move_to_end(key)
+        _cache["hits"] += 1
+        return hit[1]
+
+def _cache_put(key: tuple, df: pd.DataFrame) -> None:
+    with _lock:
+        # Resultados de versiones de carga anteriores del mismo almacén ya no son válidos
+        for k in [k for k in _cache["entries"] if k[0] == key[0] and k[1] != key[1]]:
+            del _cache["entries"][k]
+        _cache["entries"][key] = (time.monotonic(), df)
+        if _cache["dir"]:
+            _disk_put(key, df)
+        _evict()
+
+def _filter_sql(dim: str, cond, params: list) -> str:
+    expr = DIMENSIONS[dim]["sql"]
+    if isinstance(cond, dict):
+        ops = {"min": ">=", "max": "<="}
+        unknown = set(cond) - set(ops)
+        if unknown:
+            raise ValueError(f"Unknown filter bounds {sorted(unknown)} for '{dim}'. Expected min / max.")
+        params.extend(cond[k] for k in ops if k in cond)
+        return " AND ".join(f"{expr} {op} ?" for k, op in ops.items() if k in cond)
+    if isinstance(cond, (list, tuple)):
+        params.extend(cond)
+        return f"{expr} IN ({', '.join('?' * len(cond))})"
+    params.append(cond)
+    return f"{expr} = ?"
+
+def query_sql(fact: str, measures: list[str], dimensions: list[str] = (), filters: Optional[dict] = None) -> tuple[str, list]:
+    """
+    Star-join query over one fact: measures grouped by dimensions, with filters on dimensions.
+    Dimension tables are joined only when a selected or filtered dimension needs them.
+    """
+    filters = filters or {}
+    used = list(dimensions) + [d for d in filters if d not in dimensions]
+    missing = [d for d in used if DIMENSIONS[d]["facts"] is not None and fact not in DIMENSIONS[d]["facts"]]
+    if missing:
+        raise ValueError(f"Dimensions {missing} are not available for {fact}.")
+    joins = " ".join(_JOINS[a] for a in dict.fromkeys(DIMENSIONS[d]["join"] for d in used) if a)
+    select = [f"{DIMENSIONS[d]['sql']} AS {d}" for d in dimensions] + [f"{MEASURES[m]['sql']} AS {m}" for m in measures]
+    params = []
+    where = " AND ".join(_filter_sql(d, c, params) for d, c in filters.items())
+    sql = f"SELECT {', '.join(select)} FROM {fact} f {joins}"
+    if where:
+        sql += f" WHERE {where}"
+    if dimensions:
+        sql += f" GROUP BY {', '.join(DIMENSIONS[d]['sql'] for d in dimensions)}"
+    return sql, params
+
+def _validate(measures: list[str], dimensions: list[str], filters: dict) -> None:
+    unknown = [m for m in measures if m not in MEASURES]
+    if unknown or not measures:
+        raise ValueError(f"Unknown measures {unknown}. Expected some of: {', '.join(MEASURES)}.")
+    unknown = [d for d in list(dimensions) + list(filters) if d not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown dimensions {unknown}. Expected some of: {', '.join(DIMENSIONS)}.")
+
+def _run(con, measures: list[str], dimensions: list[str], filters: dict) -> pd.DataFrame:
+    # Una consulta por fact; si se piden medidas de ambos, se unen por las dimensiones
+    by_fact = {}
+    for m in measures:
+        by_fact.setdefault(MEASURES[m]["fact"], []).append(m)
+    out = None
+    for fact, ms in by_fact.items():
+        sql, params = query_sql(fact, ms, dimensions, filters)
+        df = read_frame(con, sql, params)
+        out = df if out is None else out.merge(df, on=list(dimensions), how="outer") if dimensions else pd.concat([out, df], axis=1)
+    return out[list(dimensions) + list(measures)]
+
+def query(warehouse_path: str, measures: list[str], dimensions: list[str] = (), filters: Optional[dict] = None,
+          backend: str = "sqlite", limit: Optional[int] = None, cache: bool = True) -> pd.DataFrame:
+    """
+    Aggregate measures by dimensions over the star schema, e.g.
+    query(db, ["sales_amount"], ["month", "segment_label"], {"year": 2023}).
+    filters map a dimension to a value, a list of values or {"min": .., "max": ..}. Results are cached
+    per warehouse load version (a reload by build_star invalidates them) with LRU eviction and a TTL;
+    callers get a copy of the cached frame. The in-memory cache only helps long-lived callers; with
+    configure_cache(cache_dir=...) results are also kept as parquet files shared across processes.
+    """
+    filters = dict(filters or {})
+    _validate(measures, dimensions, filters)
+    if backend == "sqlite" and not Path(warehouse_path).exists():
+        raise FileNotFoundError(f"Warehouse not found: {warehouse_path}. Run `python -m pipeline model` first.")
+
+    con = connect(warehouse_path, backend)
+    try:
+        spec = json.dumps({"m": list(measures), "d": list(dimensions), "f": filters, "b": backend}, sort_keys=True, default=str)
+        key = (os.path.abspath(warehouse_path), read_load_version(con), spec)
+        df = _cache_get(key) if cache else None
+        if df is None:
+            df = _run(con, list(measures), list(dimensions), filters)
+            df = df.sort_values(list(dimensions), ignore_index=True) if dimensions else df
+            if cache:
+                _cache_put(key, df)
+    finally:
+        con.close()
+    df = df.copy()
+    return df.head(limit) if limit else df
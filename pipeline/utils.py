@@ -3,6 +3,7 @@ import os
 import io
 import json
 import math
+import hashlib
 import random
 from pathlib import Path
 from typing import Dict, Any, Optional, Tuple
@@ -10,6 +11,8 @@ from typing import Dict, Any, Optional, Tuple
 import numpy as np
 import pandas as pd
 
+from .instrument import timed
+
 def ensure_dir(p: str | Path) -> Path:
     p = Path(p)
     p.mkdir(parents=True, exist_ok=True)
@@ -20,6 +23,35 @@ def read_config(path: str | Path) -> dict:
     with open(path, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
+def warehouse_backend(cfg: dict) -> str:
+    return (cfg.get("warehouse") or {}).get("backend", "sqlite")
+
+def model_options(cfg: dict) -> dict:
+    opts = cfg.get("model") or {}
+    return {"streaming": bool(opts.get("streaming", False)), "chunk_rows": int(opts.get("chunk_rows", 250000))}
+
+def pca_options(cfg: dict) -> dict:
+    opts = cfg.get("pca") or {}
+    return {"frequency": opts.get("frequency", "M"), "window": opts.get("window"), "mode": opts.get("mode", "batch"),
+            "segments": opts.get("segments") or None, "workers": int(opts.get("workers", 4)),
+            "drift": float(opts.get("drift", 3.0))}
+
+def query_options(cfg: dict) -> dict:
+    opts = cfg.get("query") or {}
+    return {"maxsize": int(opts.get("cache_size", 128)), "ttl_s": float(opts.get("cache_ttl_s", 300)),
+            "cache_dir": opts.get("cache_dir")}
+
+def file_sha256(path: str | Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def config_digest(section: Any) -> str:
+    payload = json.dumps(section, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
 def normalize_columns(df: pd.DataFrame, mapping: Dict[str, str]) -> pd.DataFrame:
     cols = {c: mapping[c] for c in df.columns if c in mapping}
     df = df.rename(columns=cols)
@@ -28,54 +60,199 @@ def normalize_columns(df: pd.DataFrame, mapping: Dict[str, str]) -> pd.DataFrame
             df[tgt] = pd.NA
     return df
 
-def parse_decimal_series(s: pd.Series) -> pd.Series:
-    def _parse(x):
-        if pd.isna(x):
-            return np.nan
-        if isinstance(x, (int, float, np.integer, np.floating)):
-            return float(x)
-        if isinstance(x, str):
-            x2 = x.strip().replace(" ", "")
-            if "," in x2 and "." in x2:
-                if x2.rfind(".") > x2.rfind(","):
-                    x2 = x2.replace(",", "")
-                else:
-                    x2 = x2.replace(".", "").replace(",", ".")
-            else:
-                x2 = x2.replace(",", ".")
-            x2 = re.sub(r"(?<=\d)\.(?=\d{3}\b)", "", x2)
-            try:
-                return float(x2)
-            except:
-                return np.nan
+_THOUSANDS_DOT = r"(?<=\d)\.(?=\d{3}\b)"
+
+def _parse_decimal_value(x):
+    """
+    Per-value parser, used only as a fallback for the rows the vectorized path cannot resolve.
+    """
+    if pd.isna(x):
         return np.nan
-    return s.apply(_parse)
+    if isinstance(x, (int, float, np.integer, np.floating)):
+        return float(x)
+    if isinstance(x, str):
+        x2 = x.strip().replace(" ", "")
+        if "," in x2 and "." in x2:
+            if x2.rfind(".") > x2.rfind(","):
+                x2 = x2.replace(",", "")
+            else:
+                x2 = x2.replace(".", "").replace(",", ".")
+        else:
+            x2 = x2.replace(",", ".")
+        x2 = re.sub(_THOUSANDS_DOT, "", x2)
+        try:
+            return float(x2)
+        except:
+            return np.nan
+    return np.nan
+
+_PLAIN_NUMBER = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+
+def _parse_decimal_strings_arrow(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    x = pc.replace_substring(pc.utf8_trim_whitespace(pa.array(values, type=pa.string())), " ", "")
+    # Detección del formato una sola vez por columna
+    has_comma = pc.match_substring(x, ",")
+    if pc.any(has_comma).as_py():
+        mixed = pc.and_(has_comma, pc.match_substring(x, "."))
+        if pc.any(mixed).as_py():
+            # "1,234.56" (punto decimal) vs "1.234,56" (coma decimal)
+            dot_decimal = pc.and_(mixed, pc.match_substring_regex(x, r"\.[^,]*$"))
+            comma_decimal = pc.and_(mixed, pc.invert(dot_decimal))
+            x = pc.if_else(dot_decimal, pc.replace_substring(x, ",", ""), x)
+            x = pc.if_else(comma_decimal, pc.replace_substring(pc.replace_substring(x, ".", ""), ",", "."), x)
+        x = pc.if_else(pc.and_(has_comma, pc.invert(mixed)), pc.replace_substring(x, ",", "."), x)
+
+    # Separador de miles "1.234": RE2 no tiene lookbehind, se resuelve con re solo en las filas candidatas
+    thousands = pc.match_substring_regex(x, r"\d\.\d{3}\b").to_numpy(zero_copy_only=False)
+    if thousands.any():
+        x = x.to_numpy(zero_copy_only=False).astype(object)
+        x[thousands] = [re.sub(_THOUSANDS_DOT, "", v) for v in x[thousands]]
+        x = pa.array(x, type=pa.string())
+
+    valid = pc.match_substring_regex(x, _PLAIN_NUMBER)
+    out = np.full(len(x), np.nan)
+    valid_np = valid.to_numpy(zero_copy_only=False)
+    out[valid_np] = pc.cast(pc.filter(x, valid), pa.float64()).to_numpy()
+    return out, ~valid_np
+
+def _parse_decimal_strings_pandas(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    x = pd.Series(values, dtype=object).str.strip().str.replace(" ", "", regex=False)
+    has_comma = x.str.contains(",", regex=False)
+    if has_comma.any():
+        mixed = has_comma & x.str.contains(".", regex=False)
+        if mixed.any():
+            dot_decimal = mixed & (x.str.rfind(".") > x.str.rfind(","))
+            comma_decimal = mixed & ~dot_decimal
+            x = x.mask(dot_decimal, x[dot_decimal].str.replace(",", "", regex=False))
+            x = x.mask(comma_decimal, x[comma_decimal].str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+        only_comma = has_comma & ~mixed
+        x = x.mask(only_comma, x[only_comma].str.replace(",", ".", regex=False))
+    if x.str.contains(".", regex=False).any():
+        x = x.str.replace(_THOUSANDS_DOT, "", regex=True)
+    valid = x.str.match(_PLAIN_NUMBER).to_numpy(dtype=bool)
+    out = np.full(len(x), np.nan)
+    out[valid] = x[valid].to_numpy().astype(float)
+    return out, ~valid
+
+def parse_decimal_series(s: pd.Series) -> pd.Series:
+    # Columnas ya numéricas (lo habitual desde Excel): sin parsing
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype(float)
 
+    values = s.to_numpy(dtype=object, na_value=None)
+    out = np.full(len(values), np.nan)
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind == "string":
+        is_str = s.notna().to_numpy()
+    elif kind == "empty":
+        is_str = np.zeros(len(values), dtype=bool)
+    else:
+        is_str = np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=len(values))
+    is_other = ~is_str & s.notna().to_numpy()
+
+    if is_str.any():
+        raw = values[is_str]
+        try:
+            parsed, unresolved = _parse_decimal_strings_arrow(raw)
+        except ImportError:
+            parsed, unresolved = _parse_decimal_strings_pandas(raw)
+        # Fallback por valor solo para las filas ambiguas ("1_000", "inf", texto...)
+        if unresolved.any():
+            parsed[unresolved] = [_parse_decimal_value(v) for v in raw[unresolved]]
+        out[is_str] = parsed
+
+    if is_other.any():
+        other = values[is_other]
+        try:
+            out[is_other] = other.astype(float)
+        except (TypeError, ValueError):
+            out[is_other] = [_parse_decimal_value(v) for v in other]
+
+    return pd.Series(out, index=s.index, name=s.name)
+
+@timed()
 def coerce_numeric(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
     for c in cols:
         if c in df.columns:
             df[c] = parse_decimal_series(df[c])
     return df
 
+@timed()
+def coerce_int(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+    for c in cols:
+        if c in df.columns:
+            v = parse_decimal_series(df[c])
+            df[c] = v.where(v == v.round()).astype("Int64")
+    return df
+
+# Tipos compactos en memoria por clase de columna ("int", "float", "text"): enteros al menor ancho
+# que cabe, float32 solo si la conversión es exacta y texto de baja cardinalidad como categoría
+_INT_WIDTHS = [(np.int8, "Int8"), (np.int16, "Int16"), (np.int32, "Int32"), (np.int64, "Int64")]
+
+def compact_int(s: pd.Series) -> pd.Series:
+    """
+    Smallest integer dtype holding the values: numpy when there are no nulls, nullable Int8..Int64 otherwise.
+    """
+    has_na = bool(s.isna().any())
+    if len(s) == 0 or has_na and s.isna().all():
+        return s
+    lo, hi = int(s.min()), int(s.max())
+    for np_type, nullable in _INT_WIDTHS:
+        info = np.iinfo(np_type)
+        if info.min <= lo and hi <= info.max:
+            return s.astype(nullable if has_na else np_type)
+    return s
+
+def compact_float(s: pd.Series) -> pd.Series:
+    # float32 solo si todos los valores se representan exactamente (p.ej. cantidades enteras)
+    if s.dtype != np.float64:
+        return s
+    x = s.to_numpy()
+    x32 = x.astype(np.float32)
+    return s.astype(np.float32) if np.array_equal(x32.astype(np.float64), x, equal_nan=True) else s
+
+def compact_text(s: pd.Series, max_ratio: float = 0.5) -> pd.Series:
+    if isinstance(s.dtype, pd.CategoricalDtype) or len(s) == 0:
+        return s
+    return s.astype("category") if s.nunique(dropna=True) <= max_ratio * len(s) else s
+
+@timed("compact")
+def compact_frame(df: pd.DataFrame, kinds: Dict[str, str]) -> pd.DataFrame:
+    """
+    Downcast the columns of df in place according to their kind; columns without a kind are left as is.
+    """
+    convert = {"int": compact_int, "float": compact_float, "text": compact_text}
+    for c, kind in kinds.items():
+        if c in df.columns and kind in convert:
+            df[c] = convert[kind](df[c])
+    return df
+
 def to_parquet(df: pd.DataFrame, path: str | Path) -> None:
     path = Path(path)
     ensure_dir(path.parent)
-    try:
-        df.to_parquet(path, index=False)
-    except Exception:
-        csv_path = path.with_suffix(".csv")
-        df.to_csv(csv_path, index=False, encoding="utf-8")
-        
+    df.to_parquet(path, index=False)
+
 def month_floor(s: pd.Series) -> pd.Series:
     return pd.to_datetime(s).dt.to_period("M").dt.to_timestamp()
 
+def date_ids(dates: pd.Series) -> pd.Series:
+    """
+    YYYYMMDD integer keys computed arithmetically (no per-row string formatting).
+    """
+    d = pd.to_datetime(dates)
+    return (d.dt.year * 10000 + d.dt.month * 100 + d.dt.day).astype(np.int32)
+
+@timed()
 def build_dim_date(dates: pd.Series) -> pd.DataFrame:
     s = pd.to_datetime(dates).dropna().unique()
     if len(s) == 0:
         return pd.DataFrame(columns=["date_id","date","year","quarter","month","day_of_month","day_of_week","is_weekend"])
     idx = pd.date_range(pd.to_datetime(dates).min(), pd.to_datetime(dates).max(), freq="D")
     df = pd.DataFrame({"date": idx})
-    df["date_id"] = (df["date"].dt.strftime("%Y%m%d")).astype(int)
+    df["date_id"] = date_ids(df["date"])
     df["year"] = df["date"].dt.year
     df["quarter"] = df["date"].dt.quarter
     df["month"] = df["date"].dt.month
@@ -84,37 +261,61 @@ def build_dim_date(dates: pd.Series) -> pd.DataFrame:
     df["is_weekend"] = df["day_of_week"] >= 6
     return df[["date_id","date","year","quarter","month","day_of_month","day_of_week","is_weekend"]]
 
-def rfm_segmentation(sales_df: pd.DataFrame, today: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+RFM_QUANTILES = [0.2, 0.4, 0.6, 0.8]
+RFM_SEGMENTS = {"VIP": 12, "Loyal": 9, "Regular": 6}
+RFM_DEFAULT_SEGMENT = "At Risk"
+
+def _quantile_score(values: pd.Series, thresholds: np.ndarray) -> np.ndarray:
+    # Índice del primer umbral con x <= q (np.searchsorted side="left"); NaN cae en el último tramo
+    v = values.to_numpy(dtype=float)
+    idx = np.searchsorted(thresholds, v, side="left")
+    idx[np.isnan(v)] = len(thresholds)
+    return idx
+
+@timed("rfm")
+def rfm_segmentation(sales_df: pd.DataFrame, today: Optional[pd.Timestamp] = None, as_of: Optional[pd.Timestamp] = None,
+                     quantiles: Optional[list] = None, segments: Optional[Dict[str, float]] = None,
+                     default_segment: Optional[str] = None) -> pd.DataFrame:
+    """
+    Vectorized RFM. With as_of, only sales up to that date are used and recency is measured from
+    the following day, so segments can be rebuilt for historical snapshots.
+    """
+    sale_date = pd.to_datetime(sales_df["sale_date"])
+    if as_of is not None:
+        as_of = pd.Timestamp(as_of)
+        mask = (sale_date <= as_of).to_numpy()
+        sales_df, sale_date = sales_df[mask], sale_date[mask]
+        if today is None:
+            today = as_of.normalize() + pd.Timedelta(days=1)
     if today is None:
-        today = pd.to_datetime(sales_df["sale_date"]).max() + pd.Timedelta(days=1)
-    grp = sales_df.groupby("customer_id").agg(
-        recency_days = ("sale_date", lambda s: (today - pd.to_datetime(s).max()).days),
-        frequency = ("sale_id", "count"),
-        monetary = ("sales_amount", "sum"),
-    ).reset_index()
-    quantiles = grp.quantile(q=[0.2,0.4,0.6,0.8])
-    def r_score(x):
-        if x <= quantiles.loc[0.2, "recency_days"]: return 5
-        elif x <= quantiles.loc[0.4, "recency_days"] : return 4
-        elif x <= quantiles.loc[0.6, "recency_days"] : return 3
-        elif x <= quantiles.loc[0.8, "recency_days"] : return 2
-        else: return 1
-    def fm_score(x, col):
-        if x <= quantiles.loc[0.2, col]: return 1
-        elif x <= quantiles.loc[0.4, col] : return 2
-        elif x <= quantiles.loc[0.6, col] : return 3
-        elif x <= quantiles.loc[0.8, col] : return 4
-        else: return 5
-    grp["r_score"] = grp["recency_days"].apply(r_score)
-    grp["f_score"] = grp["frequency"].apply(lambda x: fm_score(x, "frequency"))
-    grp["m_score"] = grp["monetary"].apply(lambda x: fm_score(x, "monetary"))
-    grp["segment"] = grp[["r_score","f_score","m_score"]].sum(axis=1)
-    def label(s):
-        if s >= 12: return "VIP"
-        elif s >= 9: return "Loyal"
-        elif s >= 6: return "Regular"
-        else: return "At Risk"
-    grp["segment_label"] = grp["segment"].apply(label)
+        today = sale_date.max() + pd.Timedelta(days=1)
+    g = sales_df.assign(sale_date=sale_date).groupby("customer_id")
+    grp = pd.DataFrame({
+        "recency_days": (today - g["sale_date"].max()).dt.days,
+        "frequency": g["sale_id"].count(),
+        "monetary": g["sales_amount"].sum(),
+    }).reset_index()
+    return rfm_score(grp, quantiles=quantiles, segments=segments, default_segment=default_segment)
+
+def rfm_score(grp: pd.DataFrame, quantiles: Optional[list] = None, segments: Optional[Dict[str, float]] = None,
+              default_segment: Optional[str] = None) -> pd.DataFrame:
+    """
+    Score per-customer recency/frequency/monetary aggregates into quantile bins and segment labels.
+    """
+    q = sorted(quantiles or RFM_QUANTILES)
+    segments = segments or RFM_SEGMENTS
+    default_segment = default_segment or RFM_DEFAULT_SEGMENT
+
+    bins = grp[["recency_days","frequency","monetary"]].quantile(q=q)
+    n_bins = len(q) + 1
+    grp["r_score"] = n_bins - _quantile_score(grp["recency_days"], bins["recency_days"].to_numpy())
+    grp["f_score"] = 1 + _quantile_score(grp["frequency"], bins["frequency"].to_numpy())
+    grp["m_score"] = 1 + _quantile_score(grp["monetary"], bins["monetary"].to_numpy())
+    grp["segment"] = grp["r_score"] + grp["f_score"] + grp["m_score"]
+
+    ordered = sorted(segments.items(), key=lambda kv: kv[1], reverse=True)
+    seg = grp["segment"].to_numpy()
+    grp["segment_label"] = np.select([seg >= t for _, t in ordered], [label for label, _ in ordered], default=default_segment)
     return grp
 
 def add_unknown_row(df: pd.DataFrame, id_col: str, unknown_id: int = 0, **kwargs) -> pd.DataFrame:
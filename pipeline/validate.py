@@ -0,0 +1,174 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .ingest import DOMAINS, read_staging
+from .instrument import step, collect, merge
+from .utils import ensure_dir
+
+REPORT_NAME = "data_quality.json"
+
+# Tipos de regla de validation.rules.<dominio>; los listados en <dominio>.warn solo avisan
+RULES = ("unique", "null_ratio", "ranges", "dates", "references")
+
+def _plain(col: pa.ChunkedArray) -> pa.ChunkedArray:
+    # Texto codificado como diccionario -> texto plano (las reglas comparan valores, no índices)
+    return col.cast(col.type.value_type) if pa.types.is_dictionary(col.type) else col
+
+def _ids(col: pa.ChunkedArray) -> pa.Array:
+    """
+    Distinct natural IDs of a column; text codes are reduced to their numeric suffix (PRD_0084 -> 84),
+    the same convention as the key registry. Only the distinct values are parsed.
+    """
+    values = pc.unique(_plain(col)).drop_null()
+    if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+        values = values.filter(pc.match_substring_regex(values, r"\d$"))
+        values = pc.cast(pc.extract_regex(values, r"(?P<id>\d+)$").field("id"), pa.int64())
+    return pc.unique(values)
+
+def _result(domain: str, rule: str, column: str, observed: float, threshold: float, ok: bool, severity: str) -> dict:
+    return {"domain": domain, "rule": rule, "column": column, "observed": round(float(observed), 6),
+            "threshold": threshold, "ok": bool(ok), "severity": severity}
+
+def _out_of_range(col: pa.ChunkedArray, lo, hi) -> int:
+    masks = []
+    if lo is not None:
+        masks.append(pc.less(col, pa.scalar(lo, col.type)))
+    if hi is not None:
+        masks.append(pc.greater(col, pa.scalar(hi, col.type)))
+    if not masks:
+        return 0
+    bad = masks[0] if len(masks) == 1 else pc.or_(*masks)
+    return pc.sum(bad).as_py() or 0
+
+def _check_domain(domain: str, table: pa.Table, rules: dict, refs: dict) -> list[dict]:
+    """
+    Run one domain's rules with Arrow compute kernels (no per-row Python). Ratios are over all rows
+    (null_ratio), the non-null rows (ranges, dates) or the distinct keys (unique, references).
+    """
+    n = max(table.num_rows, 1)
+    tolerance = float(rules.get("tolerance", 0.0))
+    warn = set(rules.get("warn") or [])
+    out = []
+
+    def add(rule, column, observed, threshold, ok):
+        out.append(_result(domain, rule, column, observed, threshold, ok, "warn" if rule in warn else "error"))
+
+    # Una columna que falta incumple todas sus reglas
+    names = set(table.column_names)
+    for c in rules.get("unique") or []:
+        if c not in names:
+            add("unique", c, 1.0, 0.0, False)
+            continue
+        col = table.column(c)
+        present = len(col) - col.null_count
+        dup = (present - pc.count_distinct(col).as_py()) / max(present, 1)
+        add("unique", c, dup, 0.0, dup == 0)
+
+    for c, limit in (rules.get("null_ratio") or {}).items():
+        ratio = table.column(c).null_count / n if c in names else 1.0
+        add("null_ratio", c, ratio, limit, ratio <= limit)
+
+    for kind in ("ranges", "dates"):
+        for c, (lo, hi) in (rules.get(kind) or {}).items():
+            if c not in names:
+                add(kind, c, 1.0, tolerance, False)
+                continue
+            col = table.column(c)
+            if kind == "dates":
+                lo, hi = (pd.Timestamp(v) if v is not None else None for v in (lo, hi))
+            ratio = _out_of_range(col, lo, hi) / max(len(col) - col.null_count, 1)
+            add(kind, c, ratio, tolerance, ratio <= tolerance)
+
+    for c, ref in (rules.get("references") or {}).items():
+        target = refs.get(ref["ref"])
+        if c not in names or target is None:
+            add("references", c, 0.0, ref["min_ratio"], False)
+            continue
+        keys = _ids(table.column(c))
+        coverage = pc.sum(pc.is_in(keys, value_set=target)).as_py() / len(keys) if len(keys) else 1.0
+        add("references", c, coverage, ref["min_ratio"], coverage >= ref["min_ratio"])
+    return out
+
+def _columns(rules: dict) -> list[str]:
+    cols = list(rules.get("unique") or [])
+    for kind in ("null_ratio", "ranges", "dates", "references"):
+        cols += list(rules.get(kind) or {})
+    return list(dict.fromkeys(cols))
+
+def _reference_sets(tables: dict, rules: dict) -> dict:
+    # Conjuntos de IDs referenciados ("dominio.columna"), calculados una vez
+    refs = {}
+    for dom_rules in rules.values():
+        for ref in (dom_rules.get("references") or {}).values():
+            name = ref["ref"]
+            domain, col = name.split(".", 1)
+            if name not in refs and domain in tables and col in tables[domain].column_names:
+                refs[name] = _ids(tables[domain].column(col))
+    return refs
+
+def validate(processed_dir: str = "data/processed", rules: Optional[dict] = None, staging: Optional[dict] = None,
+             workers: int = 3) -> pd.DataFrame:
+    """
+    Declarative data-quality checks over the staging tables, one domain per thread (Arrow kernels
+    release the GIL). staging holds in-memory Arrow tables from ingest; otherwise only the columns the
+    rules need are read memory-mapped. Returns one row per check.
+    """
+    rules = {d: r for d, r in (rules or {}).items() if r}
+    unknown = [d for d in rules if d not in DOMAINS]
+    if unknown:
+        raise ValueError(f"Unknown validation domains {unknown}. Expected some of: {', '.join(DOMAINS)}.")
+    for d, r in rules.items():
+        bad = [k for k in r if k not in RULES + ("warn", "tolerance")]
+        if bad:
+            raise ValueError(f"Unknown validation rules {bad} for '{d}'. Expected some of: {', '.join(RULES)}.")
+
+    needed = {d: _columns(r) for d, r in rules.items()}
+    for r in rules.values():
+        for ref in (r.get("references") or {}).values():
+            domain, col = ref["ref"].split(".", 1)
+            needed.setdefault(domain, []).append(col)
+    needed = {d: list(dict.fromkeys(cols)) for d, cols in needed.items()}
+    with step("read_staging"):
+        tables = {d: (staging[d].select([c for c in cols if c in staging[d].column_names])
+                      if staging and d in staging else read_staging(processed_dir, d, cols))
+                  for d, cols in needed.items()}
+    refs = _reference_sets(tables, rules)
+
+    out = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {d: pool.submit(collect, _check_domain, d, tables[d], r, refs) for d, r in rules.items()}
+        for d, fut in futures.items():
+            res, steps = fut.result()
+            merge(steps, prefix=d)
+            out += res
+    cols = ["domain", "rule", "column", "observed", "threshold", "ok", "severity"]
+    return pd.DataFrame(out, columns=cols)
+
+def run(processed_dir: str = "data/processed", out_dir: str = "report", cfg: Optional[dict] = None,
+        staging: Optional[dict] = None) -> dict:
+    """
+    Validation stage: run the rules of cfg["validation"], write the report to <out_dir>/data_quality.json
+    and, with fail_fast, raise ValueError when an error-severity check fails.
+    """
+    opts = (cfg or {}).get("validation") or {}
+    report = validate(processed_dir, opts.get("rules"), staging=staging, workers=int(opts.get("workers", 3)))
+    failed = report[~report["ok"]]
+    errors = failed[failed["severity"] == "error"]
+
+    path = Path(out_dir) / REPORT_NAME
+    ensure_dir(path.parent)
+    path.write_text(json.dumps({"checks": len(report), "failed": len(failed), "errors": len(errors),
+                                "results": report.to_dict(orient="records")}, indent=2, default=str), encoding="utf-8")
+
+    if len(errors) and opts.get("fail_fast", True):
+        detail = "; ".join(f"{r.domain}.{r.column} {r.rule}={r.observed} (threshold {r.threshold})"
+                           for r in errors.itertuples())
+        raise ValueError(f"Data quality checks failed: {detail}. See {path}.")
+    return {"checks": len(report), "failed": len(failed), "errors": len(errors), "report": str(path),
+            "failures": failed.to_dict(orient="records")}
@@ -0,0 +1,383 @@
+import hashlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Optional
+import sqlite3
+import numpy as np
+import pandas as pd
+
+from .utils import ensure_dir
+from .instrument import step
+
+# DDL tipado del esquema en estrella: columnas, PK, FKs e índices (se crean tras la carga)
+STAR_SCHEMA = {
+    "dim_date": {
+        "columns": [
+            ("date_id", "INTEGER"), ("date", "TIMESTAMP"), ("year", "INTEGER"), ("quarter", "INTEGER"),
+            ("month", "INTEGER"), ("day_of_month", "INTEGER"), ("day_of_week", "INTEGER"), ("is_weekend", "INTEGER"),
+        ],
+        "primary_key": "date_id",
+    },
+    "dim_product": {
+        "columns": [("product_key", "INTEGER"), ("product_id", "INTEGER"), ("product_code", "TEXT"), ("category_id", "INTEGER")],
+        "primary_key": "product_key",
+    },
+    "dim_customer": {
+        "columns": [
+            ("customer_key", "INTEGER"), ("recency_days", "INTEGER"), ("frequency", "INTEGER"), ("monetary", "REAL"),
+            ("r_score", "INTEGER"), ("f_score", "INTEGER"), ("m_score", "INTEGER"), ("segment_score", "INTEGER"),
+            ("segment_label", "TEXT"),
+        ],
+        "primary_key": "customer_key",
+    },
+    "dim_store": {
+        "columns": [("store_key", "INTEGER"), ("store_id", "INTEGER"), ("store_name", "TEXT"), ("store_type", "TEXT")],
+        "primary_key": "store_key",
+    },
+    "dim_employee": {
+        "columns": [("employee_key", "INTEGER"), ("employee_id", "INTEGER"), ("department_id", "INTEGER"), ("salary", "REAL"), ("bonus", "REAL")],
+        "primary_key": "employee_key",
+    },
+    "fact_sales": {
+        "columns": [
+            ("sale_id", "INTEGER"), ("date_id", "INTEGER"), ("product_key", "INTEGER"), ("customer_key", "INTEGER"),
+            ("store_key", "INTEGER"), ("employee_key", "INTEGER"), ("quantity", "REAL"), ("unit_price", "REAL"),
+            ("discount_percent", "REAL"), ("sales_amount", "REAL"), ("profit_margin", "REAL"),
+        ],
+        "primary_key": "sale_id",
+        "foreign_keys": {
+            "date_id": "dim_date", "product_key": "dim_product", "customer_key": "dim_customer",
+            "store_key": "dim_store", "employee_key": "dim_employee",
+        },
+        "indexes": ["date_id", "product_key", "customer_key", "store_key", "employee_key"],
+    },
+    "fact_inventory_snapshot": {
+        "columns": [
+            ("inventory_id", "INTEGER"), ("date_id", "INTEGER"), ("product_key", "INTEGER"), ("warehouse_key", "INTEGER"),
+            ("stock_qty", "REAL"), ("reorder_level", "REAL"), ("unit_cost", "REAL"), ("total_value", "REAL"),
+        ],
+        "primary_key": "inventory_id",
+        "foreign_keys": {"date_id": "dim_date", "product_key": "dim_product"},
+        "indexes": ["date_id", "product_key", "warehouse_key"],
+    },
+}
+
+# Registro persistente de claves (entidad, clave natural) -> clave subrogada; sobrevive a las recargas completas
+KEY_REGISTRY = "key_registry"
+AUX_TABLES = {
+    KEY_REGISTRY: {
+        "columns": [("entity", "TEXT"), ("natural_key", "TEXT"), ("surrogate_key", "INTEGER")],
+        "primary_key": ["entity", "natural_key"],
+    },
+}
+
+BACKENDS = ("sqlite", "duckdb")
+
+def _spec(name: str) -> dict:
+    return STAR_SCHEMA[name] if name in STAR_SCHEMA else AUX_TABLES[name]
+
+def connect(db_path: str, backend: str = "sqlite"):
+    """
+    DB-API connection to the warehouse. duckdb (columnar storage, vectorized scans) is optional.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown warehouse backend '{backend}'. Expected one of: {', '.join(BACKENDS)}.")
+    ensure_dir(Path(db_path).parent)
+    if backend == "duckdb":
+        import duckdb
+        return duckdb.connect(db_path)
+    con = sqlite3.connect(db_path)
+    return con
+
+def is_sqlite(con) -> bool:
+    return isinstance(con, sqlite3.Connection)
+
+def read_frame(con, sql: str, params: Optional[list] = None) -> pd.DataFrame:
+    if is_sqlite(con):
+        return pd.read_sql(sql, con, params=params)
+    return con.execute(sql, params or []).df()
+
+def iter_frames(con, sql: str, chunk_rows: int = 100000) -> Iterable[pd.DataFrame]:
+    """
+    Result of a query in DataFrames of at most chunk_rows rows.
+    """
+    if is_sqlite(con):
+        yield from pd.read_sql(sql, con, chunksize=chunk_rows)
+        return
+    res = con.execute(sql)
+    # to_arrow_reader en versiones recientes de DuckDB; fetch_record_batch en las anteriores
+    reader = res.to_arrow_reader(chunk_rows) if hasattr(res, "to_arrow_reader") else res.fetch_record_batch(chunk_rows)
+    for batch in reader:
+        yield batch.to_pandas()
+
+def warehouse_digest(db_path: str, backend: str = "sqlite", chunk_rows: int = 100000) -> Optional[str]:
+    """
+    Content fingerprint of the star schema tables, independent of the ETL metadata (load time, load
+    version), the key registry and the physical file layout: two loads of the same data give the same
+    digest. Rows are hashed vectorized chunk by chunk and combined order-independently. None when the
+    warehouse does not exist.
+    """
+    if not Path(db_path).exists():
+        return None
+    h = hashlib.sha256()
+    con = connect(db_path, backend)
+    try:
+        for name, spec in STAR_SCHEMA.items():
+            if not table_exists(con, name):
+                continue
+            total, rows = 0, 0
+            for df in iter_frames(con, f"SELECT {', '.join(c for c, _ in spec['columns'])} FROM {name}", chunk_rows):
+                # Tipos normalizados por la especificación: el hash no depende del dtype inferido por bloque
+                for c, t in spec["columns"]:
+                    df[c] = pd.to_numeric(df[c]).astype("float64") if t in ("INTEGER", "REAL") else df[c].astype(object)
+                total = (total + int(pd.util.hash_pandas_object(df, index=False).to_numpy().sum(dtype=np.uint64))) % (1 << 64)
+                rows += len(df)
+            h.update(f"{name}:{rows}:{total};".encode("utf-8"))
+    finally:
+        con.close()
+    return h.hexdigest()
+
+# En DuckDB REAL es de 4 bytes; DOUBLE equivale al REAL de SQLite
+_DUCKDB_TYPES = {"REAL": "DOUBLE"}
+
+def create_table_sql(name: str, backend: str = "sqlite", if_not_exists: bool = False) -> str:
+    spec = _spec(name)
+    pk = spec["primary_key"]
+    types = _DUCKDB_TYPES if backend == "duckdb" else {}
+    cols = [f"{c} {types.get(t, t)} PRIMARY KEY" if c == pk else f"{c} {types.get(t, t)}" for c, t in spec["columns"]]
+    if isinstance(pk, list):
+        cols.append(f"PRIMARY KEY ({', '.join(pk)})")
+    if backend == "sqlite":
+        for col, ref in spec.get("foreign_keys", {}).items():
+            cols.append(f"FOREIGN KEY ({col}) REFERENCES {ref}({STAR_SCHEMA[ref]['primary_key']})")
+    exists = "IF NOT EXISTS " if if_not_exists else ""
+    return f"CREATE TABLE {exists}{name} (\n  " + ",\n  ".join(cols) + "\n)"
+
+def _index_sql(name: str) -> list[str]:
+    return [f"CREATE INDEX IF NOT EXISTS idx_{name}_{c} ON {name}({c})" for c in STAR_SCHEMA[name].get("indexes", [])]
+
+def iter_rows(df: pd.DataFrame, batch_size: int):
+    """
+    Yield lists of plain Python tuples (None for nulls, ISO text for datetimes) ready for executemany.
+    """
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size]
+        for c in batch.columns:
+            if pd.api.types.is_datetime64_any_dtype(batch[c]):
+                batch = batch.assign(**{c: batch[c].dt.strftime("%Y-%m-%d %H:%M:%S")})
+        batch = batch.astype(object).where(batch.notna(), None)
+        yield list(batch.itertuples(index=False, name=None))
+
+def _insert_frame_duckdb(con, name: str, df: pd.DataFrame, verb: str, suffix: str) -> int:
+    # DuckDB escanea el DataFrame directamente (vectorizado), sin tuplas por fila
+    # assign crea un frame nuevo con solo las columnas de texto cambiadas (sin copiar las demás)
+    df = df.assign(**{c: df[c].where(df[c].notna(), None) for c in df.columns if df[c].dtype == object})
+    cols = ", ".join(df.columns)
+    con.register("_frame", df)
+    try:
+        res = con.execute(f"{verb} INTO {name} ({cols}) SELECT {cols} FROM _frame{suffix}").fetchone()
+    finally:
+        con.unregister("_frame")
+    return int(res[0]) if res else 0
+
+def drop_bad_keys(name: str, df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """
+    Rows a table cannot hold under its primary key: NULL keys and repeated keys (the first row of each
+    key is kept). Returns the remaining rows and the rejected count per reason.
+    """
+    spec = _spec(name)
+    pk = spec["primary_key"] if isinstance(spec["primary_key"], list) else [spec["primary_key"]]
+    null = df[pk].isna().any(axis=1).to_numpy()
+    dup = df.duplicated(pk).to_numpy() & ~null
+    counts = {k: int(v.sum()) for k, v in (("null_key", null), ("duplicate_key", dup)) if v.any()}
+    return (df[~(null | dup)] if counts else df), counts
+
+def _add_rejected(rejected: dict, name: str, counts: dict) -> None:
+    for k, n in counts.items():
+        if n:
+            rejected.setdefault(name, {}).setdefault(k, 0)
+            rejected[name][k] += n
+
+def insert_frame(con, name: str, df: pd.DataFrame, batch_size: int = 50000, verb: str = "INSERT",
+                 suffix: str = "") -> int:
+    """
+    Insert a frame into a star schema table. Returns the number of rows changed. Rows with a NULL
+    primary key are rejected with ValueError.
+    """
+    spec = _spec(name)
+    cols = [c for c, _ in spec["columns"]]
+    # INTEGER PRIMARY KEY es alias del rowid en SQLite: un NULL recibiría un valor inventado
+    pk = spec["primary_key"] if isinstance(spec["primary_key"], list) else [spec["primary_key"]]
+    nulls = {c: int(n) for c in pk if (n := df[c].isna().sum())}
+    if nulls:
+        raise ValueError(f"NULL primary key values in {name}: {nulls}. Fix or drop those rows in the source.")
+    if not is_sqlite(con):
+        return _insert_frame_duckdb(con, name, df[cols], verb, suffix) if len(df) else 0
+    before = con.total_changes
+    sql = f"{verb} INTO {name} ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)}){suffix}"
+    for rows in iter_rows(df[cols], batch_size):
+        con.executemany(sql, rows)
+    return con.total_changes - before
+
+def upsert_frame(con, name: str, df: pd.DataFrame, keep_existing: bool = True, update: bool = True,
+                 batch_size: int = 50000) -> int:
+    """
+    Insert rows, resolving primary key conflicts. With keep_existing, NULLs in the new row do not
+    overwrite stored values; with update=False conflicting rows are left untouched. Returns rows changed.
+    """
+    spec = _spec(name)
+    pk = spec["primary_key"] if isinstance(spec["primary_key"], list) else [spec["primary_key"]]
+    if not update:
+        return insert_frame(con, name, df, batch_size, verb="INSERT OR IGNORE")
+    cols = [c for c, _ in spec["columns"] if c not in pk]
+    if keep_existing:
+        sets = ", ".join(f"{c} = COALESCE(excluded.{c}, {name}.{c})" for c in cols)
+    else:
+        sets = ", ".join(f"{c} = excluded.{c}" for c in cols)
+    return insert_frame(con, name, df, batch_size, suffix=f" ON CONFLICT({', '.join(pk)}) DO UPDATE SET {sets}")
+
+def table_exists(con, name: str) -> bool:
+    if is_sqlite(con):
+        sql = "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?"
+    else:
+        sql = "SELECT 1 FROM information_schema.tables WHERE table_name=?"
+    return con.execute(sql, [name]).fetchone() is not None
+
+def read_watermarks(con) -> dict:
+    return {t: d for t, d in con.execute("SELECT table_name, date_id FROM etl_watermark").fetchall()}
+
+def temp_keys(con, name: str, col: str, values) -> None:
+    """
+    (Re)fill a temp table with one integer key column, used to join a delta against the warehouse.
+    """
+    con.execute(f"CREATE TEMP TABLE IF NOT EXISTS {name} ({col} INTEGER PRIMARY KEY)")
+    con.execute(f"DELETE FROM {name}")
+    keys = pd.DataFrame({col: pd.unique(pd.Series(values, dtype="int64"))})
+    if is_sqlite(con):
+        con.executemany(f"INSERT INTO {name} VALUES (?)", list(keys.itertuples(index=False, name=None)))
+        return
+    con.register("_keys", keys)
+    try:
+        con.execute(f"INSERT INTO {name} SELECT {col} FROM _keys")
+    finally:
+        con.unregister("_keys")
+
+def optimize(con) -> None:
+    # Estadísticas del planificador tras una carga (DuckDB las mantiene por sí solo)
+    if is_sqlite(con):
+        con.execute("PRAGMA optimize")
+
+def read_key_registry(con) -> pd.DataFrame:
+    if not table_exists(con, KEY_REGISTRY):
+        return pd.DataFrame(columns=[c for c, _ in AUX_TABLES[KEY_REGISTRY]["columns"]])
+    return read_frame(con, f"SELECT entity, natural_key, surrogate_key FROM {KEY_REGISTRY}")
+
+def write_key_registry(con, rows: pd.DataFrame) -> int:
+    """
+    Append new registry entries; existing (entity, natural_key) pairs are never reassigned.
+    """
+    con.execute(create_table_sql(KEY_REGISTRY, "sqlite" if is_sqlite(con) else "duckdb", if_not_exists=True))
+    return upsert_frame(con, KEY_REGISTRY, rows, update=False) if len(rows) else 0
+
+def write_watermarks(con, marks: dict) -> None:
+    """
+    Store the watermarks of a load and bump the warehouse load version (every load writes watermarks).
+    """
+    con.execute("CREATE TABLE IF NOT EXISTS etl_watermark (table_name TEXT PRIMARY KEY, date_id INTEGER, loaded_at TEXT)")
+    now = pd.Timestamp.now().isoformat(timespec="seconds")
+    con.executemany("INSERT OR REPLACE INTO etl_watermark VALUES (?, ?, ?)", [(t, int(d), now) for t, d in marks.items()])
+    con.execute("CREATE TABLE IF NOT EXISTS etl_load_version (version INTEGER)")
+    version = read_load_version(con) + 1
+    con.execute("DELETE FROM etl_load_version")
+    con.execute("INSERT INTO etl_load_version VALUES (?)", [version])
+
+def read_load_version(con) -> int:
+    """
+    Counter of loads into the warehouse (0 before the first one); used to invalidate cached query results.
+    """
+    if not table_exists(con, "etl_load_version"):
+        return 0
+    row = con.execute("SELECT MAX(version) FROM etl_load_version").fetchone()
+    return int(row[0] or 0)
+
+@contextmanager
+def transaction(warehouse_path: str, backend: str = "sqlite"):
+    """
+    Connection with a single explicit transaction. On SQLite, with bulk-load PRAGMAs (WAL, synchronous=OFF).
+    """
+    con = connect(warehouse_path, backend)
+    try:
+        if is_sqlite(con):
+            con.isolation_level = None
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=OFF")
+            con.execute("PRAGMA temp_store=MEMORY")
+        con.execute("BEGIN TRANSACTION")
+        try:
+            yield con
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+    finally:
+        con.close()
+
+def load_star(warehouse_path: str, tables: dict[str, pd.DataFrame], batch_size: int = 50000,
+              watermarks: Optional[dict] = None, backend: str = "sqlite",
+              streams: Optional[dict[str, Iterable[pd.DataFrame]]] = None,
+              keys: Optional[pd.DataFrame] = None) -> dict:
+    """
+    Replace the star schema tables in one transaction: typed DDL with primary and foreign keys,
+    batched executemany inserts, indexes built after the load and ANALYZE at the end.
+    On DuckDB frames are scanned directly and only primary keys are kept (columnar zone maps
+    replace secondary indexes, and foreign keys would block dimension upserts).
+    streams maps tables to iterables of frames (e.g. fact chunks built while reading staging) that are
+    inserted as they are produced, so the whole table never has to fit in memory. keys are the new
+    key registry entries, appended in the same transaction. Rows with a NULL or repeated primary key
+    (also across stream chunks) are not loaded: the first row of each key wins. Returns rows loaded per
+    table and, under "rejected", the rows left out per table and reason.
+    """
+    streams = streams or {}
+    names = [name for name in STAR_SCHEMA if name in tables or name in streams]
+    rows = {}
+    rejected = {}
+    with transaction(warehouse_path, backend) as con:
+        sqlite = is_sqlite(con)
+        # Facts primero al borrar, dimensiones primero al crear
+        for name in reversed(names):
+            con.execute(f"DROP TABLE IF EXISTS {name}")
+        for name in names:
+            con.execute(create_table_sql(name, backend))
+            if name in tables:
+                with step(name, rows_in=len(tables[name])) as st:
+                    df, bad = drop_bad_keys(name, tables[name])
+                    insert_frame(con, name, df, batch_size)
+                    st["rows_out"] = rows[name] = len(df)
+                _add_rejected(rejected, name, bad)
+                continue
+            with step(name) as st:
+                st["rows_in"] = st["rows_out"] = 0
+                for chunk in streams[name]:
+                    df, bad = drop_bad_keys(name, chunk)
+                    # Claves ya cargadas por un bloque anterior: la primera fila gana
+                    added = insert_frame(con, name, df, batch_size, verb="INSERT OR IGNORE")
+                    _add_rejected(rejected, name, {**bad, "duplicate_key": bad.get("duplicate_key", 0) + len(df) - added})
+                    st["rows_in"] += len(chunk)
+                    st["rows_out"] += added
+            rows[name] = st["rows_out"]
+        if sqlite:
+            with step("indexes"):
+                for name in names:
+                    for sql in _index_sql(name):
+                        con.execute(sql)
+        if keys is not None:
+            write_key_registry(con, keys)
+        if watermarks:
+            write_watermarks(con, watermarks)
+        if sqlite:
+            with step("analyze"):
+                con.execute("ANALYZE")
+    if rejected:
+        print(f"[WARN] Rows not loaded (NULL or repeated primary key): {rejected}")
+    rows["rejected"] = rejected
+    return rows
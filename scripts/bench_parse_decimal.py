@@ -0,0 +1,97 @@
+"""
+Benchmark de parse_decimal_series: implementación anterior (apply por celda) vs vectorizada.
+
+    python scripts/bench_parse_decimal.py --rows 1000000
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from pipeline.utils import parse_decimal_series
+
+
+def _legacy_parse_decimal_series(s: pd.Series) -> pd.Series:
+    def _parse(x):
+        if pd.isna(x):
+            return np.nan
+        if isinstance(x, (int, float, np.integer, np.floating)):
+            return float(x)
+        if isinstance(x, str):
+            x2 = x.strip().replace(" ", "")
+            if "," in x2 and "." in x2:
+                if x2.rfind(".") > x2.rfind(","):
+                    x2 = x2.replace(",", "")
+                else:
+                    x2 = x2.replace(".", "").replace(",", ".")
+            else:
+                x2 = x2.replace(",", ".")
+            x2 = re.sub(r"(?<=\d)\.(?=\d{3}\b)", "", x2)
+            try:
+                return float(x2)
+            except:
+                return np.nan
+        return np.nan
+    return s.apply(_parse)
+
+
+def _make_series(kind: str, rows: int, seed: int) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(0, 100000, rows).round(2)
+    if kind == "numeric":
+        return pd.Series(values)
+    if kind == "dot":
+        return pd.Series([f"{v:.2f}" for v in values], dtype=object)
+    # Mezcla de formatos: "1.234,56", "1,234.56", "1234,56", nulos y basura
+    fmt = rng.integers(0, 5, rows)
+    out = np.empty(rows, dtype=object)
+    for i, (v, f) in enumerate(zip(values, fmt)):
+        if f == 0:
+            out[i] = f"{v:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+        elif f == 1:
+            out[i] = f"{v:,.2f}"
+        elif f == 2:
+            out[i] = f"{v:.2f}".replace(".", ",")
+        elif f == 3:
+            out[i] = None if i % 2 else "n/a"
+        else:
+            out[i] = float(v)
+    return pd.Series(out)
+
+
+def _rate(fn, s: pd.Series, repeat: int) -> tuple[float, pd.Series]:
+    best = float("inf")
+    res = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = fn(s)
+        best = min(best, time.perf_counter() - t0)
+    return len(s) / best, res
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    rows = []
+    for kind in ["numeric", "dot", "mixed"]:
+        s = _make_series(kind, args.rows, args.seed)
+        before, expected = _rate(_legacy_parse_decimal_series, s, args.repeat)
+        after, got = _rate(parse_decimal_series, s, args.repeat)
+        if not np.array_equal(expected.to_numpy(), got.to_numpy(), equal_nan=True):
+            raise SystemExit(f"Results differ for column kind '{kind}'")
+        rows.append({"column": kind, "rows": args.rows, "before_rows_per_s": round(before),
+                     "after_rows_per_s": round(after), "speedup": round(after / before, 1)})
+    print(pd.DataFrame(rows).to_markdown(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Benchmark del pipeline completo sobre datos sintéticos (scripts/gen_synthetic.py).
+
+Cada etapa (ingest.run, model.build_star, analytics.run_pca) se ejecuta en un proceso nuevo para medir
+por separado tiempo de pared y pico de RSS (proceso + hijos). Con --tracemalloc se añade una ejecución
+aparte por etapa para el pico de tracemalloc: trazar cada asignación infla el tiempo de pared, así que
+nunca se mide en la misma ejecución que los segundos.
+
+    python scripts/bench_pipeline.py --rows 10000 100000 --output bench/results.json
+    python scripts/bench_pipeline.py --rows 100000 --compare bench/baseline.json
+
+Por encima del límite de filas de Excel no se mide la ingesta: model parte del staging generado.
+Los resultados (JSON) incluyen el commit para comparar regresiones entre versiones.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "scripts"))
+from gen_synthetic import XLSX_MAX_ROWS, generate
+
+STAGES = ["ingest", "model", "analytics"]
+
+
+def _maxrss_mb(who: int) -> float:
+    rss = resource.getrusage(who).ru_maxrss
+    # Linux en KiB, macOS en bytes
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+def _run_stage(stage: str, workdir: str, config_path: str, n_components: int, trace: bool = False) -> dict:
+    """
+    Runs inside a fresh process, with workdir as cwd, so peak RSS belongs to this stage only. With trace,
+    only the tracemalloc peak is reported: the wall time of a traced run is not comparable.
+    """
+    from pipeline.ingest import run as ingest_run
+    from pipeline.model import build_star
+    from pipeline.analytics import run_pca
+    from pipeline.utils import read_config, warehouse_backend, model_options, pca_options
+
+    os.chdir(workdir)
+    cfg = read_config(config_path)
+    backend = warehouse_backend(cfg)
+    if trace:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    if stage == "ingest":
+        res = ingest_run(output_dir="processed", config_path=config_path, prefer_gdrive=False, force=True)
+    elif stage == "model":
+        res = build_star(processed_dir="processed", warehouse_path="warehouse.db", rfm=cfg.get("rfm"), backend=backend,
+                         **model_options(cfg))
+    else:
+        res = run_pca(warehouse_path="warehouse.db", out_dir="report", n_components=n_components, backend=backend,
+                      processed_dir="processed", **pca_options(cfg))
+    seconds = time.perf_counter() - t0
+    if trace:
+        _, traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {"tracemalloc_peak_mb": round(traced / (1 << 20), 1)}
+    return {
+        "seconds": round(seconds, 4),
+        "peak_rss_mb": round(_maxrss_mb(resource.RUSAGE_SELF), 1),
+        "peak_rss_children_mb": round(_maxrss_mb(resource.RUSAGE_CHILDREN), 1),
+        "result": {k: v for k, v in res.items() if isinstance(v, (int, float))},
+    }
+
+
+def _stage(stage: str, workdir: Path, config_path: str, n_components: int, trace: bool = False) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(_run_stage, stage, str(workdir), config_path, n_components, trace).result()
+
+
+def _commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return out.stdout.strip() + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench(rows: int, stages: list[str], config_path: str, seed: int, repeat: int, n_components: int,
+          workdir: Path, trace: bool = False) -> list[dict]:
+    workdir = Path(workdir)
+    use_xlsx = "ingest" in stages and rows + int(rows * 0.01) <= XLSX_MAX_ROWS
+    t0 = time.perf_counter()
+    gen = generate(workdir, rows, config_path=config_path, seed=seed,
+                   formats=("xlsx",) if use_xlsx else ("staging",))
+    gen_seconds = time.perf_counter() - t0
+    if use_xlsx:
+        config_path = gen["config_path"]
+    else:
+        shutil.copytree(workdir / "staging", workdir / "processed", dirs_exist_ok=True)
+    config_path = str(Path(config_path).resolve())
+
+    records = []
+    for stage in stages:
+        if stage == "ingest" and not use_xlsx:
+            records.append({"rows": rows, "stage": stage, "skipped": f"more than {XLSX_MAX_ROWS} rows"})
+            continue
+        runs = [_stage(stage, workdir, config_path, n_components) for _ in range(repeat)]
+        best = min(runs, key=lambda r: r["seconds"])
+        best["peak_rss_mb"] = max(r["peak_rss_mb"] for r in runs)
+        if trace:
+            best.update(_stage(stage, workdir, config_path, n_components, trace=True))
+        records.append({"rows": rows, "stage": stage, "generate_seconds": round(gen_seconds, 2), **best})
+    return records
+
+
+def _compare(current: list[dict], baseline_path: str) -> str:
+    base = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    cols = ["rows", "stage", "seconds", "peak_rss_mb"]
+    a = pd.DataFrame(base["results"]).reindex(columns=cols)
+    b = pd.DataFrame(current).reindex(columns=cols)
+    df = a.merge(b, on=["rows", "stage"], suffixes=("_base", "_new")).dropna()
+    df["time_ratio"] = (df["seconds_new"] / df["seconds_base"]).round(2)
+    df["rss_ratio"] = (df["peak_rss_mb_new"] / df["peak_rss_mb_base"]).round(2)
+    return f"Baseline: {base.get('commit')}\n\n" + df.to_markdown(index=False)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[10_000], help="Escalas (filas de ventas)")
+    ap.add_argument("--stages", default=",".join(STAGES))
+    ap.add_argument("--config-path", default=str(ROOT / "config" / "config.yml"))
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--n-components", type=int, default=5)
+    ap.add_argument("--tracemalloc", action="store_true",
+                    help="Ejecución extra por etapa con tracemalloc para su pico (no afecta a los segundos)")
+    ap.add_argument("--workdir", default=None, help="Directorio de trabajo; por defecto uno temporal que se borra")
+    ap.add_argument("--output", default="bench/results.json")
+    ap.add_argument("--compare", default=None, help="JSON de una ejecución anterior para comparar")
+    args = ap.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise SystemExit(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    results = []
+    for rows in args.rows:
+        if args.workdir:
+            results += bench(rows, stages, args.config_path, args.seed, args.repeat, args.n_components,
+                             Path(args.workdir) / str(rows), trace=args.tracemalloc)
+        else:
+            with tempfile.TemporaryDirectory(prefix="hilo-bench-") as tmp:
+                results += bench(rows, stages, args.config_path, args.seed, args.repeat, args.n_components, Path(tmp),
+                                 trace=args.tracemalloc)
+
+    report = {
+        "commit": _commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    out = Path(args.output)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    table = pd.DataFrame(results).drop(columns=["result"], errors="ignore")
+    print(table.to_markdown(index=False))
+    if args.compare:
+        print()
+        print(_compare(results, args.compare))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Generador de datos sintéticos para el pipeline: ventas, inventario y RRHH con el layout de columnas
+de config/config.yml, decimales "sucios", duplicados y nulos.
+
+    python scripts/gen_synthetic.py --rows 100000 --out data/synthetic/100k
+
+Formatos:
+- xlsx: workbooks crudos (columnas originales, ensuciados) que lee `ingest.run`. Límite de Excel: 1.048.575 filas.
+- staging: parquet ya normalizado (stg_*.parquet) para medir model/analytics a escalas donde no cabe un xlsx.
+
+Además se escribe un config.yml en --out con `sources.local_files` apuntando a los workbooks generados.
+Los nulos respetan `validation.rules.<dominio>.null_ratio` del config (como mucho la mitad del umbral de
+cada columna), así que los datos generados pasan la validación del pipeline.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from pipeline.ingest import DOMAINS, staging_schema
+from pipeline.utils import ensure_dir, read_config
+
+XLSX_MAX_ROWS = 1_048_575
+START_DATE = pd.Timestamp("2022-01-01")
+DAYS = 730
+
+# Filas por dominio relativas a --rows (ventas)
+RATIOS = {"sales": 1.0, "inventory": 0.25, "hr": 0.05}
+
+
+def _scale(rows: int) -> dict:
+    return {
+        "customers": max(100, rows // 20),
+        "products": max(50, rows // 2000),
+        "stores": 20,
+        "warehouses": 10,
+        "categories": 12,
+        "employees": max(10, rows // 2000),
+        "departments": 8,
+    }
+
+
+def _dates(rng: np.random.Generator, n: int) -> pd.Series:
+    return pd.Series(START_DATE + pd.to_timedelta(rng.integers(0, DAYS, n), unit="D"))
+
+
+def _sales(rng: np.random.Generator, start: int, n: int, scale: dict) -> pd.DataFrame:
+    qty = rng.integers(1, 10, n)
+    price = rng.uniform(1, 500, n).round(2)
+    disc = rng.choice([0.0, 5.0, 10.0, 15.0, 20.0], n)
+    return pd.DataFrame({
+        "sale_id": np.arange(start + 1, start + n + 1),
+        "sale_date": _dates(rng, n),
+        "product_id": rng.integers(1, scale["products"] + 1, n),
+        "customer_id": rng.integers(1, scale["customers"] + 1, n),
+        "store_id": rng.integers(1, scale["stores"] + 1, n),
+        "quantity": qty.astype(float),
+        "unit_price": price,
+        "discount_percent": disc,
+        "sales_amount": (qty * price * (1 - disc / 100)).round(2),
+        "profit_margin": rng.uniform(5, 45, n).round(2),
+    })
+
+
+def _inventory(rng: np.random.Generator, start: int, n: int, scale: dict) -> pd.DataFrame:
+    stock = rng.integers(0, 500, n).astype(float)
+    cost = rng.uniform(0.5, 250, n).round(2)
+    product = pd.Series(rng.integers(1, scale["products"] + 1, n)).astype(str).str.zfill(4)
+    return pd.DataFrame({
+        "inventory_id": np.arange(start + 1, start + n + 1),
+        "snapshot_date": _dates(rng, n),
+        "warehouse_id": rng.integers(1, scale["warehouses"] + 1, n),
+        "category_id": rng.integers(1, scale["categories"] + 1, n),
+        "product_code": "PRD_" + product,
+        "stock_qty": stock,
+        "reorder_level": rng.integers(10, 200, n).astype(float),
+        "unit_cost": cost,
+        "total_value": (stock * cost).round(2),
+    })
+
+
+def _hr(rng: np.random.Generator, start: int, n: int, scale: dict) -> pd.DataFrame:
+    salary = rng.uniform(1500, 8000, n).round(2)
+    return pd.DataFrame({
+        "record_id": np.arange(start + 1, start + n + 1),
+        "employee_id": rng.integers(1, scale["employees"] + 1, n),
+        "review_date": _dates(rng, n),
+        "department_id": rng.integers(1, scale["departments"] + 1, n),
+        "performance_score": rng.uniform(1, 5, n).round(1),
+        "hours_worked": rng.uniform(120, 200, n).round(1),
+        "overtime_hours": rng.uniform(0, 40, n).round(1),
+        "salary": salary,
+        "bonus": (salary * rng.uniform(0, 0.2, n)).round(2),
+    })
+
+
+BUILDERS = {"sales": _sales, "inventory": _inventory, "hr": _hr}
+BUILDER_COLUMNS = {name: list(build(np.random.default_rng(0), 0, 1, _scale(1)).columns) for name, build in BUILDERS.items()}
+
+
+def _messy_decimal(v: float, style: int) -> str:
+    if style == 0:
+        return f"{v:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")  # 1.234,56
+    if style == 1:
+        return f"{v:,.2f}"  # 1,234.56
+    if style == 2:
+        return f"{v:.2f}".replace(".", ",")  # 1234,56
+    return f" {v:.2f} "
+
+
+def _null_rates(cfg: dict, name: str, null_rate: float) -> dict:
+    """
+    Null rate per column: null_rate, capped at half the column's null_ratio threshold in the config's
+    validation rules.
+    """
+    limits = ((cfg.get("validation") or {}).get("rules") or {}).get(name, {}).get("null_ratio") or {}
+    return {c: min(null_rate, limits[c] / 2) if c in limits else null_rate for c in BUILDER_COLUMNS[name]}
+
+
+def _chunk(name: str, rng: np.random.Generator, start: int, n: int, scale: dict,
+           null_rates: dict, dirty_rate: float, dup_rate: float, raw: bool) -> tuple[pd.DataFrame, pd.DataFrame | None]:
+    """
+    One block of a domain: the clean staging frame (nulls and "n/a" cells as NA, no duplicates) and,
+    when raw=True, the messy frame as it would appear in the source workbook.
+    """
+    spec = DOMAINS[name]
+    clean = BUILDERS[name](rng, start, n, scale)
+    pk = clean.columns[0]
+    for c in spec["ids"]:
+        clean[c] = clean[c].astype("Int64")
+
+    # Nulos en cualquier columna salvo la PK y la fecha (grano de los facts); "n/a" en una parte de las numéricas
+    garbage = {}
+    for c in clean.columns.drop([pk] + spec["dates"]):
+        mask = rng.random(n) < null_rates[c]
+        if c in spec["numeric"]:
+            garbage[c] = mask & (rng.random(n) < 0.25)
+        if mask.any():
+            clean[c] = clean[c].mask(mask)
+    if name == "inventory":
+        clean["product_code"] = clean["product_code"].astype("string")
+
+    if not raw:
+        return clean, None
+
+    messy = clean.astype(object).where(clean.notna(), None)
+    for c in spec["numeric"]:
+        dirty = (rng.random(n) < dirty_rate) & clean[c].notna().to_numpy()
+        if dirty.any():
+            styles = rng.integers(0, 4, int(dirty.sum()))
+            messy.loc[dirty, c] = [_messy_decimal(v, s) for v, s in zip(clean.loc[dirty, c], styles)]
+        messy.loc[garbage[c], c] = "n/a"
+
+    # Duplicados exactos dentro del bloque
+    n_dup = int(n * dup_rate)
+    if n_dup:
+        messy = pd.concat([messy, messy.iloc[rng.integers(0, n, n_dup)]], ignore_index=True)
+    return clean, messy
+
+
+def _excel_writer(header: list[str]):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(header)
+    return wb, ws
+
+
+def generate(out_dir: str | Path, rows: int, config_path: str | Path = "config/config.yml", seed: int = 42,
+             formats: tuple[str, ...] = ("xlsx", "staging"), null_rate: float = 0.02, dirty_rate: float = 0.05,
+             dup_rate: float = 0.01, chunk_rows: int = 100_000) -> dict:
+    """
+    Write the synthetic sources for `rows` sales rows (inventory and HR scale with RATIOS).
+    Generation is chunked and deterministic for a given seed and chunk_rows.
+    """
+    cfg = read_config(config_path)
+    out = ensure_dir(out_dir)
+    scale = _scale(rows)
+    counts = {name: max(1, int(rows * ratio)) for name, ratio in RATIOS.items()}
+    raw = "xlsx" in formats
+    if raw and counts["sales"] + int(counts["sales"] * dup_rate) > XLSX_MAX_ROWS:
+        raise ValueError(f"{rows} rows do not fit in a single xlsx sheet; use formats=('staging',).")
+
+    res = {"rows": counts, "raw": {}, "staging": {}}
+    for i, name in enumerate(DOMAINS):
+        # Columnas originales del config en el orden del builder
+        inverse = {v: k for k, v in cfg["columns"][name].items()}
+        wb = ws = writer = None
+        xlsx_path = out / "raw" / f"{name}_synthetic.xlsx"
+        stg_path = out / "staging" / f"stg_{name}.parquet"
+        null_rates = _null_rates(cfg, name, null_rate)
+        try:
+            for j, start in enumerate(range(0, counts[name], chunk_rows)):
+                n = min(chunk_rows, counts[name] - start)
+                rng = np.random.default_rng([seed, i, j])
+                clean, messy = _chunk(name, rng, start, n, scale, null_rates, dirty_rate, dup_rate, raw)
+                if raw:
+                    if wb is None:
+                        ensure_dir(xlsx_path.parent)
+                        wb, ws = _excel_writer([inverse.get(c, c) for c in messy.columns])
+                    for row in messy.itertuples(index=False, name=None):
+                        ws.append(row)
+                if "staging" in formats:
+                    if writer is None:
+                        ensure_dir(stg_path.parent)
+                        schema = staging_schema(name, cfg["columns"][name])
+                        writer = pq.ParquetWriter(stg_path, schema)
+                    writer.write_table(pa.Table.from_pandas(clean[schema.names], schema=schema, preserve_index=False)
+                                       .replace_schema_metadata())
+        finally:
+            if writer is not None:
+                writer.close()
+        if wb is not None:
+            wb.save(xlsx_path)
+            res["raw"][name] = str(xlsx_path)
+        if writer is not None:
+            res["staging"][name] = str(stg_path)
+
+    if raw:
+        cfg["sources"] = {"local_files": res["raw"]}
+        res["config_path"] = str(out / "config.yml")
+        with open(res["config_path"], "w", encoding="utf-8") as f:
+            yaml.safe_dump(cfg, f, allow_unicode=True, sort_keys=False)
+    return res
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10_000, help="Filas de ventas (inventario y RRHH escalan en proporción)")
+    ap.add_argument("--out", default="data/synthetic")
+    ap.add_argument("--config-path", default="config/config.yml")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--formats", default="xlsx,staging", help="Lista separada por comas: xlsx, staging")
+    ap.add_argument("--null-rate", type=float, default=0.02)
+    ap.add_argument("--dirty-rate", type=float, default=0.05)
+    ap.add_argument("--dup-rate", type=float, default=0.01)
+    ap.add_argument("--chunk-rows", type=int, default=100_000)
+    args = ap.parse_args()
+
+    res = generate(args.out, args.rows, config_path=args.config_path, seed=args.seed,
+                   formats=tuple(f.strip() for f in args.formats.split(",") if f.strip()),
+                   null_rate=args.null_rate, dirty_rate=args.dirty_rate, dup_rate=args.dup_rate,
+                   chunk_rows=args.chunk_rows)
+    print(res)
+
+
+if __name__ == "__main__":
+    main()
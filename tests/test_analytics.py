@@ -0,0 +1,214 @@
+import sqlite3
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import pytest
+
+from pipeline.analytics import _hr_features, _period_features, _feature_cube, _segment_pca, _partial_fit, run_pca
+
+
+def test_period_features_aggregates_in_sql(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    con = sqlite3.connect(":memory:")
+    pd.DataFrame({
+        "date_id": [20230105, 20230120, 20230203],
+        "quantity": [1.0, 3.0, 2.0], "unit_price": [1.0, 1.0, 1.0], "discount_percent": [10.0, np.nan, 5.0],
+        "sales_amount": [100.0, 50.0, np.nan], "profit_margin": [0.1, 0.3, 0.2],
+    }).to_sql("fact_sales", con, index=False)
+    pd.DataFrame({
+        "date_id": [20230101, 20230115, 20230201], "stock_qty": [0.0, 10.0, 5.0], "reorder_level": [2.0, 4.0, np.nan],
+        "unit_cost": [1.0, 3.0, 2.0], "total_value": [0.0, 30.0, 10.0],
+    }).to_sql("fact_inventory_snapshot", con, index=False)
+
+    feats = _period_features(con)
+    jan, feb = pd.Timestamp("2023-01-01"), pd.Timestamp("2023-02-01")
+    assert list(feats.index) == [jan, feb]
+    assert feats.loc[jan, "sales_amount_total"] == 150.0
+    assert feats.loc[feb, "sales_amount_total"] == 0.0
+    assert feats.loc[jan, "avg_discount"] == 10.0
+    assert feats.loc[jan, "inv_stockouts"] == 1
+    assert feats.loc[jan, "inv_reorder_gap_avg"] == 2.0
+    assert np.isnan(feats.loc[feb, "inv_reorder_gap_avg"])
+    assert feats.loc[jan, "perf_score_avg"] == 0.0
+
+
+def test_period_features_duckdb_matches_sqlite(tmp_path, monkeypatch):
+    duckdb = pytest.importorskip("duckdb")
+    monkeypatch.chdir(tmp_path)
+    sales = pd.DataFrame({"date_id": [20230105, 20230131, 20231201, 20240102], "quantity": [1.0, 2.0, 3.0, 4.0],
+                          "unit_price": 1.0, "discount_percent": 5.0, "sales_amount": [10.0, 20.0, 30.0, 40.0],
+                          "profit_margin": 0.1})
+    inv = pd.DataFrame({"date_id": [20230131, 20231215], "stock_qty": [0.0, 4.0], "reorder_level": [1.0, 1.0],
+                        "unit_cost": [1.0, 2.0], "total_value": [0.0, 8.0]})
+    lite = sqlite3.connect(":memory:")
+    duck = duckdb.connect(":memory:")
+    for name, df in [("fact_sales", sales), ("fact_inventory_snapshot", inv)]:
+        df.to_sql(name, lite, index=False)
+        duck.register("_df", df)
+        duck.execute(f"CREATE TABLE {name} AS SELECT * FROM _df")
+        duck.unregister("_df")
+
+    expected = _period_features(lite)
+    got = _period_features(duck)
+    assert list(got.index) == [pd.Timestamp("2023-01-01"), pd.Timestamp("2023-12-01"), pd.Timestamp("2024-01-01")]
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+
+def _warehouse(path, days=120, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2023-01-02", periods=days, freq="D")
+    date_id = (dates.year * 10000 + dates.month * 100 + dates.day).to_numpy()
+    con = sqlite3.connect(path)
+    pd.DataFrame({
+        "date_id": date_id, "quantity": rng.uniform(1, 5, days), "unit_price": 1.0,
+        "discount_percent": rng.uniform(0, 20, days), "sales_amount": rng.uniform(10, 100, days),
+        "profit_margin": rng.uniform(0, 1, days),
+    }).to_sql("fact_sales", con, index=False)
+    pd.DataFrame({
+        "date_id": date_id, "stock_qty": rng.uniform(0, 10, days), "reorder_level": rng.uniform(0, 5, days),
+        "unit_cost": rng.uniform(1, 3, days), "total_value": rng.uniform(0, 30, days),
+    }).to_sql("fact_inventory_snapshot", con, index=False)
+    con.close()
+
+
+def test_hr_features_match_float64_aggregation(tmp_path):
+    # Medidas enteras (se leen en float32) con sumas que float32 no representa exactamente
+    rng = np.random.default_rng(0)
+    n = 5000
+    hr = pd.DataFrame({
+        "review_date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 90, n), unit="D"),
+        "performance_score": rng.integers(1, 6, n).astype(float), "hours_worked": rng.integers(30, 60, n).astype(float),
+        "overtime_hours": rng.integers(0, 10, n).astype(float), "salary": rng.integers(50000, 150000, n).astype(float),
+        "bonus": rng.integers(0, 10000, n).astype(float),
+    })
+    hr.to_parquet(tmp_path / "stg_hr.parquet", index=False)
+
+    out = _hr_features(str(tmp_path), "M")
+    g = hr.groupby(hr["review_date"].dt.to_period("M").dt.to_timestamp())
+    assert list(out.index) == list(g.groups)
+    assert out.dtypes.eq("float64").all()
+    for col, src in [("perf_score_avg", "performance_score"), ("hours_worked_avg", "hours_worked"),
+                     ("salary_avg", "salary"), ("bonus_avg", "bonus")]:
+        assert np.array_equal(out[col].to_numpy(), g[src].mean().to_numpy()), col
+    ot = g["overtime_hours"].mean()
+    assert np.array_equal(out["overtime_ratio"].to_numpy(), (ot / (ot + 1e-9)).to_numpy())
+
+
+def test_weekly_features_roll_up_daily_averages(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    con = sqlite3.connect(":memory:")
+    # Lunes 2023-01-02 a domingo 2023-01-08 y lunes 2023-01-09
+    pd.DataFrame({"date_id": [20230102, 20230102, 20230108, 20230109], "quantity": 1.0, "unit_price": 1.0,
+                  "discount_percent": [10.0, 20.0, 60.0, 5.0], "sales_amount": 1.0, "profit_margin": 0.1,
+                  }).to_sql("fact_sales", con, index=False)
+
+    weekly = _period_features(con, frequency="W")
+    assert list(weekly.index) == [pd.Timestamp("2023-01-02"), pd.Timestamp("2023-01-09")]
+    assert weekly.index.name == "week"
+    # Media de las filas de la semana, no media de medias diarias
+    assert weekly["avg_discount"].tolist() == [30.0, 5.0]
+    assert weekly["sales_qty_total"].tolist() == [3.0, 1.0]
+    daily = _period_features(con, frequency="D")
+    assert len(daily) == 3
+    with pytest.raises(ValueError):
+        _period_features(con, frequency="Q")
+
+
+def test_rolling_window_pca(tmp_path):
+    _warehouse(tmp_path / "w.db")
+    res = run_pca(str(tmp_path / "w.db"), str(tmp_path / "out"), n_components=3, processed_dir=str(tmp_path),
+                  frequency="W", window=8)
+    windows = pd.read_csv(res["windows_path"])
+    assert res["n_windows"] == res["n_rows"] - 7
+    assert (windows["n_periods"] == 8).all()
+    assert Path(res["features_path"]).name == "features_weekly.csv"
+
+
+def test_incremental_pca_only_fits_new_closed_periods(tmp_path):
+    _warehouse(tmp_path / "w.db", days=60)
+    kw = {"n_components": 3, "processed_dir": str(tmp_path), "frequency": "W", "mode": "incremental"}
+    first = run_pca(str(tmp_path / "w.db"), str(tmp_path / "out"), **kw)
+    # El último periodo sigue abierto
+    assert first["periods_fitted"] == first["n_rows"] - 1
+
+    again = run_pca(str(tmp_path / "w.db"), str(tmp_path / "out"), **kw)
+    assert again["periods_added"] == 0
+
+    _warehouse(tmp_path / "w2.db", days=90)
+    grown = run_pca(str(tmp_path / "w2.db"), str(tmp_path / "out"), **kw)
+    assert grown["periods_added"] == grown["n_rows"] - 1 - first["periods_fitted"]
+    assert grown["periods_fitted"] == grown["n_rows"] - 1
+    state = joblib.load(grown["state_path"])
+    assert state["pca"].n_samples_seen_ == grown["periods_fitted"]
+
+    with pytest.raises(ValueError):
+        run_pca(str(tmp_path / "w.db"), str(tmp_path / "out"), window=4, **kw)
+
+
+def test_incremental_scaler_is_frozen_and_state_rebuilt_on_drift(tmp_path):
+    rng = np.random.default_rng(0)
+    idx = pd.period_range("2023-01", periods=30, freq="M")
+    feats = pd.DataFrame(rng.normal(size=(30, 4)), index=idx, columns=list("abcd"))
+    state_path = tmp_path / "state.joblib"
+
+    state, added, rebuilt = _partial_fit(feats.iloc[:11], 3, "M", state_path)
+    assert (added, rebuilt) == (10, False)
+    mean, scale = state["scaler"].mean_.copy(), state["scaler"].scale_.copy()
+
+    # Periodos nuevos de la misma distribución: el scaler no se mueve
+    state, added, rebuilt = _partial_fit(feats.iloc[:21], 3, "M", state_path)
+    assert (added, rebuilt) == (10, False)
+    assert np.array_equal(state["scaler"].mean_, mean) and np.array_equal(state["scaler"].scale_, scale)
+    assert state["pca"].n_samples_seen_ == 20
+
+    # Un salto de nivel en una feature rehace el estado con todos los periodos cerrados
+    shifted = feats.copy()
+    shifted.iloc[21:, 0] += 50
+    state, added, rebuilt = _partial_fit(shifted, 3, "M", state_path)
+    assert rebuilt and added == 29 and state["n_periods"] == 29
+    assert np.allclose(state["scaler"].mean_, shifted.iloc[:-1].mean().to_numpy())
+    assert joblib.load(state_path)["pca"].n_samples_seen_ == 29
+
+
+def test_feature_cube_by_store_and_category(tmp_path):
+    con = sqlite3.connect(":memory:")
+    pd.DataFrame({
+        "date_id": [20230105, 20230110, 20230105, 20230203], "product_key": [1, 1, 2, 0], "customer_key": 0,
+        "store_key": [1, 1, 2, 1], "quantity": [1.0, 2.0, 3.0, 4.0], "unit_price": 1.0,
+        "discount_percent": [10.0, 20.0, 5.0, 0.0], "sales_amount": [10.0, 20.0, 30.0, 40.0], "profit_margin": 0.1,
+    }).to_sql("fact_sales", con, index=False)
+    pd.DataFrame({"product_key": [0, 1, 2], "category_id": [None, 7, 8]}).to_sql("dim_product", con, index=False)
+    pd.DataFrame({
+        "date_id": [20230101, 20230101], "product_key": [1, 2], "warehouse_key": 1, "stock_qty": [0.0, 6.0],
+        "reorder_level": 1.0, "unit_cost": 1.0, "total_value": [0.0, 6.0],
+    }).to_sql("fact_inventory_snapshot", con, index=False)
+
+    cube = _feature_cube(con, ["store", "category"], processed_dir=str(tmp_path))
+    jan = pd.Timestamp("2023-01-01")
+    assert list(cube.columns[:3]) == ["store", "category", "month"]
+    row = cube[(cube["store"] == 1) & (cube["category"] == 7)].set_index("month").loc[jan]
+    assert row["sales_amount_total"] == 30.0
+    assert row["avg_discount"] == 15.0
+    # Inventario por categoría, unido a cada tienda
+    assert row["inv_stockouts"] == 1
+    # Producto desconocido -> categoría 0
+    assert cube[(cube["store"] == 1) & (cube["category"] == 0)]["sales_amount_total"].tolist() == [40.0]
+    with pytest.raises(ValueError):
+        _feature_cube(con, ["store", "warehouse"], processed_dir=str(tmp_path))
+
+
+def test_segment_pca_parallel_matches_serial():
+    rng = np.random.default_rng(0)
+    cube = pd.DataFrame({"store": np.repeat([1, 2, 3], 12), "month": np.tile(pd.date_range("2023-01-01", periods=12, freq="MS"), 3),
+                         "a": rng.normal(size=36), "b": rng.normal(size=36), "c": rng.normal(size=36)})
+    cube.loc[0, "a"] = np.nan
+    serial = _segment_pca(cube, ["store"], 2, workers=1)
+    parallel = _segment_pca(cube, ["store"], 2, workers=2)
+    pd.testing.assert_frame_equal(serial[0], parallel[0])
+    pd.testing.assert_frame_equal(serial[1], parallel[1])
+    assert serial[0]["store"].tolist() == [1, 2, 3]
+    assert (serial[0]["n_periods"] == 12).all()
+    assert len(serial[1]) == 3 * 3
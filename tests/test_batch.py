@@ -0,0 +1,93 @@
+import json
+
+import pandas as pd
+import pytest
+import yaml
+
+from pipeline.batch import resolve_configs, tenant_spec, run_batch, _run_tenant
+
+
+def _tenant(root, sales_ids):
+    raw = root / "data" / "raw"
+    raw.mkdir(parents=True)
+    pd.DataFrame({"Sale_ID": sales_ids, "Sale_Date": ["2023-01-01"] * len(sales_ids)}).to_excel(raw / "sales.xlsx", index=False)
+    pd.DataFrame({"Inventory_ID": [1], "Date": ["2023-01-01"]}).to_excel(raw / "inventory.xlsx", index=False)
+    pd.DataFrame({"Employee_ID": [7], "Review_Date": ["2023-01-01"]}).to_excel(raw / "hr.xlsx", index=False)
+    cfg = {
+        "sources": {"local_files": {k: f"data/raw/{k}.xlsx" for k in ["sales", "inventory", "hr"]}},
+        "columns": {
+            "sales": {"Sale_ID": "sale_id", "Sale_Date": "sale_date"},
+            "inventory": {"Inventory_ID": "inventory_id", "Date": "snapshot_date"},
+            "hr": {"Employee_ID": "employee_id", "Review_Date": "review_date"},
+        },
+        "ingest": {"workers": 1},
+    }
+    (root / "config.yml").write_text(yaml.safe_dump(cfg))
+    return root / "config.yml"
+
+
+def test_batch_runs_tenants_in_processes_and_isolates_failures(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _tenant(tmp_path / "tenants" / "north", [1, 2, 3])
+    _tenant(tmp_path / "tenants" / "south", [1])
+    broken = _tenant(tmp_path / "tenants" / "west", [1])
+    (broken.parent / "data" / "raw" / "sales.xlsx").unlink()
+
+    configs = resolve_configs(["tenants/*/config.yml"])
+    res = run_batch(configs, workers=2, stages=["ingest"], report_path="report/batch.json")
+
+    assert [r["tenant"] for r in res["results"]] == ["north", "south", "west"]
+    assert res["ok"] == 2 and res["failed"] == ["west"]
+    north, south, west = res["results"]
+    assert north["status"] == "ok" and north["ran"] == ["ingest"]
+    assert north["results"]["ingest"]["sales_rows"] == 3 and south["results"]["ingest"]["sales_rows"] == 1
+    assert "sales" in west["error"]
+
+    # Rutas relativas de cada config resueltas en la raíz del tenant
+    assert (tmp_path / "tenants" / "south" / "data" / "processed" / "stg_sales.parquet").exists()
+    assert (tmp_path / "tenants" / "north" / "report" / "run_log.json").exists()
+    assert json.loads((tmp_path / "report" / "batch.json").read_text())["failed"] == ["west"]
+
+    # Segunda pasada: el DAG de cada tenant ve sus etapas frescas
+    again = run_batch(configs[:2], workers=1, stages=["ingest"])
+    assert [(r["status"], r["ran"], r["fresh"]) for r in again["results"]] == [("ok", [], ["ingest"])] * 2
+
+
+def test_tenant_names_come_from_config_or_directory(tmp_path):
+    a = _tenant(tmp_path / "a", [1])
+    b = _tenant(tmp_path / "b", [1])
+    assert tenant_spec(a)["name"] == "a" and tenant_spec(a)["root"] == str(a.parent)
+
+    cfg = yaml.safe_load(b.read_text())
+    cfg["tenant"] = {"name": "a"}
+    b.write_text(yaml.safe_dump(cfg))
+    with pytest.raises(ValueError, match="Duplicate tenant names"):
+        run_batch([a, b])
+
+    assert resolve_configs([str(a), str(tmp_path / "*" / "config.yml")]) == [a.resolve(), b.resolve()]
+    with pytest.raises(FileNotFoundError):
+        resolve_configs([str(tmp_path / "missing" / "*.yml")])
+
+
+def test_inner_process_pools_are_capped_when_tenants_run_in_parallel(tmp_path, monkeypatch):
+    import os
+    import pipeline.ingest as ingest
+    monkeypatch.chdir(tmp_path)
+    configs = [_tenant(tmp_path / name, [1, 2]) for name in ["a", "b", "c"]]
+    for c in configs:
+        cfg = yaml.safe_load(c.read_text())
+        cfg["ingest"] = {"workers": 3}
+        c.write_text(yaml.safe_dump(cfg))
+
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+    res = run_batch(configs, workers=2, stages=["ingest"])
+    assert res["ok"] == 3 and res["inner_workers"] == 2
+    assert run_batch(configs, workers=1, stages=["ingest"], force=True)["inner_workers"] is None
+
+    # Con el tope a 1 la ingesta no abre su propio pool de procesos
+    def no_pool(*args, **kwargs):
+        raise AssertionError("nested process pool")
+    monkeypatch.setattr(ingest, "ProcessPoolExecutor", no_pool)
+    opts = {"stages": ["ingest"], "prefer_gdrive": False, "force": True, "n_components": 5,
+            "run_log": "report/run_log.json", "inner_workers": 1}
+    assert _run_tenant(tenant_spec(configs[0]), opts)["status"] == "ok"
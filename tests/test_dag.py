@@ -0,0 +1,108 @@
+import json
+from pathlib import Path
+
+import pytest
+import yaml
+
+from pipeline import dag
+from pipeline.utils import file_sha256
+from pipeline.warehouse import connect, create_table_sql, write_watermarks
+
+
+def _fake_warehouse(path, seed):
+    # Almacén real: los datos dependen de las entradas, los metadatos ETL cambian en cada carga
+    con = connect(path)
+    try:
+        con.execute("DROP TABLE IF EXISTS dim_store")
+        con.execute(create_table_sql("dim_store"))
+        con.execute("INSERT INTO dim_store VALUES (1, 1, ?, 'retail')", [seed])
+        write_watermarks(con, {"fact_sales": 20230101})
+        con.commit()
+    finally:
+        con.close()
+
+
+def _fake_stages(monkeypatch, calls):
+    def fake(name, outputs):
+        def run(ctx):
+            calls.append(name)
+            for p in outputs(ctx):
+                Path(p).parent.mkdir(parents=True, exist_ok=True)
+                # El contenido depende de las entradas para que los cambios se propaguen
+                seed = "".join(Path(i).read_text(errors="replace") for i in dag.STAGES[name]["io"](ctx)["inputs"]
+                               if Path(i).exists())
+                if p == ctx["warehouse_path"]:
+                    _fake_warehouse(p, seed)
+                    continue
+                Path(p).write_text(f"{name}:{seed}:{ctx['n_components'] if name == 'analytics' else ''}")
+            return {f"{name}_rows": 1}
+        return run
+    for name, spec in dag.STAGES.items():
+        monkeypatch.setitem(spec, "run", fake(name, lambda ctx, spec=spec: spec["io"](ctx)["outputs"]))
+
+
+def _setup(tmp_path):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    for k in ["sales", "inventory", "hr"]:
+        (raw / f"{k}.xlsx").write_text(k)
+    cfg = {"sources": {"local_files": {k: str(raw / f"{k}.xlsx") for k in ["sales", "inventory", "hr"]}},
+           "columns": {}, "rfm": {"quantiles": [0.5]}, "pca": {}}
+    (tmp_path / "config.yml").write_text(yaml.safe_dump(cfg))
+    return cfg
+
+
+def _run(tmp_path, **kwargs):
+    return dag.run_dag(processed_dir=str(tmp_path / "processed"), config_path=str(tmp_path / "config.yml"),
+                       warehouse_path=str(tmp_path / "wh.db"), out_dir=str(tmp_path / "report"),
+                       prefer_gdrive=False, **kwargs)
+
+
+def test_run_dag_skips_fresh_stages(tmp_path, monkeypatch):
+    calls = []
+    _fake_stages(monkeypatch, calls)
+    cfg = _setup(tmp_path)
+
+    first = _run(tmp_path)
+    assert first["ran"] == ["ingest", "validate", "model", "analytics"] and calls == first["ran"]
+    assert first["results"]["model"] == {"model_rows": 1}
+
+    calls.clear()
+    second = _run(tmp_path)
+    assert calls == [] and second["fresh"] == ["ingest", "validate", "model", "analytics"]
+    assert second["results"]["model"] == {"model_rows": 1}
+
+    # Solo cambia un parámetro de analytics
+    assert _run(tmp_path, n_components=3)["ran"] == ["analytics"]
+
+    # Cambio en la sección rfm: model se repite; el almacén sale idéntico, así que analytics sigue fresco
+    cfg["rfm"] = {"quantiles": [0.25, 0.75]}
+    (tmp_path / "config.yml").write_text(yaml.safe_dump(cfg))
+    before = file_sha256(tmp_path / "wh.db")
+    assert _run(tmp_path, n_components=3)["ran"] == ["model"]
+    # Los bytes del fichero cambian (versión de carga, hora), el contenido de las tablas no
+    assert file_sha256(tmp_path / "wh.db") != before
+
+    # Nuevas reglas de validación: solo se repite validate
+    cfg["validation"] = {"rules": {"sales": {"unique": ["sale_id"]}}}
+    (tmp_path / "config.yml").write_text(yaml.safe_dump(cfg))
+    assert _run(tmp_path, n_components=3)["ran"] == ["validate"]
+
+    # Un fuente modificado se propaga por contenido; una salida borrada fuerza su etapa
+    (tmp_path / "raw" / "hr.xlsx").write_text("hr v2")
+    assert _run(tmp_path, n_components=3)["ran"] == ["ingest", "validate", "model", "analytics"]
+    (tmp_path / "report" / "pca_loadings.csv").unlink()
+    assert _run(tmp_path, n_components=3)["ran"] == ["analytics"]
+    assert _run(tmp_path, n_components=3, force=True)["ran"] == ["ingest", "validate", "model", "analytics"]
+
+    state = json.loads((tmp_path / "processed" / dag.STATE_NAME).read_text())
+    assert set(state["stages"]) == {"ingest", "validate", "model", "analytics"}
+
+
+def test_run_dag_targets_include_dependencies(tmp_path, monkeypatch):
+    calls = []
+    _fake_stages(monkeypatch, calls)
+    _setup(tmp_path)
+    assert _run(tmp_path, targets=["model"])["ran"] == ["ingest", "validate", "model"]
+    with pytest.raises(ValueError):
+        _run(tmp_path, targets=["report"])
@@ -0,0 +1,104 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from pipeline.fetch import fetch_folder
+
+BIG = bytes(range(256)) * 12000  # ~3 MB: varios bloques de lectura
+
+
+@pytest.fixture
+def drive():
+    """
+    Local stand-in for Drive downloads: ETag = content hash, Range requests answered with 206.
+    """
+    state = {"files": {"a": BIG, "b": b"hr v1"}, "gets": [], "cut": set()}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _file(self):
+            fid = parse_qs(urlparse(self.path).query)["id"][0]
+            if fid not in state["files"]:
+                self.send_error(404)
+                return None, None
+            return fid, state["files"][fid]
+
+        def _headers(self, status, body_len, data):
+            self.send_response(status)
+            self.send_header("ETag", f'"{hashlib.md5(data).hexdigest()}"')
+            self.send_header("Content-Length", str(body_len))
+            self.end_headers()
+
+        def do_HEAD(self):
+            fid, data = self._file()
+            if data is not None:
+                self._headers(200, len(data), data)
+
+        def do_GET(self):
+            fid, data = self._file()
+            if data is None:
+                return
+            rng = self.headers.get("Range")
+            state["gets"].append((fid, rng))
+            start = int(rng.split("=")[1].rstrip("-")) if rng else 0
+            body = data[start:]
+            self._headers(206 if rng else 200, len(body), data)
+            # Corte de conexión a mitad de la primera descarga
+            if fid in state["cut"]:
+                state["cut"].discard(fid)
+                self.wfile.write(body[: len(body) // 2])
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state["url"] = f"http://127.0.0.1:{server.server_port}/download?id={{id}}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def _fetch(drive, tmp_path, files=None):
+    files = files or [{"id": "a", "name": "sales.xlsx"}, {"id": "b", "name": "sub/hr.xlsx"}]
+    return fetch_folder(files, tmp_path / "raw", tmp_path / "cache", url_template=drive["url"], workers=2, retries=1)
+
+
+def test_fetch_downloads_only_changed_files(drive, tmp_path):
+    res = _fetch(drive, tmp_path)
+    assert sorted(res["downloaded"]) == ["sales.xlsx", "sub/hr.xlsx"] and not res["failed"]
+    assert (tmp_path / "raw" / "sales.xlsx").read_bytes() == BIG
+    assert (tmp_path / "cache" / "a" / hashlib.sha256(BIG).hexdigest()).is_file()
+
+    drive["gets"].clear()
+    res = _fetch(drive, tmp_path)
+    assert sorted(res["cached"]) == ["sales.xlsx", "sub/hr.xlsx"] and res["promoted"] == [] and drive["gets"] == []
+
+    # Solo cambia un fichero; un raw modificado localmente se restaura desde la caché sin descargar
+    drive["files"]["b"] = b"hr v2"
+    (tmp_path / "raw" / "sales.xlsx").write_bytes(b"edited")
+    res = _fetch(drive, tmp_path)
+    assert res["downloaded"] == ["sub/hr.xlsx"] and [f for f, _ in drive["gets"]] == ["b"]
+    assert sorted(res["promoted"]) == ["sales.xlsx", "sub/hr.xlsx"]
+    assert (tmp_path / "raw" / "sales.xlsx").read_bytes() == BIG
+    assert (tmp_path / "raw" / "sub" / "hr.xlsx").read_bytes() == b"hr v2"
+
+
+def test_fetch_resumes_interrupted_download(drive, tmp_path):
+    drive["cut"].add("a")
+    res = _fetch(drive, tmp_path, [{"id": "a", "name": "sales.xlsx"}])
+    assert res["downloaded"] == ["sales.xlsx"]
+    assert (tmp_path / "raw" / "sales.xlsx").read_bytes() == BIG
+    (first, _), (second, rng) = drive["gets"]
+    assert second == "a" and rng is not None and rng != "bytes=0-"
+
+
+def test_fetch_reports_failures(drive, tmp_path):
+    res = _fetch(drive, tmp_path, [{"id": "missing", "name": "inventory.xlsx"}, {"id": "b", "name": "hr.xlsx"}])
+    assert list(res["failed"]) == ["inventory.xlsx"] and res["downloaded"] == ["hr.xlsx"]
+    assert not (tmp_path / "raw" / "inventory.xlsx").exists()
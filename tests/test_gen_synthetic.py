@@ -0,0 +1,20 @@
+import json
+from pathlib import Path
+
+from pipeline.dag import run_dag
+from scripts.gen_synthetic import generate
+
+CONFIG = Path(__file__).resolve().parents[1] / "config" / "config.yml"
+
+
+def test_generated_data_passes_validation_and_runs_the_dag(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    gen = generate(tmp_path / "synthetic", rows=2000, formats=("xlsx",), null_rate=0.05,
+                   config_path=CONFIG)
+
+    res = run_dag(config_path=gen["config_path"], prefer_gdrive=False, n_components=3)
+    assert res["ran"] == ["ingest", "validate", "model", "analytics"]
+    report = json.loads((tmp_path / "report" / "data_quality.json").read_text())
+    failed = [r for r in report["results"] if not r["ok"] and r["severity"] == "error"]
+    assert failed == []
+    assert res["results"]["model"]["fact_sales_rows"] > 0
@@ -0,0 +1,229 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import yaml
+
+from pipeline.ingest import run, read_staging, staging_frame, read_staging_frame
+
+
+def _write_sources(tmp_path):
+    raw = tmp_path / "data" / "raw"
+    raw.mkdir(parents=True)
+    pd.DataFrame({"Sale_ID": [1, 2, 2], "Sale_Date": ["2023-01-01", "2023-01-02", "2023-01-02"],
+                  "Sales_Amount": ["1.234,5", "10", "10"]}).to_excel(raw / "sales.xlsx", index=False)
+    pd.DataFrame({"Inventory_ID": [1], "Date": ["2023-01-01"], "Product_Code": ["PRD_0001"],
+                  "Stock_Quantity": [5]}).to_excel(raw / "inventory.xlsx", index=False)
+    pd.DataFrame({"Employee_ID": [7], "Review_Date": ["2023-01-01"], "Salary": ["1.000"]}).to_excel(raw / "hr.xlsx", index=False)
+    cfg = {
+        "sources": {"local_files": {k: f"data/raw/{k}.xlsx" for k in ["sales", "inventory", "hr"]}},
+        "columns": {
+            "sales": {"Sale_ID": "sale_id", "Sale_Date": "sale_date", "Sales_Amount": "sales_amount"},
+            "inventory": {"Inventory_ID": "inventory_id", "Date": "snapshot_date", "Product_Code": "product_code",
+                          "Stock_Quantity": "stock_qty"},
+            "hr": {"Employee_ID": "employee_id", "Review_Date": "review_date", "Salary": "salary"},
+        },
+    }
+    (tmp_path / "config.yml").write_text(yaml.safe_dump(cfg))
+    return raw
+
+
+def test_ingest_skips_unchanged_sources(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    raw = _write_sources(tmp_path)
+
+    first = run(output_dir="data/processed", config_path="config.yml", prefer_gdrive=False)
+    assert first["skipped"] == []
+    assert first["sales_rows"] == 2
+    sales = pd.read_parquet("data/processed/stg_sales.parquet")
+    assert sales["sales_amount"].tolist() == [1234.5, 10.0]
+
+    second = run(output_dir="data/processed", config_path="config.yml", prefer_gdrive=False)
+    assert second["skipped"] == ["sales", "inventory", "hr"]
+    assert second["sales_rows"] == 2
+
+    pd.DataFrame({"Employee_ID": [7, 8], "Review_Date": ["2023-01-01", "2023-02-01"],
+                  "Salary": [1, 2]}).to_excel(raw / "hr.xlsx", index=False)
+    third = run(output_dir="data/processed", config_path="config.yml", prefer_gdrive=False)
+    assert third["skipped"] == ["sales", "inventory"]
+    assert third["hr_rows"] == 2
+
+
+def test_ingest_chunked_parallel_matches_single_pass(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_sources(tmp_path)
+    cfg = yaml.safe_load((tmp_path / "config.yml").read_text())
+    cfg["ingest"] = {"workers": 3, "chunk_rows": 1}
+    (tmp_path / "config.yml").write_text(yaml.safe_dump(cfg))
+
+    res = run(output_dir="data/processed", config_path="config.yml", prefer_gdrive=False)
+    # El duplicado cae en otro bloque y también se elimina
+    assert res["sales_rows"] == 2
+    sales = pd.read_parquet("data/processed/stg_sales.parquet")
+    assert sales["sale_id"].tolist() == [1, 2]
+    assert str(sales["sale_date"].dtype) == "datetime64[ns]"
+    inv = pd.read_parquet("data/processed/stg_inventory.parquet")
+    assert inv["product_code"].tolist() == ["PRD_0001"]
+
+
+@pytest.mark.parametrize("collide", [False, True])
+def test_cross_chunk_dedupe_confirms_hash_matches(tmp_path, monkeypatch, collide):
+    monkeypatch.chdir(tmp_path)
+    raw = _write_sources(tmp_path)
+    rng = np.random.default_rng(0)
+    sales = pd.DataFrame({"Sale_ID": rng.integers(1, 15, 60), "Sale_Date": "2023-01-01",
+                          "Sales_Amount": rng.integers(1, 3, 60).astype(str)})
+    sales.to_excel(raw / "sales.xlsx", index=False)
+    cfg = yaml.safe_load((tmp_path / "config.yml").read_text())
+    cfg["ingest"] = {"workers": 1, "chunk_rows": 7}
+    (tmp_path / "config.yml").write_text(yaml.safe_dump(cfg))
+    if collide:
+        # Hash de 2 bits: casi todas las filas coinciden con otra distinta
+        real = pd.util.hash_pandas_object
+        monkeypatch.setattr(pd.util, "hash_pandas_object", lambda df, index=False: real(df, index=index) % 4)
+
+    res = run(output_dir="data/processed", config_path="config.yml", prefer_gdrive=False, return_tables=True)
+    staged = pd.read_parquet("data/processed/stg_sales.parquet")
+    pairs = list(zip(staged["sale_id"], staged["sales_amount"]))
+    expected = list(dict.fromkeys(zip(sales["Sale_ID"], sales["Sales_Amount"].astype(float))))
+    # Ninguna fila distinta se pierde por una colisión
+    assert set(pairs) == set(expected)
+    if not collide:
+        assert pairs == expected
+    assert res["sales_rows"] == len(staged)
+    assert res["tables"]["sales"].equals(read_staging("data/processed", "sales"))
+
+
+def test_staging_is_arrow_typed_and_handed_over_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_sources(tmp_path)
+
+    res = run(output_dir="data/processed", config_path="config.yml", prefer_gdrive=False, return_tables=True)
+    inv = res["tables"]["inventory"]
+    assert inv.schema.field("inventory_id").type == pa.int64()
+    assert inv.schema.field("snapshot_date").type == pa.timestamp("ns")
+    assert inv.schema.field("stock_qty").type == pa.float64()
+    assert pa.types.is_dictionary(inv.schema.field("product_code").type)
+    assert inv.equals(read_staging("data/processed", "inventory"))
+
+    # Proyección: solo las columnas pedidas que existen
+    hr = read_staging("data/processed", "hr", ["employee_id", "salary", "bonus"])
+    assert hr.column_names == ["employee_id", "salary"]
+    assert staging_frame(read_staging("data/processed", "inventory"))["product_code"].tolist() == ["PRD_0001"]
+
+    # Dominios sin cambios se leen del disco
+    again = run(output_dir="data/processed", config_path="config.yml", prefer_gdrive=False, return_tables=True)
+    assert again["skipped"] == ["sales", "inventory", "hr"]
+    assert again["tables"]["sales"].num_rows == 2
+
+
+def test_unmapped_source_columns_are_kept_as_text(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    raw = _write_sources(tmp_path)
+    pd.DataFrame({"Sale_ID": [1, 2, 3], "Sale_Date": "2023-01-01", "Sales_Amount": ["10", "10", "10"],
+                  "Channel": ["web", "store", None]}).to_excel(raw / "sales.xlsx", index=False)
+
+    res = run(output_dir="data/processed", config_path="config.yml", prefer_gdrive=False, return_tables=True)
+    sales = res["tables"]["sales"]
+    assert sales.column_names[-1] == "Channel" and len(sales.column_names) == 4
+    assert pa.types.is_dictionary(sales.schema.field("Channel").type)
+    assert sales.column("Channel").to_pylist() == ["web", "store", None]
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_handoff_tables_are_not_sent_back_from_workers(tmp_path, monkeypatch, workers):
+    import pipeline.ingest as ingest
+    monkeypatch.chdir(tmp_path)
+    _write_sources(tmp_path)
+    cfg = yaml.safe_load((tmp_path / "config.yml").read_text())
+    cfg["ingest"] = {"workers": workers}
+    (tmp_path / "config.yml").write_text(yaml.safe_dump(cfg))
+
+    real = ingest._ingest_domain
+    def spy(name, path, mapping, staging, chunk_rows=50000, keep_table=False):
+        # En un worker (fork) un fallo aquí llega al padre a través del future
+        assert keep_table == (workers == 1)
+        return real(name, path, mapping, staging, chunk_rows, keep_table)
+    monkeypatch.setattr(ingest, "_ingest_domain", spy)
+
+    res = run(output_dir="data/processed", config_path="config.yml", prefer_gdrive=False, return_tables=True)
+    for name in ["sales", "inventory", "hr"]:
+        assert res["tables"][name].equals(read_staging("data/processed", name))
+
+
+def test_read_staging_has_no_csv_fallback(tmp_path):
+    pd.DataFrame({"sale_id": [1]}).to_csv(tmp_path / "stg_sales.csv", index=False)
+    with pytest.raises(FileNotFoundError):
+        read_staging(tmp_path, "sales")
+
+
+def _write_sales_staging(path, n):
+    rng = np.random.default_rng(0)
+    customers = pa.array(rng.integers(1, 50000, n), mask=rng.random(n) < 0.01)
+    dates = pd.Timestamp("2023-01-01").value + rng.integers(0, 730, n) * 86400 * 10**9
+    table = pa.table({
+        "sale_id": pa.array(np.arange(1, n + 1)),
+        "sale_date": pa.array(dates, pa.timestamp("ns")),
+        "product_id": pa.array(rng.integers(1, 1000, n)),
+        "customer_id": customers,
+        "store_id": pa.array(rng.integers(1, 20, n)),
+        "quantity": pa.array(rng.integers(1, 10, n).astype(float)),
+        "unit_price": pa.array(rng.random(n) * 100),
+    })
+    pq.write_table(table, path / "stg_sales.parquet", row_group_size=max(n // 8, 1))
+
+
+def test_read_staging_frame_is_compact_and_matches_plain_frame(tmp_path):
+    _write_sales_staging(tmp_path, 5000)
+    inv = pd.DataFrame({"inventory_id": [1, 2, 3], "product_code": ["PRD_0001", "PRD_0002", "PRD_0001"],
+                        "stock_qty": [1.5, 2.0, None]})
+    pq.write_table(pa.Table.from_pandas(inv, preserve_index=False), tmp_path / "stg_inventory.parquet")
+
+    df = read_staging_frame(tmp_path, "sales")
+    assert df.dtypes.astype(str).to_dict() == {
+        "sale_id": "int16", "sale_date": "datetime64[ns]", "product_id": "int16", "customer_id": "Int32",
+        "store_id": "int8", "quantity": "float32", "unit_price": "float64",
+    }
+    plain = staging_frame(read_staging(tmp_path, "sales"))
+    pd.testing.assert_frame_equal(df, plain, check_dtype=False)
+    assert df.memory_usage(deep=True).sum() < plain.memory_usage(deep=True).sum()
+
+    inv = read_staging_frame(tmp_path, "inventory", ["product_code", "stock_qty"])
+    assert isinstance(inv["product_code"].dtype, pd.CategoricalDtype)
+    assert inv["product_code"].tolist() == ["PRD_0001", "PRD_0002", "PRD_0001"]
+    # En memoria (tabla de ingest) el resultado es el mismo que leyendo del disco
+    pd.testing.assert_frame_equal(staging_frame(read_staging(tmp_path, "inventory", ["product_code", "stock_qty"]), "inventory"), inv)
+
+
+# VmHWM (pico de RSS del proceso) se reinicia con exec, a diferencia de ru_maxrss que hereda el del padre
+_PEAK = """import sys
+from pipeline.ingest import read_staging, staging_frame, read_staging_frame
+if sys.argv[2] == "compact":
+    df = read_staging_frame(sys.argv[1], "sales")
+elif sys.argv[2] == "plain":
+    df = staging_frame(read_staging(sys.argv[1], "sales"))
+print([l.split()[1] for l in open("/proc/self/status") if l.startswith("VmHWM")][0])
+"""
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="needs /proc/self/status (Linux)")
+def test_read_staging_frame_peak_memory_is_under_half(tmp_path):
+    # Regresión de memoria: pico de RSS de la lectura compacta frente a la lectura Arrow -> pandas,
+    # cada una en un proceso nuevo y descontando el pico de un proceso que solo importa
+    _write_sales_staging(tmp_path, 1_000_000)
+    root = str(Path(__file__).resolve().parents[1])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    peak = {}
+    for mode in ("imports", "plain", "compact"):
+        out = subprocess.run([sys.executable, "-c", _PEAK, str(tmp_path), mode], env=env, capture_output=True,
+                             text=True, check=True)
+        peak[mode] = float(out.stdout.strip().splitlines()[-1])
+    plain, compact = peak["plain"] - peak["imports"], peak["compact"] - peak["imports"]
+    assert plain > 20 * 1024  # kB
+    assert compact < 0.5 * plain
@@ -0,0 +1,69 @@
+import json
+
+import pandas as pd
+
+from pipeline.instrument import run_log, step, timed, iterate, merge, records, summary, write_run_log
+
+
+@timed("double")
+def _double(df):
+    return pd.concat([df, df])
+
+
+def test_steps_are_nested_and_accumulated(tmp_path):
+    df = pd.DataFrame({"a": range(5)})
+    with run_log() as log:
+        with step("stage") as st:
+            for chunk in iterate("read", [df, df]):
+                _double(chunk)
+            st["rows_out"] = 20
+        merge([{"step": "worker", "calls": 1, "wall_s": 0.5, "cpu_s": 0.5, "rss_delta_mb": None, "max_rss_mb": None,
+                "rows_in": None, "rows_out": 3}], prefix="stage")
+
+    steps = {r["step"]: r for r in records(log)}
+    assert list(steps) == ["stage", "stage/read", "stage/double", "stage/worker"]
+    assert steps["stage"]["rows_out"] == 20
+    # La llamada final que agota el iterador no cuenta
+    assert steps["stage/read"]["calls"] == 2 and steps["stage/read"]["rows_out"] == 10
+    assert steps["stage/double"]["calls"] == 2
+    assert steps["stage/double"]["rows_in"] == 10 and steps["stage/double"]["rows_out"] == 20
+    assert steps["stage/worker"]["rows_out"] == 3
+    assert steps["stage"]["wall_s"] >= steps["stage/double"]["wall_s"]
+    assert list(summary(log)["step"]) == list(steps)
+
+    path = write_run_log(log, tmp_path / "run_log.json", commit="abc")
+    payload = json.loads(path.read_text(encoding="utf-8"))
+    assert payload["commit"] == "abc" and len(payload["steps"]) == 4
+
+
+def test_steps_without_run_log_are_noops():
+    df = pd.DataFrame({"a": [1]})
+    with step("outside") as st:
+        st["rows_out"] = 1
+    assert len(_double(df)) == 2
+    assert list(iterate("read", [1, 2])) == [1, 2]
+
+
+def test_profile_dumps_top_level_steps(tmp_path):
+    with run_log(profile_dir=tmp_path / "profiles") as log:
+        with step("stage"):
+            with step("inner"):
+                sum(range(1000))
+    assert list(log["profiles"]) == ["stage"]
+    assert (tmp_path / "profiles" / "stage.prof").exists()
+
+
+def test_memory_is_reported_per_step():
+    import numpy as np
+    with run_log() as log:
+        with step("small"):
+            pass
+        with step("alloc"):
+            keep = np.ones(64 << 20, dtype=np.uint8)
+    steps = {r["step"]: r for r in records(log)}
+    if steps["alloc"]["rss_delta_mb"] is None:  # sin /proc
+        return
+    # El delta es del paso, no el pico acumulado del proceso
+    assert steps["alloc"]["rss_delta_mb"] >= 60 > abs(steps["small"]["rss_delta_mb"])
+    assert steps["alloc"]["max_rss_mb"] >= steps["small"]["max_rss_mb"]
+    del keep
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from pipeline.keys import new_registry, resolve, registry_delta
+
+
+def test_resolve_assigns_only_unseen_keys():
+    reg = new_registry()
+    keys = resolve(reg, "product_id", pd.Series([3, 5, 3, None, 0]))
+    assert keys.tolist() == [3, 5, 3, 0, 0]
+    assert sorted(registry_delta(reg)["natural_key"]) == ["3", "5"]
+
+    # Una segunda carga reutiliza el registro persistido: solo el 7 es nuevo
+    reg = new_registry(registry_delta(reg))
+    keys = resolve(reg, "product_id", pd.Series([5, 7, 3]))
+    assert keys.tolist() == [5, 7, 3]
+    assert registry_delta(reg)["natural_key"].tolist() == ["7"]
+
+
+def test_taken_or_negative_ids_get_new_keys():
+    rows = pd.DataFrame({"entity": ["store_id"], "natural_key": ["9"], "surrogate_key": [4]})
+    reg = new_registry(rows)
+    keys = resolve(reg, "store_id", pd.Series([4, -2, 9]))
+    assert keys[2] == 4
+    assert keys[0] not in (0, 4) and keys[1] not in (0, 4, keys[0])
+
+
+def test_product_codes_resolve_through_product_id():
+    reg = new_registry()
+    ids = resolve(reg, "product_id", pd.Series([12]))
+    codes = resolve(reg, "product_code", pd.Series(["PRD_0012", "PRD_0030", "BAD", np.nan]))
+    assert codes.tolist() == [ids[0], 30, 0, 0]
+    assert resolve(reg, "product_id", pd.Series([30])).tolist() == [30]
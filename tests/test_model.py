@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.ingest import read_staging
+from pipeline.model import build_star
+from pipeline.warehouse import connect, read_frame
+
+
+def _staging(n_sales=300, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 120, n_sales), unit="D")
+    sales = pd.DataFrame({
+        "sale_id": np.arange(1, n_sales + 1), "sale_date": dates,
+        "product_id": rng.integers(1, 20, n_sales), "customer_id": rng.integers(1, 40, n_sales),
+        "store_id": rng.integers(1, 5, n_sales), "quantity": rng.integers(1, 5, n_sales).astype(float),
+        "unit_price": rng.uniform(1, 100, n_sales), "discount_percent": rng.uniform(0, 20, n_sales),
+        "sales_amount": rng.uniform(10, 500, n_sales), "profit_margin": rng.uniform(5, 40, n_sales),
+    }).sort_values("sale_date", ignore_index=True)
+    inv = pd.DataFrame({
+        "inventory_id": np.arange(1, 61), "snapshot_date": pd.date_range("2023-01-01", periods=60, freq="2D"),
+        "warehouse_id": rng.integers(1, 4, 60), "category_id": rng.integers(1, 6, 60),
+        "product_code": [f"PRD_{i:04d}" for i in rng.integers(1, 25, 60)], "stock_qty": rng.uniform(0, 50, 60),
+        "reorder_level": rng.uniform(0, 50, 60), "unit_cost": rng.uniform(1, 10, 60), "total_value": rng.uniform(0, 500, 60),
+    })
+    hr = pd.DataFrame({
+        "record_id": np.arange(1, 21), "employee_id": rng.integers(100, 110, 20),
+        "review_date": pd.date_range("2023-01-01", periods=20, freq="7D"), "department_id": rng.integers(1, 4, 20),
+        "performance_score": rng.uniform(1, 5, 20), "hours_worked": rng.uniform(30, 50, 20),
+        "overtime_hours": rng.uniform(0, 5, 20), "salary": rng.uniform(1000, 2000, 20), "bonus": rng.uniform(0, 100, 20),
+    })
+    return sales, inv, hr
+
+
+def _write(d, sales, inv, hr):
+    d.mkdir(exist_ok=True)
+    sales.to_parquet(d / "stg_sales.parquet", index=False)
+    inv.to_parquet(d / "stg_inventory.parquet", index=False)
+    hr.to_parquet(d / "stg_hr.parquet", index=False)
+
+
+def _table(db, name, key, backend="sqlite"):
+    con = connect(db, backend)
+    try:
+        return read_frame(con, f"SELECT * FROM {name} ORDER BY {key}")
+    finally:
+        con.close()
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "duckdb"])
+def test_incremental_build_matches_full_rebuild(tmp_path, backend):
+    if backend == "duckdb":
+        pytest.importorskip("duckdb")
+    sales, inv, hr = _staging()
+    cut = pd.Timestamp("2023-03-01")
+
+    full_db = str(tmp_path / "full.db")
+    _write(tmp_path / "all", sales, inv, hr)
+    build_star(str(tmp_path / "all"), full_db, backend=backend)
+
+    inc_db = str(tmp_path / "inc.db")
+    _write(tmp_path / "first", sales[sales["sale_date"] < cut], inv[inv["snapshot_date"] < cut], hr)
+    build_star(str(tmp_path / "first"), inc_db, backend=backend)
+    res = build_star(str(tmp_path / "all"), inc_db, incremental=True, backend=backend)
+
+    assert res["fact_sales_upserted"] < len(sales)
+    for name, key in [("fact_sales", "sale_id"), ("fact_inventory_snapshot", "inventory_id"), ("dim_date", "date_id"),
+                      ("dim_customer", "customer_key"), ("dim_product", "product_key"), ("dim_store", "store_key")]:
+        pd.testing.assert_frame_equal(_table(full_db, name, key, backend), _table(inc_db, name, key, backend), check_dtype=False)
+
+
+def test_build_star_from_in_memory_staging_matches_disk(tmp_path):
+    sales, inv, hr = _staging()
+    _write(tmp_path / "stg", sales, inv, hr)
+    build_star(str(tmp_path / "stg"), str(tmp_path / "disk.db"))
+
+    tables = {name: read_staging(tmp_path / "stg", name) for name in ["sales", "inventory", "hr"]}
+    build_star(str(tmp_path / "missing"), str(tmp_path / "mem.db"), staging=tables)
+    for name, key in [("fact_sales", "sale_id"), ("dim_customer", "customer_key"), ("dim_employee", "employee_key")]:
+        pd.testing.assert_frame_equal(_table(str(tmp_path / "disk.db"), name, key),
+                                      _table(str(tmp_path / "mem.db"), name, key))
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "duckdb"])
+def test_streaming_build_matches_in_memory(tmp_path, backend):
+    if backend == "duckdb":
+        pytest.importorskip("duckdb")
+    sales, inv, hr = _staging()
+    _write(tmp_path / "stg", sales, inv, hr)
+
+    full = build_star(str(tmp_path / "stg"), str(tmp_path / "full.db"), backend=backend)
+    res = build_star(str(tmp_path / "stg"), str(tmp_path / "stream.db"), backend=backend, streaming=True, chunk_rows=37)
+    assert res["fact_sales_rows"] == full["fact_sales_rows"] == len(sales)
+    for name, key in [("fact_sales", "sale_id"), ("fact_inventory_snapshot", "inventory_id"), ("dim_date", "date_id"),
+                      ("dim_customer", "customer_key"), ("dim_product", "product_key"), ("dim_store", "store_key"),
+                      ("dim_employee", "employee_key"), ("etl_watermark", "table_name")]:
+        a, b = _table(str(tmp_path / "full.db"), name, key, backend), _table(str(tmp_path / "stream.db"), name, key, backend)
+        pd.testing.assert_frame_equal(a.drop(columns="loaded_at", errors="ignore"), b.drop(columns="loaded_at", errors="ignore"))
+
+
+def test_surrogate_keys_stable_across_rebuilds(tmp_path):
+    sales, inv, hr = _staging()
+    db = str(tmp_path / "wh.db")
+    _write(tmp_path / "a", sales, inv, hr)
+    build_star(str(tmp_path / "a"), db)
+    first = _table(db, "dim_product", "product_key")
+    registry = _table(db, "key_registry", "entity, natural_key")
+
+    # Recarga completa con un producto nuevo: las claves existentes no cambian y solo se registra el nuevo
+    extra = sales.tail(1).assign(sale_id=len(sales) + 1, product_id=999)
+    _write(tmp_path / "b", pd.concat([sales, extra], ignore_index=True), inv, hr)
+    build_star(str(tmp_path / "b"), db)
+    second = _table(db, "dim_product", "product_key")
+    pd.testing.assert_frame_equal(second[second["product_id"] != 999].reset_index(drop=True), first)
+    added = _table(db, "key_registry", "entity, natural_key").merge(registry, how="left", indicator=True)
+    assert added.loc[added["_merge"] == "left_only", "natural_key"].tolist() == ["999"]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_dim_date_covers_all_fact_dates_and_bad_keys_are_left_out(tmp_path, streaming):
+    sales, inv, hr = _staging()
+    # Inventario con fechas posteriores a la última venta
+    inv = inv.assign(snapshot_date=inv["snapshot_date"] + pd.Timedelta(days=200))
+    _write(tmp_path / "stg", sales, inv, hr)
+    db = str(tmp_path / "wh.db")
+    build_star(str(tmp_path / "stg"), db, streaming=streaming, chunk_rows=50)
+
+    con = connect(db)
+    try:
+        assert [r for r in con.execute("PRAGMA foreign_key_check").fetchall() if r[2] == "dim_date"] == []
+        orphans = con.execute("SELECT COUNT(*) FROM fact_inventory_snapshot f LEFT JOIN dim_date d "
+                              "ON d.date_id = f.date_id WHERE d.date_id IS NULL").fetchone()[0]
+    finally:
+        con.close()
+    assert orphans == 0
+
+    # Un sale_id nulo no se convierte en un rowid inventado y un sale_id repetido no aborta la carga:
+    # las filas se dejan fuera (gana la primera de cada clave) y se informan
+    bad = sales.astype({"sale_id": "Int64"})
+    bad.loc[3, "sale_id"] = pd.NA
+    bad.loc[60, "sale_id"] = bad.loc[9, "sale_id"]  # en otro bloque del build por bloques
+    _write(tmp_path / "bad", bad, inv, hr)
+    res = build_star(str(tmp_path / "bad"), str(tmp_path / "bad.db"), streaming=streaming, chunk_rows=50)
+    assert res["rejected"] == {"fact_sales": {"null_key": 1, "duplicate_key": 1}}
+    assert res["fact_sales_rows"] == len(sales) - 2
+    loaded = _table(str(tmp_path / "bad.db"), "fact_sales", "sale_id")
+    assert loaded["sale_id"].tolist() == sorted(bad["sale_id"].dropna().drop_duplicates().tolist())
+    assert loaded.loc[loaded["sale_id"] == bad.loc[9, "sale_id"], "sales_amount"].item() == pytest.approx(bad.loc[9, "sales_amount"])
+
+
+def test_fact_rows_without_date_are_dropped_by_every_build(tmp_path):
+    sales, inv, hr = _staging()
+    # validate tolera hasta un 1% de fechas nulas: el modelo no debe romperse con ellas
+    sales["sale_date"] = sales["sale_date"].mask(sales.index.isin([5, 90]))
+    inv["snapshot_date"] = inv["snapshot_date"].mask(inv.index == 7)
+    _write(tmp_path / "stg", sales, inv, hr)
+
+    full = build_star(str(tmp_path / "stg"), str(tmp_path / "full.db"))
+    streamed = build_star(str(tmp_path / "stg"), str(tmp_path / "stream.db"), streaming=True, chunk_rows=50)
+    assert (full["fact_sales_rows"], full["fact_inventory_rows"]) == (len(sales) - 2, len(inv) - 1)
+    for name, key in [("fact_sales", "sale_id"), ("fact_inventory_snapshot", "inventory_id"), ("dim_customer", "customer_key")]:
+        pd.testing.assert_frame_equal(_table(str(tmp_path / "full.db"), name, key),
+                                      _table(str(tmp_path / "stream.db"), name, key))
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "duckdb"])
+def test_warehouse_digest_ignores_load_metadata(tmp_path, backend):
+    if backend == "duckdb":
+        pytest.importorskip("duckdb")
+    from pipeline.warehouse import warehouse_digest
+    sales, inv, hr = _staging()
+    _write(tmp_path / "a", sales, inv, hr)
+    db = str(tmp_path / "wh.db")
+    build_star(str(tmp_path / "a"), db, backend=backend)
+    first = warehouse_digest(db, backend)
+    build_star(str(tmp_path / "a"), db, backend=backend)
+    assert warehouse_digest(db, backend) == first
+
+    _write(tmp_path / "b", sales.assign(quantity=sales["quantity"] + 1), inv, hr)
+    build_star(str(tmp_path / "b"), db, backend=backend)
+    assert warehouse_digest(db, backend) != first
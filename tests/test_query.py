@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.model import build_star
+from pipeline.query import DIMENSIONS, query, cache_info, invalidate
+from pipeline.warehouse import connect, read_frame
+
+
+def _warehouse(tmp_path, n_sales=200, seed=0):
+    rng = np.random.default_rng(seed)
+    d = tmp_path / f"stg{seed}"
+    d.mkdir(exist_ok=True)
+    pd.DataFrame({
+        "sale_id": np.arange(1, n_sales + 1),
+        "sale_date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 90, n_sales), unit="D"),
+        "product_id": rng.integers(1, 10, n_sales), "customer_id": rng.integers(1, 30, n_sales),
+        "store_id": rng.integers(1, 4, n_sales), "quantity": rng.integers(1, 5, n_sales).astype(float),
+        "unit_price": rng.uniform(1, 100, n_sales), "discount_percent": rng.uniform(0, 20, n_sales),
+        "sales_amount": rng.uniform(10, 500, n_sales), "profit_margin": rng.uniform(5, 40, n_sales),
+    }).to_parquet(d / "stg_sales.parquet", index=False)
+    pd.DataFrame({
+        "inventory_id": np.arange(1, 31), "snapshot_date": pd.date_range("2023-01-01", periods=30, freq="3D"),
+        "warehouse_id": rng.integers(1, 3, 30), "category_id": rng.integers(1, 4, 30),
+        "product_code": [f"PRD_{i:04d}" for i in rng.integers(1, 10, 30)], "stock_qty": rng.uniform(0, 50, 30),
+        "reorder_level": rng.uniform(0, 50, 30), "unit_cost": rng.uniform(1, 10, 30), "total_value": rng.uniform(0, 500, 30),
+    }).to_parquet(d / "stg_inventory.parquet", index=False)
+    pd.DataFrame({"employee_id": [1, 2], "department_id": [1, 1], "salary": [1000.0, 1200.0],
+                  "bonus": [10.0, 20.0]}).to_parquet(d / "stg_hr.parquet", index=False)
+    db = str(tmp_path / "wh.db")
+    build_star(str(d), db)
+    return db
+
+
+def test_query_matches_fact_aggregation(tmp_path):
+    db = _warehouse(tmp_path)
+    out = query(db, ["sales_amount", "sales_count"], ["month", "segment_label"], {"month": {"min": 202302}}, cache=False)
+
+    con = connect(db)
+    try:
+        facts = read_frame(con, "SELECT f.date_id, f.sales_amount, c.segment_label FROM fact_sales f "
+                                "LEFT JOIN dim_customer c ON c.customer_key = f.customer_key")
+    finally:
+        con.close()
+    facts["month"] = facts["date_id"] // 100
+    facts = facts[facts["month"] >= 202302]
+    expected = (facts.groupby(["month", "segment_label"]).agg(sales_amount=("sales_amount", "sum"),
+                                                              sales_count=("sales_amount", "size"))
+                .reset_index())
+    pd.testing.assert_frame_equal(out, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("fact,measure", [("fact_sales", "sales_amount"), ("fact_inventory_snapshot", "stock_qty")])
+def test_grouping_by_any_dimension_keeps_every_fact_row(tmp_path, fact, measure):
+    db = _warehouse(tmp_path)
+    con = connect(db)
+    try:
+        # Almacén con dim_date incompleto (cargas anteriores): los facts de enero no tienen fila de fecha
+        con.execute("DELETE FROM dim_date WHERE date_id < 20230201")
+        con.commit()
+        expected = read_frame(con, f"SELECT date_id, {measure} FROM {fact}")
+    finally:
+        con.close()
+    total = query(db, [measure], cache=False)[measure].iloc[0]
+    assert total == pytest.approx(expected[measure].sum())
+
+    dims = [d for d, spec in DIMENSIONS.items() if spec["facts"] is None or fact in spec["facts"]]
+    for dim in dims:
+        out = query(db, [measure], [dim], cache=False)
+        assert out[measure].sum() == pytest.approx(total), dim
+
+    ids = expected["date_id"]
+    out = query(db, [measure], ["year", "quarter"], cache=False)
+    want = expected.groupby([ids // 10000, (ids // 100 % 100 + 2) // 3])[measure].sum()
+    assert np.allclose(out.set_index(["year", "quarter"])[measure].sort_index(), want.sort_index())
+
+
+def test_repeated_queries_hit_cache_until_reload(tmp_path):
+    invalidate()
+    db = _warehouse(tmp_path)
+    first = query(db, ["sales_amount", "stock_qty"], ["category"])
+    hits = cache_info()["hits"]
+    again = query(db, ["sales_amount", "stock_qty"], ["category"])
+    assert cache_info()["hits"] == hits + 1
+    pd.testing.assert_frame_equal(first, again)
+
+    # Las copias devueltas no alteran la caché
+    again["sales_amount"] = 0
+    assert query(db, ["sales_amount", "stock_qty"], ["category"])["sales_amount"].gt(0).all()
+
+    # Una recarga del almacén invalida los resultados
+    _warehouse(tmp_path, seed=1)
+    reloaded = query(db, ["sales_amount", "stock_qty"], ["category"])
+    assert not reloaded["sales_amount"].equals(first["sales_amount"])
+
+
+def test_disk_cache_serves_a_new_process_until_reload(tmp_path, monkeypatch):
+    from collections import OrderedDict
+    import pipeline.query as q
+    db = _warehouse(tmp_path)
+    monkeypatch.setitem(q._cache, "dir", str(tmp_path / "query_cache"))
+    first = query(db, ["sales_amount"], ["month"])
+    assert len(list((tmp_path / "query_cache").glob("*.parquet"))) == 1
+
+    # Proceso nuevo: memoria vacía, el resultado sale del parquet sin consultar el almacén
+    monkeypatch.setitem(q._cache, "entries", OrderedDict())
+    real = q._run
+    def no_run(*args):
+        raise AssertionError("warehouse queried")
+    monkeypatch.setattr(q, "_run", no_run)
+    pd.testing.assert_frame_equal(query(db, ["sales_amount"], ["month"]), first)
+
+    # Una recarga cambia la versión de carga: se recalcula y el fichero anterior se borra
+    monkeypatch.setattr(q, "_run", real)
+    monkeypatch.setitem(q._cache, "entries", OrderedDict())
+    _warehouse(tmp_path, seed=1)
+    assert not query(db, ["sales_amount"], ["month"]).equals(first)
+    assert len(list((tmp_path / "query_cache").glob("*.parquet"))) == 1
+
+
+def test_query_rejects_unknown_or_unavailable_dimensions(tmp_path):
+    db = _warehouse(tmp_path)
+    with pytest.raises(ValueError, match="Unknown measures"):
+        query(db, ["revenue"])
+    with pytest.raises(ValueError, match="not available"):
+        query(db, ["stock_qty"], ["segment_label"])
@@ -11,4 +11,60 @@ def test_parse_decimal_series():
     assert pd.isna(out.iloc[4])
     assert pd.isna(out.iloc[5])
     assert out.iloc[6] == 12.5
-    assert out.iloc[7] == 1000.0
\ No newline at end of file
+    assert out.iloc[7] == 1000.0
+
+def test_parse_decimal_series_matches_per_value_parser():
+    from pipeline.utils import _parse_decimal_value
+    vals = ["1.234,56", "1,234.56", "1.234.567", "0,5", "1_000", "inf", "", " 7 ", "1.5e3", None, 3, True, pd.Timestamp("2023-01-01")]
+    s = pd.Series(vals * 2, index=[0] * len(vals) * 2)
+    out = parse_decimal_series(s)
+    expected = s.map(_parse_decimal_value)
+    assert list(out.index) == list(s.index)
+    pd.testing.assert_series_equal(out.reset_index(drop=True), expected.astype(float).reset_index(drop=True))
+
+def _rfm_reference(grp):
+    # Implementación original, celda a celda, como referencia
+    q = grp[["recency_days","frequency","monetary"]].quantile(q=[0.2,0.4,0.6,0.8])
+    def score(x, col, reverse):
+        for i, p in enumerate([0.2,0.4,0.6,0.8]):
+            if x <= q.loc[p, col]:
+                return 5 - i if reverse else i + 1
+        return 1 if reverse else 5
+    r = grp["recency_days"].apply(lambda x: score(x, "recency_days", True))
+    f = grp["frequency"].apply(lambda x: score(x, "frequency", False))
+    m = grp["monetary"].apply(lambda x: score(x, "monetary", False))
+    total = r + f + m
+    label = total.apply(lambda s: "VIP" if s >= 12 else "Loyal" if s >= 9 else "Regular" if s >= 6 else "At Risk")
+    return r, f, m, label
+
+def test_rfm_segmentation_matches_reference():
+    import numpy as np
+    from pipeline.utils import rfm_segmentation
+    rng = np.random.default_rng(1)
+    n = 500
+    sales = pd.DataFrame({
+        "sale_id": np.arange(n), "customer_id": rng.integers(1, 80, n),
+        "sale_date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 200, n), unit="D"),
+        "sales_amount": rng.uniform(1, 300, n),
+    })
+    out = rfm_segmentation(sales)
+    r, f, m, label = _rfm_reference(out[["customer_id","recency_days","frequency","monetary"]])
+    assert (out["r_score"] == r).all()
+    assert (out["f_score"] == f).all()
+    assert (out["m_score"] == m).all()
+    assert (out["segment_label"] == label).all()
+
+def test_rfm_segmentation_as_of_and_config():
+    from pipeline.utils import rfm_segmentation
+    sales = pd.DataFrame({
+        "sale_id": [1, 2, 3, 4], "customer_id": [1, 1, 2, 3],
+        "sale_date": pd.to_datetime(["2023-01-01", "2023-03-01", "2023-01-10", "2023-02-01"]),
+        "sales_amount": [10.0, 20.0, 5.0, 7.0],
+    })
+    out = rfm_segmentation(sales, as_of="2023-01-31", quantiles=[0.5], segments={"Top": 5}, default_segment="Rest")
+    out = out.set_index("customer_id")
+    assert list(out.index) == [1, 2]
+    assert out.loc[1, "recency_days"] == 31 and out.loc[1, "monetary"] == 10.0
+    assert out.loc[2, "recency_days"] == 22
+    assert out[["r_score","f_score","m_score"]].isin([1, 2]).all().all()
+    assert set(out["segment_label"]) <= {"Top", "Rest"}
@@ -0,0 +1,68 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from pipeline.validate import validate, run
+
+RULES = {
+    "sales": {
+        "unique": ["sale_id"],
+        "null_ratio": {"customer_id": 0.2},
+        "ranges": {"discount_percent": [0, 100]},
+        "dates": {"sale_date": ["2020-01-01", None]},
+        "references": {"product_id": {"ref": "inventory.product_code", "min_ratio": 0.9}},
+        "warn": ["references"],
+    },
+}
+
+
+def _staging():
+    sales = pa.table({
+        "sale_id": [1, 2, 3, 3],
+        "sale_date": pa.array(pd.to_datetime(["2023-01-01", "2019-05-01", "2023-02-01", "2023-03-01"])),
+        "product_id": [1, 2, 3, 4],
+        "customer_id": pa.array([1, None, None, 2], pa.int64()),
+        "discount_percent": [0.0, 150.0, 10.0, None],
+    })
+    inv = pa.table({"product_code": pa.array(["PRD_0001", "PRD_0002", "PRD_0002", "X"]).dictionary_encode()})
+    return {"sales": sales, "inventory": inv}
+
+
+def test_validate_vectorized_rules():
+    report = validate(rules=RULES, staging=_staging()).set_index(["rule", "column"])
+    assert report.loc[("unique", "sale_id"), "observed"] == pytest.approx(0.25)
+    assert report.loc[("null_ratio", "customer_id"), "observed"] == 0.5
+    # Los nulos no cuentan como fuera de rango
+    assert report.loc[("ranges", "discount_percent"), "observed"] == pytest.approx(1 / 3)
+    assert report.loc[("dates", "sale_date"), "observed"] == 0.25
+    # Cobertura sobre IDs distintos; los códigos se reducen a su sufijo numérico
+    assert report.loc[("references", "product_id"), "observed"] == 0.5
+    assert report.loc[("references", "product_id"), "severity"] == "warn"
+    assert not report["ok"].any()
+
+
+def test_run_fails_fast_on_errors_only(tmp_path):
+    cfg = {"validation": {"rules": RULES}}
+    with pytest.raises(ValueError, match="sale_id unique"):
+        run(out_dir=str(tmp_path), cfg=cfg, staging=_staging())
+    assert json.loads((tmp_path / "data_quality.json").read_text())["errors"] == 4
+
+    # Solo avisos: la etapa pasa y el informe los recoge
+    cfg = {"validation": {"rules": {"sales": {k: RULES["sales"][k] for k in ["references", "warn"]}}}}
+    res = run(out_dir=str(tmp_path), cfg=cfg, staging=_staging())
+    assert res["errors"] == 0 and res["failed"] == 1
+
+    cfg = {"validation": {"fail_fast": False, "rules": RULES}}
+    assert run(out_dir=str(tmp_path), cfg=cfg, staging=_staging())["errors"] == 4
+
+
+def test_validate_reads_only_needed_staging_columns(tmp_path):
+    n = 1000
+    pd.DataFrame({"sale_id": np.arange(n), "sale_date": pd.Timestamp("2023-01-01"), "product_id": 1,
+                  "customer_id": 1, "discount_percent": 5.0}).to_parquet(tmp_path / "stg_sales.parquet")
+    pd.DataFrame({"product_code": ["PRD_0001"]}).to_parquet(tmp_path / "stg_inventory.parquet")
+    report = validate(str(tmp_path), RULES)
+    assert report["ok"].all() and len(report) == 5
@@ -0,0 +1,75 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from pipeline.warehouse import load_star
+
+
+def test_load_star_creates_keys_and_indexes(tmp_path):
+    db = str(tmp_path / "wh.db")
+    dim_date = pd.DataFrame({"date_id": [20230101], "date": pd.to_datetime(["2023-01-01"]), "year": [2023], "quarter": [1],
+                             "month": [1], "day_of_month": [1], "day_of_week": [7], "is_weekend": [True]})
+    fact = pd.DataFrame({"inventory_id": [1, 2], "date_id": [20230101, 20230101], "product_key": [0, 3],
+                         "warehouse_key": [1, 1], "stock_qty": [5.0, float("nan")], "reorder_level": [1.0, 2.0],
+                         "unit_cost": [1.5, 2.5], "total_value": [7.5, None]})
+    load_star(db, {"dim_date": dim_date, "fact_inventory_snapshot": fact})
+
+    con = sqlite3.connect(db)
+    try:
+        assert con.execute("SELECT date, is_weekend FROM dim_date").fetchall() == [("2023-01-01 00:00:00", 1)]
+        assert con.execute("SELECT stock_qty FROM fact_inventory_snapshot ORDER BY inventory_id").fetchall() == [(5.0,), (None,)]
+        idx = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        assert "idx_fact_inventory_snapshot_date_id" in idx
+        with pytest.raises(sqlite3.IntegrityError):
+            con.execute("INSERT INTO fact_inventory_snapshot (inventory_id) VALUES (1)")
+    finally:
+        con.close()
+
+    # Una recarga reemplaza las tablas
+    load_star(db, {"dim_date": dim_date, "fact_inventory_snapshot": fact.iloc[:1]})
+    con = sqlite3.connect(db)
+    assert con.execute("SELECT COUNT(*) FROM fact_inventory_snapshot").fetchone() == (1,)
+    con.close()
+
+
+def test_load_star_duckdb_backend(tmp_path):
+    duckdb = pytest.importorskip("duckdb")
+    from pipeline.warehouse import upsert_frame, transaction, read_watermarks
+
+    db = str(tmp_path / "wh.duckdb")
+    dim_date = pd.DataFrame({"date_id": [20230101], "date": pd.to_datetime(["2023-01-01"]), "year": [2023], "quarter": [1],
+                             "month": [1], "day_of_month": [1], "day_of_week": [7], "is_weekend": [True]})
+    product = pd.DataFrame({"product_key": [1, 2], "product_id": [1, 2], "product_code": ["PRD_0001", None],
+                            "category_id": pd.array([3, pd.NA], dtype="Int64")})
+    load_star(db, {"dim_date": dim_date, "dim_product": product}, watermarks={"fact_sales": 20230101}, backend="duckdb")
+
+    with transaction(db, "duckdb") as con:
+        assert read_watermarks(con) == {"fact_sales": 20230101}
+        # Los NULL nuevos no pisan valores existentes
+        update = pd.DataFrame({"product_key": [1, 3], "product_id": [1, 3], "product_code": [None, "PRD_0003"],
+                               "category_id": pd.array([5, 1], dtype="Int64")})
+        assert upsert_frame(con, "dim_product", update) == 2
+
+    con = duckdb.connect(db)
+    try:
+        assert con.execute("SELECT product_key, product_code, category_id FROM dim_product ORDER BY 1").fetchall() == \
+            [(1, "PRD_0001", 5), (2, None, None), (3, "PRD_0003", 1)]
+        assert con.execute("SELECT is_weekend FROM dim_date").fetchall() == [(1,)]
+        with pytest.raises(duckdb.ConstraintException):
+            con.execute("INSERT INTO dim_product (product_key) VALUES (1)")
+    finally:
+        con.close()
+
+
+def test_load_star_duckdb_keeps_double_precision(tmp_path):
+    duckdb = pytest.importorskip("duckdb")
+    db = str(tmp_path / "wh.duckdb")
+    fact = pd.DataFrame({"inventory_id": [1], "date_id": [20230101], "product_key": [0], "warehouse_key": [1],
+                         "stock_qty": [5.0], "reorder_level": [1.0], "unit_cost": [105.63677419354838], "total_value": [0.1]})
+    load_star(db, {"fact_inventory_snapshot": fact}, backend="duckdb")
+    con = duckdb.connect(db)
+    try:
+        assert con.execute("SELECT unit_cost, total_value FROM fact_inventory_snapshot").fetchone() == (105.63677419354838, 0.1)
+    finally:
+        con.close()